@@ -0,0 +1,58 @@
+"""Archivio: l'ultima visura di un'azienda è quella con la data del documento più recente"""
+import sqlite3
+
+from visura.archivio import Archivio
+from visura.corpus import confronta, genera_visura
+from visura.estrazione import estrai_da_pagine
+
+
+def visura_del(seme, data_estrazione, codici):
+    risultato = estrai_da_pagine(genera_visura(seme=seme, persone=3, righe_storia=5).pagine)
+    risultato.ragione_sociale = "ROSSI COSTRUZIONI S.R.L."
+    risultato.data_estrazione = data_estrazione
+    for persona, codice in zip(risultato.dati, codici):
+        persona["Codice Fiscale"] = codice
+    return risultato
+
+
+def test_data_estrazione_dal_documento():
+    visura = genera_visura(seme=40, persone=3, righe_storia=5)
+    risultato = estrai_da_pagine(visura.pagine)
+    assert risultato.data_estrazione == visura.data_estrazione == "2024-02-10"
+    assert confronta(visura, risultato) == []
+
+
+def test_ultima_visura_per_data_del_documento():
+    archivio = Archivio(":memory:")
+    recente = visura_del(1, "2024-06-01", ["RSSMRA80A01H501U", "BNCLCU85B02F205X", "VRDGNN70C03A944Z"])
+    vecchia = visura_del(2, "2023-01-15", ["RSSMRA80A01H501U", "NRIPLA60D04L219K", "GLLSRA75E45F839M"])
+    # La visura più vecchia è elaborata per ultima, nello stesso blocco
+    assert archivio.registra_molti([(recente, "recente.pdf", "a", None), (vecchia, "vecchia.pdf", "b", None)]) == 2
+
+    persone = archivio.persone_di("Rossi Costruzioni S.r.l.")
+    assert {persona["Codice Fiscale"] for persona in persone} == {
+        "RSSMRA80A01H501U", "BNCLCU85B02F205X", "VRDGNN70C03A944Z"}
+    assert {persona["Data"] for persona in persone} == {"2024-06-01"}
+    assert archivio.cariche_di("NRIPLA60D04L219K") == []
+    assert [carica["File"] for carica in archivio.cariche_di("NRIPLA60D04L219K", solo_ultime=False)] == [
+        "vecchia.pdf"]
+    archivio.chiudi()
+
+
+def test_migrazione_archivio_esistente(tmp_path):
+    percorso = str(tmp_path / "archivio.sqlite3")
+    with sqlite3.connect(percorso) as connessione:
+        connessione.executescript("""
+            CREATE TABLE aziende (id INTEGER PRIMARY KEY, chiave TEXT NOT NULL UNIQUE, ragione_sociale TEXT NOT NULL);
+            CREATE TABLE visure (id INTEGER PRIMARY KEY, azienda_id INTEGER NOT NULL REFERENCES aziende(id),
+                data TEXT NOT NULL, file TEXT, impronta TEXT UNIQUE, comune TEXT, via TEXT,
+                numero_addetti TEXT, forma_giuridica TEXT);
+            INSERT INTO aziende VALUES (1, 'ROSSI', 'ROSSI S.R.L.');
+            INSERT INTO visure (azienda_id, data, file) VALUES (1, '2024-03-05 10:20:30', 'vecchia.pdf');
+        """)
+    connessione.close()
+
+    archivio = Archivio(percorso)
+    assert archivio.cerca_aziende("ROSSI") == [{"Ragione sociale": "ROSSI S.R.L.", "Ultima visura": "2024-03-05",
+                                                "Visure": 1}]
+    archivio.chiudi()
@@ -0,0 +1,18 @@
+"""Lavori in background: un avviso non trasforma il risultato in un errore"""
+from concurrent.futures import ThreadPoolExecutor
+
+from visura.avanzamento import Lavoro, avvia_lavoro
+
+
+def estrai_con_avviso(valore, osservatore=None):
+    osservatore.avviso("archivio non disponibile")
+    return valore
+
+
+def test_avviso_senza_errore():
+    with ThreadPoolExecutor(max_workers=1) as esecutore:
+        lavoro = avvia_lavoro(esecutore, "visura.pdf", estrai_con_avviso, 42)
+        assert lavoro.attendi(5)
+    assert lavoro.stato == Lavoro.COMPLETATO
+    assert lavoro.risultato == 42
+    assert lavoro.avvisi == ["archivio non disponibile"]
@@ -0,0 +1,42 @@
+"""Elaborazione batch: gli errori e i processi caduti non interrompono l'esecuzione"""
+import json
+import os
+
+import pytest
+
+from visura import batch
+from visura.corpus import genera_visura
+from visura.elaborazione import elabora_in_worker
+
+
+def elabora_o_cade(percorso, *argomenti):
+    # Eseguita nei processi worker (creati con fork, quindi con la sostituzione già fatta)
+    if os.path.basename(percorso).startswith("crash"):
+        os._exit(1)
+    return elabora_in_worker(percorso, *argomenti)
+
+
+@pytest.fixture
+def cartella_pdf(tmp_path):
+    cartella = tmp_path / "pdf"
+    cartella.mkdir()
+    for seme in range(4):
+        (cartella / f"visura_{seme}.pdf").write_bytes(genera_visura(seme=seme, persone=3, righe_storia=10).pdf())
+    (cartella / "rotto.pdf").write_bytes(b"%PDF-1.4 non un pdf")
+    return cartella
+
+
+def test_errori_e_processo_caduto(cartella_pdf, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "elabora_in_worker", elabora_o_cade)
+    (cartella_pdf / "crash.pdf").write_bytes(b"%PDF-1.4")
+    uscita = tmp_path / "uscita"
+
+    elaborati, errori = batch.elabora_batch(batch.trova_pdf([str(cartella_pdf)]), str(uscita), processi=2,
+                                            stampa=lambda *_: None)
+
+    assert elaborati == 4
+    assert sorted((os.path.basename(errore["File"]), errore["Errore"]) for errore in errori) == [
+        ("crash.pdf", "BrokenProcessPool"), ("rotto.pdf", "PdfReadError")]
+    with open(uscita / "errori.jsonl", encoding="utf-8") as f:
+        assert len([json.loads(riga) for riga in f]) == 2
+    assert len(os.listdir(uscita / "aziende")) == 4
@@ -0,0 +1,50 @@
+"""Cache dei risultati e checkpoint con il backend di riserva della modalità automatica"""
+import os
+
+import pytest
+
+from visura.backend import BACKEND, backend_automatici
+from visura.cache import CacheRisultati, chiave_pdf, estrai_dati_con_cache
+from visura.checkpoint import Checkpoint, estrai_con_checkpoint
+from visura.corpus import genera_visura
+
+
+@pytest.fixture
+def pdf_solo_riserva(monkeypatch):
+    """PDF che il primo backend automatico non riesce ad aprire"""
+    automatici = [backend.nome for backend in backend_automatici()]
+    if len(automatici) < 2:
+        pytest.skip("serve un secondo backend PDF installato")
+
+    def non_apre(sorgente):
+        raise ValueError("PDF non supportato")
+
+    monkeypatch.setattr(BACKEND[automatici[0]], "apri", non_apre)
+    return genera_visura(seme=2, persone=4, righe_storia=10).pdf(), automatici[0], automatici[1]
+
+
+def test_cache_con_backend_di_riserva(pdf_solo_riserva):
+    dati_pdf, primo, riserva = pdf_solo_riserva
+    cache = CacheRisultati()
+
+    risultato = estrai_dati_con_cache(dati_pdf, cache)
+    assert risultato.diagnostica.backend == riserva
+    assert cache.leggi(chiave_pdf(dati_pdf, riserva)) is not None
+    assert cache.leggi(chiave_pdf(dati_pdf, primo)) is None
+
+    di_nuovo = estrai_dati_con_cache(dati_pdf, cache)
+    assert di_nuovo.diagnostica.da_cache
+    assert di_nuovo.dati == risultato.dati
+
+
+def test_checkpoint_con_backend_di_riserva(pdf_solo_riserva, tmp_path):
+    dati_pdf, _, riserva = pdf_solo_riserva
+    checkpoint = Checkpoint(str(tmp_path))
+
+    risultato = estrai_con_checkpoint(dati_pdf, checkpoint)
+    assert [nome.rsplit("-", 1)[1] for nome in os.listdir(tmp_path)] == [f"{riserva}.json.gz"]
+
+    # Alla seconda elaborazione il testo viene dall'artefatto, senza estrarre le pagine
+    di_nuovo = estrai_con_checkpoint(dati_pdf, checkpoint)
+    assert di_nuovo.diagnostica.pagine_da_cache == di_nuovo.diagnostica.pagine_lette > 0
+    assert di_nuovo.dati == risultato.dati
@@ -0,0 +1,67 @@
+"""Tabella dei comuni, versione del parser e codici fiscali con omocodia"""
+from visura.cache import versione_parser
+from visura.codice_fiscale import POSIZIONI_OMOCODIA, carattere_controllo
+from visura.comuni import comune_di_nascita, tabella_comuni
+from visura.corpus import genera_visura
+from visura.estrazione import estrai_da_pagine
+from visura.istat import compila
+from visura.nomi import pattern_cf
+
+
+def omocodice(codice_fiscale, sostituzioni):
+    """Codice con le ultime `sostituzioni` cifre sostituite dalle lettere dell'omocodia"""
+    caratteri = list(codice_fiscale[:15])
+    for posizione in POSIZIONI_OMOCODIA[::-1][:sostituzioni]:
+        caratteri[posizione] = "LMNPQRSTUV"[int(caratteri[posizione])]
+    codice = "".join(caratteri)
+    return codice + carattere_controllo(codice)
+
+
+def test_tabella_completa():
+    assert len(tabella_comuni()) > 10000
+    assert comune_di_nascita("H501") == "ROMA (RM)"
+    assert comune_di_nascita("D704") == "FORLÌ (FC)"
+    assert comune_di_nascita("L781") == "VERONA (VR)"
+    assert comune_di_nascita("Z110") == "FRANCIA"
+    # Comune soppresso (confluito in Valsamoggia nel 2014), con la provincia di allora
+    assert comune_di_nascita("A726") == "BAZZANO (BO)"
+
+
+def test_compila_con_comuni_soppressi(tmp_path):
+    soppressi = tmp_path / "soppressi.csv"
+    soppressi.write_text("Denominazione Comune;Sigla automobilistica;Codice Catastale\n"
+                         "Abano;PD;A001\nBazzano;BO;A726\n", encoding="utf-8")
+    italiani = tmp_path / "italiani.csv"
+    italiani.write_text("Codice Catastale del comune;Denominazione in italiano;Sigla automobilistica\n"
+                        "A001;Abano Terme;PD\n", encoding="utf-8")
+    uscita = tmp_path / "comuni.tsv"
+    assert compila([str(soppressi), str(italiani)], str(uscita)) == 2
+    # Per un codice ancora in uso vale il comune attuale
+    assert tabella_comuni(str(uscita)) == {"A001": ("ABANO TERME", "PD"), "A726": ("BAZZANO", "BO")}
+
+
+def test_versione_parser_con_tabella_esterna(tmp_path, monkeypatch):
+    predefinita = versione_parser()
+    tabella = tmp_path / "comuni.tsv"
+    tabella.write_text("H501\tROMA CAPITALE\tRM\n", encoding="utf-8")
+    monkeypatch.setenv("VISURA_COMUNI", str(tabella))
+    versione_parser.cache_clear()
+    try:
+        esterna = versione_parser()
+        tabella.write_text("H501\tROMA\tRM\n", encoding="utf-8")
+        versione_parser.cache_clear()
+        assert len({predefinita, esterna, versione_parser()}) == 3
+    finally:
+        versione_parser.cache_clear()
+
+
+def test_codice_fiscale_con_omocodia():
+    visura = genera_visura(seme=3, persone=4, righe_storia=5)
+    originale = visura.persone[0]["Codice Fiscale"]
+    codice = omocodice(originale, 7)
+    assert pattern_cf.fullmatch(codice)
+
+    pagine = [pagina.replace(originale, codice) for pagina in visura.pagine]
+    persona = next(p for p in estrai_da_pagine(pagine).dati if p["Codice Fiscale"] == codice)
+    assert persona["Data di nascita"] == visura.persone[0]["Data di nascita"]
+    assert persona["Comune di nascita"] == visura.persone[0]["Comune di nascita"]
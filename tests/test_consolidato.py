@@ -0,0 +1,96 @@
+"""Esportazione consolidata: una riga per codice fiscale tra tutte le aziende, uguale in ogni formato"""
+import csv
+
+import pytest
+
+from visura.consolidato import COLONNE_CARICHE, COLONNE_PERSONE, EsportazioneConsolidata, formati_disponibili
+
+AMMINISTRATORI = "Amministratori"
+SINDACI = "Sindaci, membri organi di controllo"
+SOCI = "Soci e titolari di diritti su azioni e quote"
+
+ROSSI = ("ROSSI", "MARIO", "RSSMRA60T03A944Y")
+BIANCHI = ("BIANCHI", "ANNA", "BNCNNA75E60F205L")
+VERDI = ("VERDI", "LUCA", "VRDLCU90L15L219B")
+
+
+def risultato(ragione_sociale, *persone):
+    return {
+        "intestazione": {"Ragione sociale": ragione_sociale, "Comune": "BOLOGNA (BO)", "Via": "VIA ROMA 1",
+                         "Numero addetti": "10", "Forma giuridica": "societa' a responsabilita' limitata"},
+        "persone": [{"Cognome": cognome, "Nomi": nomi, "Codice Fiscale": codice, "Data di nascita": "",
+                     "Codice catastale": codice[11:15], "Comune di nascita": "", "Sezione": sezione}
+                    for (cognome, nomi, codice), sezione in persone],
+    }
+
+
+RISULTATI = [
+    ("alfa.pdf", risultato("ALFA S.R.L.", (ROSSI, AMMINISTRATORI), (BIANCHI, SOCI))),
+    ("beta.pdf", risultato("BETA S.P.A.", (ROSSI, SOCI), (VERDI, AMMINISTRATORI))),
+    # Visura più recente della stessa azienda: le sezioni si uniscono, senza ripetizioni
+    ("alfa_2024.pdf", risultato("ALFA S.R.L.", (ROSSI, f"{AMMINISTRATORI}, {SINDACI}"))),
+]
+
+
+def leggi(percorso):
+    """Righe di un file consolidato come dizionari di testo, qualunque sia il formato"""
+    formato = percorso.rsplit(".", 1)[1]
+    if formato == "csv":
+        with open(percorso, encoding="utf-8", newline="") as f:
+            return list(csv.DictReader(f))
+    if formato == "parquet":
+        import pyarrow.parquet as pq
+
+        righe = pq.read_table(percorso).to_pylist()
+    else:
+        import pyarrow as pa
+
+        with pa.ipc.open_file(percorso) as lettore:
+            righe = lettore.read_all().to_pylist()
+    return [{colonna: str(valore) for colonna, valore in riga.items()} for riga in righe]
+
+
+def leggi_foglio(percorso, titolo):
+    from openpyxl import load_workbook
+
+    righe = list(load_workbook(percorso, read_only=True)[titolo].values)
+    return [{colonna: "" if valore is None else str(valore) for colonna, valore in zip(righe[0], riga)}
+            for riga in righe[1:]]
+
+
+@pytest.fixture
+def cartella(tmp_path):
+    with EsportazioneConsolidata(str(tmp_path), formati=formati_disponibili()) as esportazione:
+        for file, valori in RISULTATI:
+            esportazione.aggiungi(valori, file)
+    return tmp_path
+
+
+def test_persone_per_codice_fiscale(cartella):
+    persone = leggi(str(cartella / "persone.csv"))
+    assert [riga["Codice Fiscale"] for riga in persone] == [ROSSI[2], BIANCHI[2], VERDI[2]]
+
+    rossi = persone[0]
+    assert rossi["Numero aziende"] == "2"
+    assert rossi["Aziende"] == "ALFA S.R.L. | BETA S.P.A."
+    assert rossi["Cariche"] == f"ALFA S.R.L.: {AMMINISTRATORI}, {SINDACI} | BETA S.P.A.: {SOCI}"
+    assert rossi["File"] == "alfa.pdf | beta.pdf | alfa_2024.pdf"
+    assert persone[1]["Cariche"] == f"ALFA S.R.L.: {SOCI}"
+
+    assert len(leggi(str(cartella / "cariche.csv"))) == 5
+    assert [riga["Persone"] for riga in leggi(str(cartella / "aziende.csv"))] == ["2", "2", "1"]
+
+
+def test_stesse_righe_in_ogni_formato(cartella):
+    persone = leggi(str(cartella / "persone.csv"))
+    cariche = leggi(str(cartella / "cariche.csv"))
+    for formato in formati_disponibili():
+        if formato == "xlsx":
+            assert leggi_foglio(str(cartella / "consolidato.xlsx"), "Persone") == persone
+            # Le cariche dell'Excel passano dal file temporaneo: stesse righe, nello stesso ordine
+            assert leggi_foglio(str(cartella / "consolidato.xlsx"), "Cariche") == cariche
+        elif formato != "csv":
+            assert leggi(str(cartella / f"persone.{formato}")) == persone
+            assert leggi(str(cartella / f"cariche.{formato}")) == cariche
+    assert list(persone[0]) == COLONNE_PERSONE
+    assert list(cariche[0]) == COLONNE_CARICHE
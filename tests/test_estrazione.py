@@ -0,0 +1,95 @@
+"""
+Estrazione dal testo delle pagine confrontata con il comportamento della prima versione
+(estrai_dati in main.py, che concatenava il testo delle pagine senza separatori)
+"""
+import pytest
+
+from visura.corpus import confronta, genera_visura
+from visura.estrazione import estrai_da_pagine
+
+PAGINE = [
+    "Camera di Commercio Industria Artigianato e Agricoltura\n"
+    "VISURA ORDINARIA SOCIETA' DI CAPITALE\n"
+    "\n"
+    "MARIO ROSSI E FIGLI\n"
+    "COSTRUZIONI S.R.L.\n"
+    "\n"
+    "DATI ANAGRAFICI\n"
+    "Indirizzo SedeMILANO (MI) VIA DEI\n"
+    "MILLE 7 CAP 20121\n"
+    "Forma giuridica societa' a responsabilita'\n"
+    "limitata Codice fiscale 01234567890\n"
+    "Addetti al 30/06/2024 42\n"
+    "Indice\n"
+    "Amministratori 2\n"
+    "Sindaci, membri organi di controllo 3\n"
+    "Soci e titolari di diritti su azioni e quote 4\n"
+    "Storia delle modifiche 5\n",
+    "Amministratori\n"
+    "Amministratore Unico\n"
+    "DE LUCA GIAN PAOLO DLCGPL80A01H501F\n"
+    "carica dal 01/02/2010\n"
+    "Consigliere\n"
+    # La riga prosegue sulla pagina successiva
+    "BIANCHI ANNA MA",
+    "RIA BNCNMR75E60F205X\n"
+    "Consigliere\n"
+    "ROSSI\n"
+    "MARIO\n"
+    "Codice fiscale: RSSMRA60T03A944Y\n"
+    "Sindaci, membri organi di controllo\n"
+    "Sindaco effettivo\n"
+    "VERDI LUCA VRDLCU90L15L219B\n",
+    # Titolo ripetuto: vale l'ultima occorrenza
+    "Sindaci, membri organi di controllo\n"
+    "Sindaco supplente\n"
+    "NERI SARA Rappresentante dell'impresa NRESRA85C49F839S\n"
+    "ROSSI MARIO RSSMRA60T03A944Y\n"
+    "Soci e titolari di diritti su azioni e quote\n"
+    "BIANCHI ANNA MARIA BNCNMR75E60F205X\n"
+    # Seconda occorrenza di una sezione di fine: il resto non viene letto
+    "Storia delle modifiche\n"
+    "Amministratori\n"
+    "GALLO PAOLO GLLPLA70B02H501T\n",
+]
+
+# Risultato della prima versione sullo stesso testo, comprese le sue particolarità
+# (lettere del codice fiscale tra i nomi, ROSSI MARIO su due righe non riconosciuto)
+INTESTAZIONE = {
+    "Ragione sociale": "MARIO ROSSI E FIGLI COSTRUZIONI S.R.L.",
+    "Comune": "MILANO (MI)",
+    "Via": "VIA DEI MILLE 7",
+    "Numero addetti": "42",
+    "Forma giuridica": "societa' a responsabilita' limitata",
+}
+PERSONE = [
+    {"Cognome": "DE LUCA", "Nomi": "GIAN PAOLO DLCGPLAHF", "Codice Fiscale": "DLCGPL80A01H501F",
+     "Data di nascita": "01/01/1980", "Codice catastale": "H501", "Sezione": "Amministratori"},
+    {"Cognome": "BIANCHI", "Nomi": "ANNA MARIA BNCNMREFX", "Codice Fiscale": "BNCNMR75E60F205X",
+     "Data di nascita": "20/05/1975", "Codice catastale": "F205",
+     "Sezione": "Amministratori, Soci e titolari di diritti su azioni e quote"},
+    {"Cognome": "NERI", "Nomi": "SARA", "Codice Fiscale": "NRESRA85C49F839S",
+     "Data di nascita": "09/03/1985", "Codice catastale": "F839", "Sezione": "Sindaci, membri organi di controllo"},
+    {"Cognome": "ROSSI MARIO", "Nomi": "RSSMRATAY", "Codice Fiscale": "RSSMRA60T03A944Y",
+     "Data di nascita": "03/12/1960", "Codice catastale": "A944", "Sezione": "Sindaci, membri organi di controllo"},
+]
+
+
+def senza_comune(persone):
+    # Il comune di nascita è stato aggiunto dopo la prima versione
+    return [{campo: valore for campo, valore in persona.items() if campo != "Comune di nascita"}
+            for persona in persone]
+
+
+@pytest.mark.parametrize("pagine", [PAGINE, ["".join(PAGINE)]], ids=["pagine", "testo unico"])
+def test_come_prima_versione(pagine):
+    risultato = estrai_da_pagine(pagine)
+    assert risultato.intestazione() == INTESTAZIONE
+    assert senza_comune(risultato.dati) == PERSONE
+
+
+@pytest.mark.parametrize("seme, righe_dettaglio", [(0, 0), (1, 3), (2, 0)])
+def test_corpus_sintetico(seme, righe_dettaglio):
+    visura = genera_visura(seme=seme, persone=12, righe_storia=30, righe_per_pagina=17,
+                           righe_dettaglio=righe_dettaglio)
+    assert confronta(visura, estrai_da_pagine(visura.pagine)) == []
@@ -0,0 +1,69 @@
+"""Visure aggiornate: pagine invariate dalla cache e confronto con l'elaborazione precedente"""
+import pytest
+
+from visura.backend import backend_automatici
+from visura.cache import CachePagine
+from visura.corpus import codice_fiscale_sintetico, genera_visura, scrivi_pdf
+from visura.incrementale import StoricoAziende, aggiorna
+
+ROSSI = ("ROSSI", "MARIO", codice_fiscale_sintetico("ROSSI", "MARIO", 1960, 12, 3, False, "A944"))
+BIANCHI = ("BIANCHI", "ANNA", codice_fiscale_sintetico("BIANCHI", "ANNA", 1975, 5, 20, True, "F205"))
+VERDI = ("VERDI", "LUCA", codice_fiscale_sintetico("VERDI", "LUCA", 1990, 7, 15, False, "L219"))
+NERI = ("NERI", "SARA", codice_fiscale_sintetico("NERI", "SARA", 1985, 3, 9, True, "F839"))
+
+AMMINISTRATORI = "Amministratori"
+SOCI = "Soci e titolari di diritti su azioni e quote"
+
+
+def pagine_visura(sezioni):
+    """Visura minima della stessa azienda, con le persone indicate per ogni sezione"""
+    pagine = ["VISURA ORDINARIA SOCIETA' DI CAPITALE\n\nROSSI COSTRUZIONI S.R.L.\n\n"
+              f"Indice\n{AMMINISTRATORI} 2\n{SOCI} 3\nStoria delle modifiche 4\n"]
+    for sezione, persone in sezioni.items():
+        pagine.append(f"{sezione}\n" + "".join(f"Consigliere\n{cognome} {nome}\nCodice fiscale: {codice}\n"
+                                              for cognome, nome, codice in persone))
+    pagine.append("Storia delle modifiche\nModifica n. 1 del 01/02/2015\n")
+    return pagine
+
+
+@pytest.mark.parametrize("backend", [backend.nome for backend in backend_automatici()])
+def test_pagina_cambiata(tmp_path, backend):
+    visura = genera_visura(seme=4, persone=8, righe_storia=10, righe_per_pagina=15)
+    modificate = list(visura.pagine)
+    modificate[1] = modificate[1].replace("Consigliere", "Consigliera", 1)
+    assert modificate[1] != visura.pagine[1]
+
+    cache_pagine = CachePagine()
+    storico = StoricoAziende(str(tmp_path))
+    prima, _ = aggiorna(scrivi_pdf(visura.pagine), storico, cache_pagine, backend)
+    assert prima.diagnostica.pagine_da_cache == 0
+    dopo, differenze = aggiorna(scrivi_pdf(modificate), storico, cache_pagine, backend)
+
+    diagnostica = dopo.diagnostica
+    assert diagnostica.pagine_lette > 2
+    assert diagnostica.pagine_da_cache == diagnostica.pagine_lette - 1
+    assert differenze.nessuna
+
+
+def test_persone_aggiunte_rimosse_e_cambiate(tmp_path):
+    storico = StoricoAziende(str(tmp_path))
+    prima = pagine_visura({AMMINISTRATORI: [ROSSI, BIANCHI], SOCI: [ROSSI, VERDI]})
+    _, differenze = aggiorna(prima, storico)
+    assert differenze is None  # prima elaborazione dell'azienda
+
+    # NERI entra, VERDI esce, BIANCHI passa dagli amministratori ai soci
+    dopo = pagine_visura({AMMINISTRATORI: [ROSSI, NERI], SOCI: [ROSSI, BIANCHI]})
+    _, differenze = aggiorna(dopo, storico)
+    assert differenze.data_precedente
+    assert [persona["Codice Fiscale"] for persona in differenze.aggiunte] == [NERI[2]]
+    assert [persona["Codice Fiscale"] for persona in differenze.rimosse] == [VERDI[2]]
+    assert [(prima["Sezione"], ora["Sezione"]) for prima, ora in differenze.cambiate] == [(AMMINISTRATORI, SOCI)]
+    assert differenze.righe_report() == [
+        f"  + NERI SARA ({NERI[2]}) - {AMMINISTRATORI}",
+        f"  - VERDI LUCA ({VERDI[2]}) - {SOCI}",
+        f"  ~ BIANCHI ANNA ({BIANCHI[2]}): {AMMINISTRATORI} -> {SOCI}",
+    ]
+
+    # Lo storico ora contiene la seconda visura
+    _, differenze = aggiorna(dopo, storico)
+    assert differenze.nessuna
@@ -0,0 +1,87 @@
+"""Servizio HTTP su una porta locale libera, con un solo processo di estrazione"""
+import http.client
+import os
+import signal
+import socket
+import threading
+import time
+
+import pytest
+
+from visura.corpus import genera_visura
+from visura.servizio import crea_servizio
+
+
+@pytest.fixture(scope="module")
+def servizio():
+    servizio = crea_servizio(porta=0, processi=1, coda=0)
+    threading.Thread(target=servizio.serve_forever, daemon=True).start()
+    yield servizio
+    servizio.shutdown()
+    servizio.server_close()
+
+
+@pytest.fixture(scope="module")
+def visura():
+    return genera_visura(seme=1, persone=5, righe_storia=20)
+
+
+def invia(servizio, corpo, tipo="application/pdf"):
+    connessione = http.client.HTTPConnection(*servizio.server_address[:2], timeout=60)
+    try:
+        connessione.request("POST", "/estrai", corpo, {"Content-Type": tipo})
+        risposta = connessione.getresponse()
+        return risposta.status, risposta.read()
+    finally:
+        connessione.close()
+
+
+def attendi_posti_liberi(servizio, secondi=5):
+    """Il posto di una richiesta si libera subito dopo l'invio della risposta"""
+    scadenza = time.monotonic() + secondi
+    while servizio.ammesse and time.monotonic() < scadenza:
+        time.sleep(0.01)
+    return servizio.ammesse == 0
+
+
+def test_estrazione(servizio, visura):
+    stato, corpo = invia(servizio, visura.pdf())
+    assert stato == 200
+    assert visura.intestazione["Ragione sociale"].encode() in corpo
+
+
+def test_pdf_non_valido(servizio):
+    stato, _ = invia(servizio, b"%PDF-1.4 non un pdf")
+    assert stato == 422
+
+
+def test_servizio_pieno(servizio, visura):
+    # Con un processo e coda 0 c'è un solo posto: occupato, la richiesta è respinta subito
+    assert attendi_posti_liberi(servizio)
+    assert servizio.ammetti()
+    try:
+        stato, _ = invia(servizio, visura.pdf())
+    finally:
+        servizio.libera()
+    assert stato == 503
+
+
+def test_content_length_negativo(servizio, visura):
+    with socket.create_connection(servizio.server_address[:2], timeout=5) as connessione:
+        connessione.sendall(b"POST /estrai HTTP/1.1\r\nHost: locale\r\nContent-Type: application/pdf\r\n"
+                            b"Content-Length: -1\r\n\r\n")
+        risposta = connessione.recv(1024)
+    assert risposta.startswith(b"HTTP/1.1 400")
+    # Il posto è stato liberato
+    assert attendi_posti_liberi(servizio)
+    assert invia(servizio, visura.pdf())[0] == 200
+
+
+def test_processo_terminato(servizio, visura):
+    assert invia(servizio, visura.pdf())[0] == 200
+    for pid in list(servizio.pool._processes):
+        os.kill(pid, signal.SIGKILL)
+    time.sleep(0.5)
+    # La richiesta successiva parte su un nuovo pool, oppure riceve 500 se il crollo la coinvolge
+    assert invia(servizio, visura.pdf())[0] in (200, 500)
+    assert invia(servizio, visura.pdf())[0] == 200
@@ -0,0 +1,145 @@
+"""Sorveglianza di una cartella: riavvii, registro interrotto e processi caduti"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from visura import sorveglianza
+from visura.corpus import genera_visura
+from visura.elaborazione import crea_pool, elabora_in_worker
+from visura.sorveglianza import RegistroElaborati, Sorveglianza, SorgenteInotify, SorgentePolling, crea_sorgente
+
+INTERVALLO = 0.05
+
+
+def elabora_o_cade(dati, *argomenti):
+    # Eseguita nei processi worker (creati con fork, quindi con la sostituzione già fatta)
+    if dati.startswith(b"%PDF-1.4 crash"):
+        os._exit(1)
+    return elabora_in_worker(dati, *argomenti)
+
+
+class SorveglianzaProva(Sorveglianza):
+    def _crea_pool(self):
+        return crea_pool(self.processi)
+
+
+class ContaImpronte:
+    """Al posto del modulo hashlib in visura.sorveglianza: conta i file letti e calcolati"""
+
+    def __init__(self):
+        self.calcolate = 0
+
+    def sha256(self, dati):
+        self.calcolate += 1
+        return hashlib.sha256(dati)
+
+
+@pytest.fixture
+def impronte(monkeypatch):
+    contatore = ContaImpronte()
+    monkeypatch.setattr(sorveglianza, "hashlib", contatore)
+    return contatore
+
+
+@pytest.fixture
+def cartelle(tmp_path):
+    cartella = tmp_path / "arrivi"
+    cartella.mkdir()
+    for seme in range(3):
+        (cartella / f"visura_{seme}.pdf").write_bytes(genera_visura(seme=seme, persone=3, righe_storia=10).pdf())
+    return cartella, tmp_path / "uscita"
+
+
+def crea(modo, cartella):
+    if modo == "polling":
+        return SorgentePolling(str(cartella), INTERVALLO)
+    sorgente = crea_sorgente(str(cartella))
+    if not isinstance(sorgente, SorgenteInotify):
+        sorgente.chiudi()
+        pytest.skip("inotify non disponibile")
+    return sorgente
+
+
+def esegui_finche(istanza, condizione, secondi=30, minimo=0):
+    """
+    Esegue la sorveglianza in un thread per almeno minimo secondi e finché la
+    condizione non è vera, poi la ferma
+    """
+    thread = threading.Thread(target=istanza.esegui)
+    thread.start()
+    inizio = time.monotonic()
+    while (not condizione() or time.monotonic() < inizio + minimo) and time.monotonic() < inizio + secondi:
+        time.sleep(0.02)
+    istanza.ferma()
+    thread.join()
+    assert condizione()
+
+
+def righe_registro(uscita):
+    with open(uscita / "elaborati.jsonl", encoding="utf-8") as f:
+        return [json.loads(riga) for riga in f]
+
+
+@pytest.mark.parametrize("modo", ["inotify", "polling"])
+def test_riavvio_senza_riletture(cartelle, impronte, modo):
+    cartella, uscita = cartelle
+    prima = Sorveglianza(crea(modo, cartella), str(uscita), processi=2, stampa=lambda *_: None)
+    esegui_finche(prima, lambda: prima.elaborati == 3)
+    assert impronte.calcolate == 3
+
+    dopo = Sorveglianza(crea(modo, cartella), str(uscita), processi=2, stampa=lambda *_: None)
+    # Abbastanza per diverse letture complete della cartella con il polling
+    esegui_finche(dopo, lambda: True, minimo=10 * INTERVALLO + 0.5)
+
+    assert impronte.calcolate == 3
+    assert dopo.elaborati == 0
+    assert len(os.listdir(uscita / "aziende")) == 3
+    assert len(righe_registro(uscita)) == 3
+
+
+def test_riga_troncata_nel_registro(cartelle):
+    cartella, uscita = cartelle
+    prima = Sorveglianza(crea("polling", cartella), str(uscita), processi=2, stampa=lambda *_: None)
+    esegui_finche(prima, lambda: prima.elaborati == 3)
+
+    # Interruzione durante la scrittura dell'ultima riga
+    percorso = uscita / "elaborati.jsonl"
+    contenuto = percorso.read_bytes()
+    percorso.write_bytes(contenuto[:-20])
+    registro = RegistroElaborati(str(percorso))
+    assert len(registro) == 2
+    registro.chiudi()
+    assert percorso.read_bytes().endswith(b"\n")
+
+    # Il file la cui riga è andata persa viene rielaborato e il suo risultato sostituito
+    dopo = Sorveglianza(crea("polling", cartella), str(uscita), processi=2, stampa=lambda *_: None)
+    esegui_finche(dopo, lambda: dopo.elaborati == 1)
+    assert len(os.listdir(uscita / "aziende")) == 3
+    assert len({voce["impronta"] for voce in righe_registro(uscita)}) == len(righe_registro(uscita)) == 3
+
+
+def test_processo_caduto_riprovato_una_volta(cartelle, monkeypatch):
+    cartella, uscita = cartelle
+    monkeypatch.setattr(sorveglianza, "elabora_in_worker", elabora_o_cade)
+    (cartella / "crash.pdf").write_bytes(b"%PDF-1.4 crash")
+    tentativi = []
+
+    class SorveglianzaContata(SorveglianzaProva):
+        def _processo_caduto(self, percorso, firma, impronta):
+            tentativi.append(os.path.basename(percorso))
+            super()._processo_caduto(percorso, firma, impronta)
+
+    istanza = SorveglianzaContata(crea("polling", cartella), str(uscita), processi=2, stampa=lambda *_: None)
+    esegui_finche(istanza, lambda: istanza.elaborati + istanza.errori == 4)
+
+    assert (istanza.elaborati, istanza.errori) == (3, 1)
+    assert tentativi.count("crash.pdf") == 2
+    with open(uscita / "errori.jsonl", encoding="utf-8") as f:
+        errori = [json.loads(riga) for riga in f]
+    assert [(os.path.basename(errore["File"]), errore["Errore"]) for errore in errori] == [
+        ("crash.pdf", "BrokenProcessPool")]
+    assert sorted(voce["esito"] for voce in righe_registro(uscita)) == ["errore", "ok", "ok", "ok"]
@@ -0,0 +1,21 @@
+"""
+Estrazione di dati societari e nominativi dalle visure camerali Telemaco.
+
+Il pacchetto non importa Streamlit, pandas o openpyxl: le dipendenze pesanti
+vengono caricate solo quando servono, così i worker partono subito.
+"""
+from .codice_fiscale import (decodifica_codice_fiscale, decodifica_codici_fiscali, decodifica_data_nascita,
+                             estrai_codice_catastale)
+from .estrazione import estrai_da_pagine, estrai_dati
+from .risultato import NON_TROVATO, RisultatoVisura
+
+__all__ = [
+    "NON_TROVATO",
+    "RisultatoVisura",
+    "decodifica_codice_fiscale",
+    "decodifica_codici_fiscali",
+    "decodifica_data_nascita",
+    "estrai_codice_catastale",
+    "estrai_da_pagine",
+    "estrai_dati",
+]
@@ -0,0 +1,287 @@
+"""
+Archivio SQLite delle visure elaborate, per le ricerche tra aziende diverse
+("in quali altri fornitori ha una carica questo codice fiscale?").
+
+    python -m visura.archivio [--db FILE] cerca CODICE_FISCALE_O_COGNOME
+    python -m visura.archivio [--db FILE] azienda RAGIONE_SOCIALE
+    python -m visura.archivio [--db FILE] statistiche
+
+Le visure entrano nell'archivio da python -m visura.batch ... --archivio FILE,
+dall'interfaccia Streamlit oppure con Archivio.registra. Ogni PDF è una riga di
+"visure" con la data del documento, il momento dell'elaborazione e l'impronta
+(un PDF già registrato non viene duplicato); le persone sono indicizzate per
+codice fiscale e le cariche per persona e per visura. Le ricerche usano l'ultima
+visura di ogni azienda, cioè quella con la data di estrazione più recente, anche
+se è stata elaborata prima delle altre.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from .incrementale import chiave_azienda
+from .nomi import pattern_cf
+from .risultato import NON_TROVATO, RisultatoVisura
+from .sezioni import separa_sezioni
+
+PERCORSO_PREDEFINITO = os.environ.get(
+    "VISURA_ARCHIVIO", os.path.join(os.path.expanduser("~"), ".local", "share", "visura", "archivio.sqlite3"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS aziende (
+    id INTEGER PRIMARY KEY,
+    chiave TEXT NOT NULL UNIQUE,
+    ragione_sociale TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS visure (
+    id INTEGER PRIMARY KEY,
+    azienda_id INTEGER NOT NULL REFERENCES aziende(id),
+    data TEXT NOT NULL,
+    elaborata TEXT,
+    file TEXT,
+    impronta TEXT UNIQUE,
+    comune TEXT,
+    via TEXT,
+    numero_addetti TEXT,
+    forma_giuridica TEXT
+);
+CREATE INDEX IF NOT EXISTS visure_azienda_data ON visure(azienda_id, data);
+CREATE INDEX IF NOT EXISTS visure_data ON visure(data);
+CREATE TABLE IF NOT EXISTS persone (
+    codice_fiscale TEXT PRIMARY KEY,
+    cognome TEXT NOT NULL,
+    nomi TEXT NOT NULL,
+    data_nascita TEXT,
+    codice_catastale TEXT,
+    comune_nascita TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS persone_cognome ON persone(cognome);
+CREATE TABLE IF NOT EXISTS cariche (
+    codice_fiscale TEXT NOT NULL,
+    visura_id INTEGER NOT NULL REFERENCES visure(id) ON DELETE CASCADE,
+    sezione TEXT NOT NULL,
+    PRIMARY KEY (codice_fiscale, visura_id, sezione)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cariche_visura ON cariche(visura_id);
+"""
+
+# Archivi creati quando visure.data era il momento dell'elaborazione ("AAAA-MM-GG HH:MM:SS")
+_MIGRAZIONE_ELABORATA = """
+ALTER TABLE visure ADD COLUMN elaborata TEXT;
+UPDATE visure SET elaborata = data, data = substr(data, 1, 10);
+"""
+
+# Condizione "v è l'ultima visura della sua azienda", risolta con l'indice visure_azienda_data:
+# conta la data del documento; a parità di data, la visura elaborata per ultima
+_ULTIMA_VISURA = """v.id = (SELECT ultima.id FROM visure ultima WHERE ultima.azienda_id = v.azienda_id
+                    ORDER BY ultima.data DESC, ultima.elaborata DESC, ultima.id DESC LIMIT 1)"""
+
+
+class Archivio:
+    """
+    Connessione all'archivio, condivisa tra i thread: letture e scritture sono
+    serializzate da un lock, quindi una ricerca attende la fine di una registrazione
+    in corso nello stesso processo. Il database è in modalità WAL: le letture di
+    altri processi (ad esempio l'interfaccia durante un batch) non attendono le scritture.
+    """
+
+    def __init__(self, percorso=PERCORSO_PREDEFINITO):
+        if percorso != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(percorso)), exist_ok=True)
+        self.percorso = percorso
+        self._lock = threading.Lock()
+        self._connessione = sqlite3.connect(percorso, check_same_thread=False)
+        self._connessione.row_factory = sqlite3.Row
+        self._connessione.execute("PRAGMA journal_mode=WAL")
+        self._connessione.execute("PRAGMA synchronous=NORMAL")
+        self._connessione.execute("PRAGMA foreign_keys=ON")
+        self._connessione.executescript(SCHEMA)
+        colonne = {riga["name"] for riga in self._connessione.execute("PRAGMA table_info(visure)")}
+        if "elaborata" not in colonne:
+            with self._connessione:
+                for istruzione in filter(str.strip, _MIGRAZIONE_ELABORATA.split(";")):
+                    self._connessione.execute(istruzione)
+
+    def chiudi(self):
+        with self._lock:
+            self._connessione.close()
+
+    def registra(self, risultato, file=None, impronta=None, data=None):
+        """Registra un risultato; restituisce False se il PDF con questa impronta era già presente"""
+        return self.registra_molti([(risultato, file, impronta, data)]) == 1
+
+    def registra_molti(self, elementi):
+        """
+        Registra in un'unica transazione una sequenza di (risultato, file, impronta, data):
+        risultato è un RisultatoVisura o il suo to_dict(), data è la data del documento
+        "AAAA-MM-GG" (None = quella di estrazione letta nella visura, oppure oggi se la
+        visura non la riporta). Persone e cariche vengono inserite con executemany.
+        Restituisce il numero di visure nuove.
+        """
+        adesso = time.strftime("%Y-%m-%d %H:%M:%S")
+        persone = []
+        cariche = []
+        nuove = 0
+        with self._lock, self._connessione:
+            cursore = self._connessione.cursor()
+            for risultato, file, impronta, data in elementi:
+                if isinstance(risultato, RisultatoVisura):
+                    risultato = risultato.to_dict()
+                intestazione = risultato["intestazione"]
+                ragione_sociale = intestazione["Ragione sociale"]
+
+                chiave = chiave_azienda(ragione_sociale)
+                if ragione_sociale == NON_TROVATO:
+                    # Aziende non riconosciute: ogni PDF resta separato dagli altri
+                    chiave = f"{NON_TROVATO}:{impronta or file or time.time_ns()}"
+                cursore.execute("INSERT INTO aziende (chiave, ragione_sociale) VALUES (?, ?) "
+                                "ON CONFLICT (chiave) DO UPDATE SET ragione_sociale = excluded.ragione_sociale",
+                                (chiave, ragione_sociale))
+                azienda_id = cursore.execute("SELECT id FROM aziende WHERE chiave = ?", (chiave,)).fetchone()[0]
+
+                cursore.execute(
+                    "INSERT OR IGNORE INTO visure (azienda_id, data, elaborata, file, impronta, comune, via, "
+                    "numero_addetti, forma_giuridica) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (azienda_id, data or risultato.get("data_estrazione") or adesso[:10], adesso, file, impronta,
+                     intestazione["Comune"], intestazione["Via"], intestazione["Numero addetti"],
+                     intestazione["Forma giuridica"]))
+                if cursore.rowcount == 0:
+                    continue  # PDF già registrato
+                visura_id = cursore.lastrowid
+                nuove += 1
+
+                for persona in risultato["persone"]:
+                    codice_fiscale = persona["Codice Fiscale"]
+                    persone.append((codice_fiscale, persona["Cognome"], persona["Nomi"],
+                                    persona.get("Data di nascita"), persona.get("Codice catastale"),
+                                    persona.get("Comune di nascita")))
+                    cariche.extend((codice_fiscale, visura_id, sezione)
+                                   for sezione in separa_sezioni(persona["Sezione"]))
+
+            # Per una persona già presente valgono i dati dell'ultima visura registrata
+            cursore.executemany(
+                "INSERT INTO persone (codice_fiscale, cognome, nomi, data_nascita, codice_catastale, comune_nascita) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (codice_fiscale) DO UPDATE SET cognome = excluded.cognome, "
+                "nomi = excluded.nomi, data_nascita = excluded.data_nascita, "
+                "codice_catastale = excluded.codice_catastale, comune_nascita = excluded.comune_nascita",
+                persone)
+            cursore.executemany("INSERT OR IGNORE INTO cariche (codice_fiscale, visura_id, sezione) VALUES (?, ?, ?)",
+                                cariche)
+        return nuove
+
+    def _interroga(self, sql, parametri=()):
+        with self._lock:
+            return [dict(riga) for riga in self._connessione.execute(sql, parametri)]
+
+    def cariche_di(self, codice_fiscale, solo_ultime=True):
+        """
+        Aziende in cui il codice fiscale ha una carica, con le sezioni. Con solo_ultime
+        si considera solo l'ultima visura di ogni azienda, altrimenti tutte le visure.
+        """
+        condizione = f"AND {_ULTIMA_VISURA}" if solo_ultime else ""
+        return self._interroga(f"""
+            SELECT a.ragione_sociale AS "Ragione sociale", v.comune AS "Comune",
+                   group_concat(c.sezione, ', ') AS "Sezione", v.data AS "Data", v.file AS "File"
+            FROM cariche c
+            JOIN visure v ON v.id = c.visura_id
+            JOIN aziende a ON a.id = v.azienda_id
+            WHERE c.codice_fiscale = ? {condizione}
+            GROUP BY v.id
+            ORDER BY a.ragione_sociale, v.data DESC, v.elaborata DESC""", (codice_fiscale.upper(),))
+
+    def persone_di(self, ragione_sociale):
+        """Persone dell'ultima visura dell'azienda, con le sezioni"""
+        return self._interroga(f"""
+            SELECT p.cognome AS "Cognome", p.nomi AS "Nomi", p.codice_fiscale AS "Codice Fiscale",
+                   p.data_nascita AS "Data di nascita", p.comune_nascita AS "Comune di nascita",
+                   group_concat(c.sezione, ', ') AS "Sezione", v.data AS "Data"
+            FROM aziende a
+            JOIN visure v ON v.azienda_id = a.id AND {_ULTIMA_VISURA}
+            JOIN cariche c ON c.visura_id = v.id
+            JOIN persone p ON p.codice_fiscale = c.codice_fiscale
+            WHERE a.chiave = ?
+            GROUP BY p.codice_fiscale
+            ORDER BY p.cognome, p.nomi""", (chiave_azienda(ragione_sociale),))
+
+    def cerca_persone(self, testo, limite=50):
+        """Persone con codice fiscale o cognome che iniziano con il testo (ricerca per prefisso sugli indici)"""
+        prefisso = " ".join(testo.split()).upper()
+        fine = prefisso + "\uffff"
+        return self._interroga("""
+            SELECT p.codice_fiscale AS "Codice Fiscale", p.cognome AS "Cognome", p.nomi AS "Nomi",
+                   p.data_nascita AS "Data di nascita", p.comune_nascita AS "Comune di nascita",
+                   (SELECT count(DISTINCT v.azienda_id) FROM cariche c JOIN visure v ON v.id = c.visura_id
+                    WHERE c.codice_fiscale = p.codice_fiscale) AS "Aziende"
+            FROM persone p
+            WHERE p.codice_fiscale IN (
+                SELECT codice_fiscale FROM persone WHERE codice_fiscale >= ? AND codice_fiscale < ?
+                UNION SELECT codice_fiscale FROM persone WHERE cognome >= ? AND cognome < ?)
+            ORDER BY p.cognome, p.nomi
+            LIMIT ?""", (prefisso, fine, prefisso, fine, limite))
+
+    def cerca_aziende(self, testo, limite=50):
+        """Aziende con il testo nella ragione sociale, con la data dell'ultima visura"""
+        return self._interroga("""
+            SELECT a.ragione_sociale AS "Ragione sociale", max(v.data) AS "Ultima visura",
+                   count(v.id) AS "Visure"
+            FROM aziende a JOIN visure v ON v.azienda_id = a.id
+            WHERE a.ragione_sociale LIKE '%' || ? || '%'
+            GROUP BY a.id
+            ORDER BY a.ragione_sociale
+            LIMIT ?""", (" ".join(testo.split()), limite))
+
+    def statistiche(self):
+        with self._lock:
+            return {tabella: self._connessione.execute(f"SELECT count(*) FROM {tabella}").fetchone()[0]
+                    for tabella in ("aziende", "visure", "persone", "cariche")}
+
+
+def _stampa_tabella(righe):
+    if not righe:
+        print("Nessun risultato.")
+        return
+    colonne = list(righe[0])
+    larghezze = [max(len(str(colonna)), *(len(str(riga[colonna] or "")) for riga in righe)) for colonna in colonne]
+    print("  ".join(str(colonna).ljust(larghezza) for colonna, larghezza in zip(colonne, larghezze)))
+    for riga in righe:
+        print("  ".join(str(riga[colonna] or "").ljust(larghezza) for colonna, larghezza in zip(colonne, larghezze)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ricerche nell'archivio delle visure elaborate")
+    parser.add_argument("--db", default=PERCORSO_PREDEFINITO, help=f"File dell'archivio (default: {PERCORSO_PREDEFINITO})")
+    comandi = parser.add_subparsers(dest="comando", required=True)
+    parser_cerca = comandi.add_parser("cerca", help="Cariche di un codice fiscale, oppure persone per cognome")
+    parser_cerca.add_argument("testo")
+    parser_cerca.add_argument("--tutte", action="store_true", help="Considera anche le visure non più recenti")
+    parser_azienda = comandi.add_parser("azienda", help="Persone dell'ultima visura di un'azienda")
+    parser_azienda.add_argument("ragione_sociale")
+    comandi.add_parser("statistiche", help="Numero di aziende, visure, persone e cariche")
+    args = parser.parse_args(argv)
+
+    archivio = Archivio(args.db)
+    try:
+        if args.comando == "cerca":
+            testo = args.testo.strip().upper()
+            if pattern_cf.fullmatch(testo):
+                _stampa_tabella(archivio.cariche_di(testo, solo_ultime=not args.tutte))
+            else:
+                _stampa_tabella(archivio.cerca_persone(testo))
+        elif args.comando == "azienda":
+            persone = archivio.persone_di(args.ragione_sociale)
+            if persone:
+                _stampa_tabella(persone)
+            else:
+                _stampa_tabella(archivio.cerca_aziende(args.ragione_sociale))
+        else:
+            for tabella, numero in archivio.statistiche().items():
+                print(f"{tabella}: {numero}")
+    finally:
+        archivio.chiudi()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Avanzamento dell'estrazione, per mostrare i risultati man mano che arrivano.
+
+L'estrazione notifica a un Osservatore le pagine lette, l'intestazione appena
+è completa e le persone dopo ogni sezione. Lavoro è un osservatore che esegue
+l'estrazione in background (ad esempio in un ThreadPoolExecutor) e ne conserva
+lo stato, che l'interfaccia legge senza attendere la fine.
+"""
+import threading
+
+
+class Osservatore:
+    """Riceve gli eventi dell'estrazione; i metodi predefiniti non fanno nulla"""
+
+    def pagina_letta(self, lette, totali):
+        pass
+
+    def intestazione_pronta(self, intestazione):
+        """intestazione: dizionario come RisultatoVisura.intestazione()"""
+        pass
+
+    def sezione_elaborata(self, nome, persone):
+        """persone: record di tutte le persone trovate fino a questa sezione compresa"""
+        pass
+
+    def avviso(self, messaggio):
+        """Problema che non impedisce di ottenere il risultato"""
+        pass
+
+
+class Lavoro(Osservatore):
+    """
+    Elaborazione di un file in background. Gli attributi vengono aggiornati dal
+    thread di lavoro e letti dall'interfaccia: ogni aggiornamento sostituisce
+    l'oggetto intero, così chi legge vede sempre uno stato coerente.
+    """
+    IN_CODA = "in coda"
+    IN_CORSO = "in corso"
+    COMPLETATO = "completato"
+    ERRORE = "errore"
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.stato = self.IN_CODA
+        self.pagine_lette = 0
+        self.pagine_totali = 0
+        self.intestazione = None
+        self.persone = []
+        self.risultato = None
+        self.errore = None
+        self.avvisi = []
+        self.futuro = None
+        self._concluso = threading.Event()
+
+    def pagina_letta(self, lette, totali):
+        self.pagine_lette, self.pagine_totali = lette, totali
+
+    def intestazione_pronta(self, intestazione):
+        self.intestazione = intestazione
+
+    def sezione_elaborata(self, nome, persone):
+        self.persone = persone
+
+    def avviso(self, messaggio):
+        self.avvisi = self.avvisi + [messaggio]
+
+    @property
+    def concluso(self):
+        return self._concluso.is_set()
+
+    @property
+    def frazione(self):
+        """Frazione delle pagine lette (la lettura può fermarsi prima dell'ultima pagina)"""
+        if self.concluso:
+            return 1.0
+        return self.pagine_lette / self.pagine_totali if self.pagine_totali else 0.0
+
+    def attendi(self, timeout=None):
+        return self._concluso.wait(timeout)
+
+    def esegui(self, funzione, *args, **kwargs):
+        """Chiama funzione(*args, osservatore=self, **kwargs) e ne conserva il risultato o l'errore"""
+        self.stato = self.IN_CORSO
+        try:
+            self.risultato = funzione(*args, osservatore=self, **kwargs)
+            self.stato = self.COMPLETATO
+        except Exception as errore:
+            self.errore = errore
+            self.stato = self.ERRORE
+        finally:
+            self._concluso.set()
+        return self.risultato
+
+
+def avvia_lavoro(esecutore, nome, funzione, *args, **kwargs):
+    """Mette in coda funzione nell'esecutore e restituisce subito il Lavoro che la segue"""
+    lavoro = Lavoro(nome)
+    lavoro.futuro = esecutore.submit(lavoro.esegui, funzione, *args, **kwargs)
+    return lavoro
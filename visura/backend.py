@@ -0,0 +1,248 @@
+"""
+Backend di estrazione del testo: "byte del PDF -> testo delle pagine".
+
+Il parser lavora solo sul testo delle pagine, quindi il motore di estrazione
+si può cambiare senza toccare l'estrazione dei campi. Backend disponibili:
+
+- "pypdf2": PyPDF2, il predefinito (le regole di estrazione sono tarate sul suo testo)
+- "pypdf": il successore di PyPDF2, se installato
+- "pymupdf": PyMuPDF, molto più veloce, se installato
+- "testo": testo già estratto (lista di pagine, oppure testo con le pagine separate da "\\f")
+
+Con "auto" (o senza indicazioni) si usa il primo backend installato nell'ordine
+di ORDINE_AUTOMATICO; se il PDF non si apre si prova con il successivo.
+La variabile d'ambiente VISURA_BACKEND cambia la scelta predefinita.
+
+Ogni backend sa anche calcolare l'impronta di una pagina (flusso dei contenuti,
+font e mappe ToUnicode): due pagine con la stessa impronta producono lo stesso
+testo, quindi il testo si può riusare da una cache (vedi visura.cache.CachePagine).
+"""
+import hashlib
+import importlib
+import importlib.util
+import io
+import os
+
+from .pdf import apri_pdf
+
+ORDINE_AUTOMATICO = ["pypdf2", "pypdf", "pymupdf"]
+
+# Chiavi delle risorse che non cambiano il testo estratto: i programmi dei font sono
+# i dati più pesanti della pagina e il testo dipende solo da codifiche e mappe ToUnicode
+_CHIAVI_IGNORATE = {"/FontFile", "/FontFile2", "/FontFile3"}
+
+
+def _aggiorna_impronta(impronta, oggetto, visti):
+    """Aggiunge all'impronta un oggetto PyPDF2/pypdf, risolvendo i riferimenti indiretti"""
+    if hasattr(oggetto, "idnum"):
+        riferimento = (oggetto.idnum, oggetto.generation)
+        if riferimento in visti:
+            impronta.update(b"@")  # oggetto già incluso (evita anche i cicli)
+            return
+        visti.add(riferimento)
+        oggetto = oggetto.get_object()
+    if isinstance(oggetto, dict):
+        if oggetto.get("/Subtype") == "/Image":
+            impronta.update(b"<immagine>")  # le immagini non contengono testo estraibile
+            return
+        impronta.update(b"<<")
+        for chiave in sorted(oggetto):
+            if chiave not in _CHIAVI_IGNORATE:
+                impronta.update(chiave.encode("utf-8", "replace"))
+                _aggiorna_impronta(impronta, oggetto[chiave], visti)
+        impronta.update(b">>")
+        if hasattr(oggetto, "get_data"):
+            impronta.update(oggetto.get_data())
+    elif isinstance(oggetto, list):
+        impronta.update(b"[")
+        for elemento in oggetto:
+            _aggiorna_impronta(impronta, elemento, visti)
+        impronta.update(b"]")
+    else:
+        impronta.update(repr(oggetto).encode("utf-8", "replace"))
+
+
+class BackendTesto:
+    """Interfaccia comune: apre un documento e ne genera il testo pagina per pagina"""
+    nome = None
+    modulo = None  # modulo da cui dipende il backend
+
+    def disponibile(self):
+        return self.modulo is None or importlib.util.find_spec(self.modulo) is not None
+
+    def versione(self):
+        """Versione della libreria: versioni diverse possono estrarre testi diversi"""
+        if self.modulo is None:
+            return ""
+        return str(getattr(importlib.import_module(self.modulo), "__version__", ""))
+
+    def apri(self, sorgente):
+        """Documento nativo del backend; la sorgente è un percorso, dei byte o un file binario"""
+        raise NotImplementedError
+
+    def numero_pagine(self, documento):
+        raise NotImplementedError
+
+    def testo_pagine(self, documento, inizio=0, fine=None):
+        """Genera il testo delle pagine da inizio a fine (escluso), estraendolo solo quando serve"""
+        raise NotImplementedError
+
+    def impronta_pagina(self, documento, indice):
+        """Impronta di tutto ciò da cui dipende il testo della pagina, oppure None se non calcolabile"""
+        return None
+
+
+class BackendPyPDF2(BackendTesto):
+    nome = "pypdf2"
+    modulo = "PyPDF2"
+
+    def apri(self, sorgente):
+        return apri_pdf(sorgente)
+
+    def numero_pagine(self, documento):
+        return len(documento.pages)
+
+    def testo_pagine(self, documento, inizio=0, fine=None):
+        for indice in range(inizio, self.numero_pagine(documento) if fine is None else fine):
+            yield documento.pages[indice].extract_text()
+
+    def impronta_pagina(self, documento, indice):
+        pagina = documento.pages[indice]
+        impronta = hashlib.sha256()
+        contenuto = pagina.get_contents()
+        impronta.update(contenuto.get_data() if contenuto is not None else b"")
+        impronta.update(repr(pagina.get("/Rotate", 0)).encode())
+        _aggiorna_impronta(impronta, pagina.get("/Resources"), set())
+        return impronta.hexdigest()
+
+
+class BackendPypdf(BackendPyPDF2):
+    nome = "pypdf"
+    modulo = "pypdf"
+
+    def apri(self, sorgente):
+        from pypdf import PdfReader
+
+        if isinstance(sorgente, (bytes, bytearray)):
+            sorgente = io.BytesIO(sorgente)
+        return PdfReader(sorgente)
+
+
+class BackendPyMuPDF(BackendTesto):
+    nome = "pymupdf"
+    modulo = "pymupdf"
+
+    def apri(self, sorgente):
+        import pymupdf
+
+        if isinstance(sorgente, (bytes, bytearray)):
+            return pymupdf.open(stream=bytes(sorgente), filetype="pdf")
+        if hasattr(sorgente, "read"):
+            return pymupdf.open(stream=sorgente.read(), filetype="pdf")
+        return pymupdf.open(sorgente)
+
+    def numero_pagine(self, documento):
+        return documento.page_count
+
+    def testo_pagine(self, documento, inizio=0, fine=None):
+        for indice in range(inizio, documento.page_count if fine is None else fine):
+            yield documento[indice].get_text()
+
+    def impronta_pagina(self, documento, indice):
+        pagina = documento[indice]
+        impronta = hashlib.sha256(pagina.read_contents())
+        impronta.update(str(pagina.rotation).encode())
+        # Font usati dalla pagina (anche dentro gli XObject): descrizione, larghezze e mappa ToUnicode
+        for xref, _, tipo, nome_base, nome, codifica, *_ in pagina.get_fonts(full=True):
+            impronta.update(f"{tipo}|{nome_base}|{nome}|{codifica}|".encode())
+            impronta.update(documento.xref_get_key(xref, "Widths")[1].encode())
+            tipo_valore, valore = documento.xref_get_key(xref, "ToUnicode")
+            if tipo_valore == "xref":
+                impronta.update(documento.xref_stream(int(valore.split()[0])) or b"")
+        for xref, *_ in pagina.get_xobjects():
+            impronta.update(documento.xref_stream(xref) or b"")
+        return impronta.hexdigest()
+
+
+class BackendTestoEstratto(BackendTesto):
+    """
+    Testo già estratto, ad esempio da un altro strumento o da un'elaborazione
+    precedente: lista di pagine, oppure testo (str, byte UTF-8 o percorso di un
+    file .txt) con le pagine separate da un carattere di fine pagina.
+    """
+    nome = "testo"
+    SEPARATORE_PAGINE = "\f"
+
+    def apri(self, sorgente):
+        if isinstance(sorgente, (list, tuple)):
+            return list(sorgente)
+        if isinstance(sorgente, (bytes, bytearray)):
+            testo = bytes(sorgente).decode("utf-8")
+        elif hasattr(sorgente, "read"):
+            testo = sorgente.read()
+            if isinstance(testo, bytes):
+                testo = testo.decode("utf-8")
+        else:
+            with open(sorgente, "r", encoding="utf-8") as f:
+                testo = f.read()
+        return testo.split(self.SEPARATORE_PAGINE)
+
+    def numero_pagine(self, documento):
+        return len(documento)
+
+    def testo_pagine(self, documento, inizio=0, fine=None):
+        yield from documento[inizio:fine]
+
+
+BACKEND = {backend.nome: backend for backend in
+           (BackendPyPDF2(), BackendPypdf(), BackendPyMuPDF(), BackendTestoEstratto())}
+
+
+def ottieni_backend(nome=None):
+    """
+    Backend con il nome richiesto; senza nome (o con "auto") il primo disponibile
+    di ORDINE_AUTOMATICO. Solleva ValueError se il backend non esiste o non è installato.
+    """
+    nome = (nome or os.environ.get("VISURA_BACKEND") or "auto").lower()
+    if nome == "auto":
+        candidati = backend_automatici()
+        if not candidati:
+            raise ValueError("Nessun backend PDF installato: serve almeno PyPDF2")
+        return candidati[0]
+    if nome not in BACKEND:
+        raise ValueError(f"Backend sconosciuto: {nome} (disponibili: {', '.join(BACKEND)})")
+    backend = BACKEND[nome]
+    if not backend.disponibile():
+        raise ValueError(f"Il backend {nome} richiede il modulo {backend.modulo}, che non è installato")
+    return backend
+
+
+def backend_automatici():
+    return [BACKEND[nome] for nome in ORDINE_AUTOMATICO if BACKEND[nome].disponibile()]
+
+
+def apri_documento(sorgente, backend=None):
+    """
+    Apre la sorgente e restituisce (backend, documento). Una lista di pagine usa
+    sempre il backend "testo". In modalità automatica, se un backend non riesce ad
+    aprire il PDF si prova con il successivo; se falliscono tutti si solleva il primo errore.
+    """
+    if isinstance(sorgente, (list, tuple)):
+        backend = "testo"
+    nome = (backend or os.environ.get("VISURA_BACKEND") or "auto").lower()
+    if nome != "auto":
+        scelto = ottieni_backend(nome)
+        return scelto, scelto.apri(sorgente)
+
+    candidati = backend_automatici()
+    if not candidati:
+        raise ValueError("Nessun backend PDF installato: serve almeno PyPDF2")
+    primo_errore = None
+    for candidato in candidati:
+        if hasattr(sorgente, "seek"):
+            sorgente.seek(0)
+        try:
+            return candidato, candidato.apri(sorgente)
+        except Exception as errore:
+            primo_errore = primo_errore or errore
+    raise primo_errore
@@ -0,0 +1,233 @@
+"""
+Elaborazione in parallelo di intere cartelle di visure.
+
+Uso:
+    python -m visura.batch CARTELLA_O_GLOB [-o USCITA] [--processi N] [--formato jsonl|csv] [--cache CARTELLA]
+                           [--backend NOME] [--archivio FILE] [--consolidato csv,parquet,arrow,xlsx]
+                           [--checkpoint CARTELLA]
+
+Per ogni visura viene scritto un file con i nominativi (uno per azienda),
+più un file con tutte le righe di tutte le persone e un report degli errori.
+Con --archivio i risultati vengono aggiunti anche all'archivio SQLite (vedi visura.archivio),
+con --consolidato si scrive in USCITA/consolidato l'esportazione con le persone
+senza duplicati tra le aziende, nei formati indicati (vedi visura.consolidato).
+Con --checkpoint il testo di ogni visura viene salvato in CARTELLA, da cui
+python -m visura.checkpoint la rielabora senza i PDF (vedi visura.checkpoint).
+Un file che non si riesce ad elaborare non interrompe l'esecuzione, nemmeno se
+manda in crash il processo che lo elabora: il pool viene ricreato e i file interrotti
+riprovati uno alla volta, così solo quello che causa il crash finisce tra gli errori.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .archivio import Archivio
+from .backend import BACKEND
+from .consolidato import FORMATI, EsportazioneConsolidata, formati_disponibili, righe_persone
+from .elaborazione import Scrittore, crea_pool, elabora_in_worker
+
+# Visure accumulate prima di ogni scrittura nell'archivio, fatta in un'unica transazione
+BLOCCO_ARCHIVIO = 200
+
+
+def trova_pdf(sorgenti):
+    """Espande cartelle e pattern glob nell'elenco ordinato dei PDF da elaborare"""
+    percorsi = []
+    for sorgente in sorgenti:
+        if os.path.isdir(sorgente):
+            candidati = glob.glob(os.path.join(sorgente, "**", "*"), recursive=True)
+        else:
+            candidati = glob.glob(sorgente, recursive=True)
+        percorsi.extend(p for p in candidati if os.path.isfile(p) and p.lower().endswith(".pdf"))
+    # Rimuove i duplicati mantenendo un ordine stabile
+    return sorted(set(percorsi))
+
+
+def _nome_uscita(percorso, usati, formato):
+    """Nome del file per azienda, evitando collisioni tra PDF omonimi in cartelle diverse"""
+    base = os.path.splitext(os.path.basename(percorso))[0]
+    nome = base
+    contatore = 1
+    while nome in usati:
+        contatore += 1
+        nome = f"{base}_{contatore}"
+    usati.add(nome)
+    return f"{nome}.{formato}"
+
+
+def _impronta_file(percorso):
+    with open(percorso, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _elabora_su_pool(percorsi, processi, *argomenti):
+    """
+    Genera (percorso, risultato, errore) man mano che i file sono elaborati, al massimo
+    processi alla volta. Se un processo termina in modo anomalo (ad esempio per un PDF
+    che manda in crash la libreria) il pool viene ricreato e i file che stava elaborando
+    vengono riprovati uno alla volta: un file che fa cadere il pool anche da solo è un errore.
+    """
+    da_elaborare = deque(percorsi)
+    sospetti = deque()  # file interrotti dalla caduta di un processo, da riprovare isolati
+    in_corso = {}  # futuro -> percorso
+    isolato = None  # futuro del sospetto in elaborazione, sempre da solo
+    pool = crea_pool(processi)
+    try:
+        while da_elaborare or sospetti or in_corso:
+            caduto = False
+            try:
+                if sospetti:
+                    if not in_corso:
+                        isolato = pool.submit(elabora_in_worker, sospetti[0], *argomenti)
+                        in_corso[isolato] = sospetti.popleft()
+                else:
+                    while da_elaborare and len(in_corso) < processi:
+                        futuro = pool.submit(elabora_in_worker, da_elaborare[0], *argomenti)
+                        in_corso[futuro] = da_elaborare.popleft()
+            except BrokenProcessPool:
+                caduto = True
+            if in_corso:
+                conclusi, _ = wait(in_corso, return_when=FIRST_COMPLETED)
+                if any(isinstance(futuro.exception(), BrokenProcessPool) for futuro in conclusi):
+                    # Tutti i file del pool caduto terminano insieme: si raccolgono prima di ricrearlo
+                    caduto = True
+                    conclusi, _ = wait(in_corso)
+                for futuro in conclusi:
+                    percorso = in_corso.pop(futuro)
+                    try:
+                        risultato, errore = futuro.result()
+                    except BrokenProcessPool:
+                        if futuro is not isolato:
+                            sospetti.append(percorso)
+                            continue
+                        risultato, errore = None, {"Errore": "BrokenProcessPool", "Traceback": "",
+                                                   "Messaggio": "processo di elaborazione terminato in modo anomalo"}
+                    yield percorso, risultato, errore
+            if caduto:
+                pool.shutdown(wait=False)
+                pool = crea_pool(processi)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def elabora_batch(percorsi, cartella_uscita, processi=None, formato="jsonl", cartella_cache=None, backend=None,
+                 stampa=print, archivio=None, consolidato=None, cartella_checkpoint=None):
+    """
+    Elabora i PDF su un pool di processi e scrive i risultati appena sono pronti.
+    Con archivio (un Archivio) i risultati vengono registrati anche lì, a blocchi;
+    con consolidato (una EsportazioneConsolidata) vengono aggiunti all'esportazione;
+    con cartella_checkpoint il testo delle visure viene salvato lì (vedi visura.checkpoint).
+    Restituisce il numero di file elaborati e l'elenco degli errori.
+    """
+    cartella_aziende = os.path.join(cartella_uscita, "aziende")
+    os.makedirs(cartella_aziende, exist_ok=True)
+
+    tutte = Scrittore(os.path.join(cartella_uscita, f"persone.{formato}"), formato)
+    report_errori = open(os.path.join(cartella_uscita, "errori.jsonl"), "w", encoding="utf-8")
+    nomi_usati = set()
+    elaborati = 0
+    errori = []
+    da_archiviare = []
+
+    risultati = _elabora_su_pool(percorsi, processi or os.cpu_count() or 1, cartella_cache, backend, cartella_checkpoint)
+    try:
+        for n, (percorso, risultato, errore) in enumerate(risultati, start=1):
+            if errore is not None:
+                errore = {"File": percorso, **errore}
+                errori.append(errore)
+                report_errori.write(json.dumps(errore, ensure_ascii=False) + "\n")
+                report_errori.flush()
+                stampa(f"[{n}/{len(percorsi)}] ERRORE {percorso}: {errore['Messaggio']}")
+                continue
+
+            righe = list(righe_persone(percorso, risultato))
+            azienda = Scrittore(os.path.join(cartella_aziende, _nome_uscita(percorso, nomi_usati, formato)), formato)
+            try:
+                azienda.scrivi(righe)
+            finally:
+                azienda.chiudi()
+            tutte.scrivi(righe)
+            if consolidato is not None:
+                consolidato.aggiungi(risultato, percorso)
+            if archivio is not None:
+                da_archiviare.append((risultato, os.path.abspath(percorso), _impronta_file(percorso), None))
+                if len(da_archiviare) >= BLOCCO_ARCHIVIO:
+                    archivio.registra_molti(da_archiviare)
+                    da_archiviare.clear()
+            elaborati += 1
+            stampa(f"[{n}/{len(percorsi)}] {percorso}: {len(righe)} nominativi")
+        if da_archiviare:
+            archivio.registra_molti(da_archiviare)
+    finally:
+        risultati.close()
+        tutte.chiudi()
+        report_errori.close()
+
+    return elaborati, errori
+
+
+def esportazione_da_opzione(parser, opzione, cartella):
+    """EsportazioneConsolidata per l'opzione --consolidato; i formati che richiedono pyarrow mancante si saltano"""
+    formati = [formato.strip() for formato in opzione.split(",") if formato.strip()]
+    non_validi = [formato for formato in formati if formato not in FORMATI]
+    if non_validi:
+        parser.error(f"formati non supportati: {', '.join(non_validi)} (ammessi: {', '.join(FORMATI)})")
+    for formato in set(formati) - set(formati_disponibili()):
+        print(f"Formato {formato} non disponibile (serve pyarrow): salto", file=sys.stderr)
+        formati.remove(formato)
+    return EsportazioneConsolidata(cartella, formati)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estrazione in parallelo da cartelle di visure camerali Telemaco")
+    parser.add_argument("sorgenti", nargs="+", help="Cartelle o pattern glob con i PDF delle visure")
+    parser.add_argument("-o", "--uscita", default="risultati", help="Cartella dei risultati (default: risultati)")
+    parser.add_argument("-p", "--processi", type=int, default=None,
+                        help="Numero di processi (default: numero di core)")
+    parser.add_argument("-f", "--formato", choices=["jsonl", "csv"], default="jsonl",
+                        help="Formato dei file di uscita (default: jsonl)")
+    parser.add_argument("--cache", default=None, metavar="CARTELLA",
+                        help="Riusa i risultati delle visure già elaborate (e le pagine invariate) salvati in questa cartella")
+    parser.add_argument("--backend", default=None, choices=["auto"] + list(BACKEND),
+                        help="Motore di estrazione del testo (default: auto)")
+    parser.add_argument("--archivio", default=None, metavar="FILE",
+                        help="Aggiunge i risultati a questo archivio SQLite")
+    parser.add_argument("--consolidato", default=None, metavar="FORMATI",
+                        help="Esportazione consolidata in USCITA/consolidato, formati separati da virgola "
+                             "tra csv, parquet, arrow e xlsx")
+    parser.add_argument("--checkpoint", default=None, metavar="CARTELLA",
+                        help="Salva in questa cartella il testo delle visure, per rielaborarle senza i PDF")
+    args = parser.parse_args(argv)
+
+    percorsi = trova_pdf(args.sorgenti)
+    if not percorsi:
+        print("Nessun PDF trovato.", file=sys.stderr)
+        return 1
+
+    consolidato = None
+    if args.consolidato:
+        consolidato = esportazione_da_opzione(parser, args.consolidato, os.path.join(args.uscita, "consolidato"))
+
+    archivio = Archivio(args.archivio) if args.archivio else None
+    try:
+        elaborati, errori = elabora_batch(percorsi, args.uscita, args.processi, args.formato, args.cache,
+                                          args.backend, archivio=archivio, consolidato=consolidato,
+                                          cartella_checkpoint=args.checkpoint)
+    finally:
+        if archivio is not None:
+            archivio.chiudi()
+        if consolidato is not None:
+            for percorso in consolidato.chiudi():
+                print(f"Scritto {percorso}")
+    print(f"Elaborati {elaborati} file su {len(percorsi)}, errori: {len(errori)}")
+    return 1 if errori else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""
+Benchmark dell'estrazione su visure sintetiche generate in locale.
+
+    python -m visura.benchmark [--scenari piccola,media] [--formato testo|pdf|entrambi]
+                               [--backend NOME] [--ripetizioni N] [--uscita risultati.json]
+                               [--confronta precedente.json]
+    python -m visura.benchmark --memoria
+
+Con --memoria misura invece il picco di memoria su visure con lo stesso numero
+di persone e sezioni sempre più lunghe: l'estrazione lavora in streaming, quindi
+il picco deve restare circa costante mentre il documento cresce.
+
+Per ogni scenario misura il tempo di ogni fase e dell'intera estrazione (mediana
+delle ripetizioni), le pagine lette e le persone al secondo e il picco di memoria,
+e controlla che i valori estratti coincidano con quelli attesi. Il JSON di uscita
+riporta il commit e l'ambiente, così i risultati si possono confrontare tra commit.
+Le pagine al secondo contano solo quelle lette: l'estrazione si ferma alla sezione
+di fine, e le pagine seguenti sono riportate a parte (pagine_documento_al_secondo).
+Non serve la rete: il formato "pdf" richiede solo un backend PDF installato
+(--backend sceglie quale, per confrontare i motori di estrazione).
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from .backend import BACKEND, backend_automatici
+from .corpus import confronta, genera_visura
+from .estrazione import estrai_dati
+
+# Dimensioni dei documenti: la "Storia delle modifiche" allunga la parte dopo la sezione di fine
+SCENARI = {
+    "piccola": dict(persone=8, sezioni=2, righe_storia=100),
+    "media": dict(persone=60, sezioni=3, righe_storia=1500),
+    "grande": dict(persone=250, sezioni=4, righe_storia=8000),
+    "consorzio": dict(persone=1500, sezioni=4, righe_storia=300),
+}
+
+# Modalità --memoria: stesse persone, righe di dettaglio sotto ogni carica sempre più numerose
+PARAMETRI_MEMORIA = dict(persone=200, sezioni=4, righe_storia=100)
+RIGHE_DETTAGLIO_MEMORIA = [0, 5, 15, 40]
+
+
+def _estrattore(visura, formato, backend=None):
+    """Funzione senza argomenti che esegue un'estrazione completa nel formato richiesto"""
+    if formato == "pdf":
+        dati_pdf = visura.pdf()
+        return lambda: estrai_dati(dati_pdf, backend=backend)
+    # Il testo delle pagine passa dal backend "testo": nessuna estrazione dal PDF
+    return lambda: estrai_dati(visura.pagine)
+
+
+def esegui_scenario(nome, parametri, formato="testo", ripetizioni=5, seme=0, backend=None):
+    visura = genera_visura(seme=seme, **parametri)
+    estrai = _estrattore(visura, formato, backend)
+
+    # Prima esecuzione: verifica dei risultati e riscaldamento
+    risultato = estrai()
+    differenze = confronta(visura, risultato)
+
+    tempi = []
+    fasi = {}
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        risultato = estrai()
+        tempi.append(time.perf_counter() - inizio)
+        for fase, secondi in risultato.diagnostica.fasi.items():
+            fasi.setdefault(fase, []).append(secondi)
+
+    # Il picco di memoria si misura a parte: tracemalloc rallenta l'esecuzione
+    tracemalloc.start()
+    estrai()
+    _, picco = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    diagnostica = risultato.diagnostica
+    mediana = statistics.median(tempi)
+    pagine = len(visura.pagine)
+    return {
+        "scenario": nome,
+        "formato": formato,
+        "backend": diagnostica.backend,
+        "parametri": parametri,
+        "pagine": pagine,
+        "pagine_lette": diagnostica.pagine_lette,
+        "persone": len(risultato.dati),
+        "tempo_mediano_ms": round(mediana * 1000, 3),
+        "tempo_minimo_ms": round(min(tempi) * 1000, 3),
+        "fasi_ms": {fase: round(statistics.median(valori) * 1000, 3) for fase, valori in fasi.items()},
+        "pagine_al_secondo": round(diagnostica.pagine_lette / mediana, 1),
+        "pagine_documento_al_secondo": round(pagine / mediana, 1),
+        "persone_al_secondo": round(len(risultato.dati) / mediana, 1),
+        "picco_memoria_kib": round(picco / 1024, 1),
+        "corretto": not differenze,
+        "differenze": differenze[:10],
+    }
+
+
+def misura_memoria(righe_dettaglio, seme=0):
+    """Picco di memoria dell'estrazione dal testo delle pagine, rispetto alla dimensione del documento"""
+    visura = genera_visura(seme=seme, righe_dettaglio=righe_dettaglio, **PARAMETRI_MEMORIA)
+    differenze = confronta(visura, estrai_dati(visura.pagine))
+
+    # Le pagine esistono già prima della misura, come quelle prodotte una alla volta da un backend PDF
+    tracemalloc.start()
+    estrai_dati(visura.pagine)
+    _, picco = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    caratteri = sum(len(pagina) for pagina in visura.pagine)
+    return {
+        "righe_dettaglio": righe_dettaglio,
+        "pagine": len(visura.pagine),
+        "testo_kib": round(caratteri / 1024, 1),
+        "pagina_massima_kib": round(max(len(pagina) for pagina in visura.pagine) / 1024, 1),
+        "picco_memoria_kib": round(picco / 1024, 1),
+        "picco_su_testo": round(picco / caratteri, 3),
+        "corretto": not differenze,
+        "differenze": differenze[:10],
+    }
+
+
+def ambiente():
+    """Commit, interprete e versioni delle dipendenze, per rendere confrontabili i risultati"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    try:
+        import PyPDF2
+        versione_pypdf2 = PyPDF2.__version__
+    except ImportError:
+        versione_pypdf2 = None
+    return {
+        "commit": commit,
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "piattaforma": platform.platform(),
+        "PyPDF2": versione_pypdf2,
+    }
+
+
+def stampa_confronto(precedente, attuale):
+    """Rapporto tra i tempi mediani attuali e quelli di un'esecuzione precedente"""
+    vecchi = {(r["scenario"], r["formato"], r.get("backend")): r for r in precedente["risultati"]}
+    print(f"\nConfronto con {precedente['ambiente'].get('commit')}:")
+    for risultato in attuale["risultati"]:
+        vecchio = vecchi.get((risultato["scenario"], risultato["formato"], risultato["backend"]))
+        if vecchio is None:
+            continue
+        rapporto = risultato["tempo_mediano_ms"] / vecchio["tempo_mediano_ms"]
+        print(f"  {risultato['scenario']:<10} {risultato['formato']:<6} "
+              f"{vecchio['tempo_mediano_ms']:>10.2f} -> {risultato['tempo_mediano_ms']:>10.2f} ms  (x{rapporto:.2f})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dell'estrazione su visure sintetiche")
+    parser.add_argument("--scenari", default=",".join(SCENARI),
+                        help=f"Scenari separati da virgola (default: {','.join(SCENARI)})")
+    parser.add_argument("--formato", choices=["testo", "pdf", "entrambi"], default="entrambi",
+                        help="testo: solo il parser; pdf: anche l'estrazione del testo (default: entrambi)")
+    parser.add_argument("--backend", default=None, choices=["auto"] + list(BACKEND),
+                        help="Motore di estrazione del testo per il formato pdf (default: auto)")
+    parser.add_argument("--ripetizioni", type=int, default=5)
+    parser.add_argument("--uscita", default=None, help="Salva i risultati in questo file JSON")
+    parser.add_argument("--confronta", default=None, help="File JSON di un'esecuzione precedente")
+    parser.add_argument("--memoria", action="store_true",
+                        help="Misura il picco di memoria al crescere delle sezioni invece dei tempi")
+    args = parser.parse_args(argv)
+
+    if args.memoria:
+        return main_memoria(args.uscita)
+
+    formati = ["testo", "pdf"] if args.formato == "entrambi" else [args.formato]
+    if "pdf" in formati and not backend_automatici():
+        print("Nessun backend PDF installato: salto il formato pdf", file=sys.stderr)
+        formati.remove("pdf")
+
+    risultati = []
+    for nome in args.scenari.split(","):
+        for formato in formati:
+            risultato = esegui_scenario(nome, SCENARI[nome], formato, args.ripetizioni, backend=args.backend)
+            risultati.append(risultato)
+            esito = "ok" if risultato["corretto"] else "ERRATO"
+            print(f"{nome:<10} {formato:<6} {risultato['backend']:<8} {risultato['tempo_mediano_ms']:>10.2f} ms  "
+                  f"{risultato['pagine_lette']:>4}/{risultato['pagine']:<4} pag  "
+                  f"{risultato['pagine_al_secondo']:>9.1f} pag lette/s  {risultato['persone_al_secondo']:>10.1f} pers/s  "
+                  f"{risultato['picco_memoria_kib']:>9.1f} KiB  {esito}")
+            for differenza in risultato["differenze"]:
+                print(f"    {differenza}")
+
+    uscita = {"ambiente": ambiente(), "risultati": risultati}
+    if args.uscita:
+        with open(args.uscita, "w", encoding="utf-8") as f:
+            json.dump(uscita, f, ensure_ascii=False, indent=2)
+    if args.confronta:
+        with open(args.confronta, "r", encoding="utf-8") as f:
+            stampa_confronto(json.load(f), uscita)
+
+    return 0 if all(r["corretto"] for r in risultati) else 1
+
+
+def main_memoria(uscita=None):
+    print(f"{'dettaglio':>9} {'pagine':>7} {'testo KiB':>10} {'picco KiB':>10} {'picco/testo':>12}")
+    risultati = []
+    for righe_dettaglio in RIGHE_DETTAGLIO_MEMORIA:
+        risultato = misura_memoria(righe_dettaglio)
+        risultati.append(risultato)
+        esito = "ok" if risultato["corretto"] else "ERRATO"
+        print(f"{righe_dettaglio:>9} {risultato['pagine']:>7} {risultato['testo_kib']:>10.1f} "
+              f"{risultato['picco_memoria_kib']:>10.1f} {risultato['picco_su_testo']:>12.3f}  {esito}")
+        for differenza in risultato["differenze"]:
+            print(f"    {differenza}")
+
+    if uscita:
+        with open(uscita, "w", encoding="utf-8") as f:
+            json.dump({"ambiente": ambiente(), "memoria": risultati}, f, ensure_ascii=False, indent=2)
+    return 0 if all(r["corretto"] for r in risultati) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
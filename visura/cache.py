@@ -0,0 +1,257 @@
+"""
+Cache dei risultati indicizzata per contenuto del PDF.
+
+La chiave è lo SHA-256 dei byte del PDF combinato con la versione del parser:
+la versione è calcolata dal codice sorgente del pacchetto, quindi qualsiasi
+modifica alla logica di estrazione invalida automaticamente le voci vecchie.
+Ci sono due livelli: una LRU in memoria e una cartella su disco con pulizia
+per dimensione totale ed età delle voci.
+
+CachePagine conserva invece il testo delle singole pagine, indicizzato per
+impronta della pagina: quando una visura aggiornata cambia solo in parte,
+le pagine rimaste uguali non vengono riestratte.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from .backend import apri_documento, ottieni_backend
+from .comuni import TABELLA_PREDEFINITA, percorso_tabella
+from .diagnostica import Diagnostica
+from .estrazione import estrai_da_documento
+from .pdf import leggi_byte
+from .risultato import RisultatoVisura
+
+# Da incrementare quando cambia il formato delle voci salvate su disco
+VERSIONE_FORMATO = "1"
+
+CARTELLA_PREDEFINITA = os.environ.get("VISURA_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "visura"))
+
+
+@lru_cache(maxsize=None)
+def versione_parser():
+    """
+    Impronta del codice sorgente del pacchetto e delle sue tabelle (i comuni finiscono
+    nei risultati), compresa quella indicata da VISURA_COMUNI, calcolata una sola volta per processo
+    """
+    cartella = os.path.dirname(os.path.abspath(__file__))
+    impronta = hashlib.sha256(VERSIONE_FORMATO.encode())
+    for nome in sorted(os.listdir(cartella)):
+        if nome.endswith((".py", ".tsv")):
+            with open(os.path.join(cartella, nome), "rb") as f:
+                impronta.update(nome.encode())
+                impronta.update(f.read())
+    tabella = percorso_tabella()
+    if os.path.abspath(tabella) != TABELLA_PREDEFINITA:
+        with open(tabella, "rb") as f:
+            impronta.update(b"VISURA_COMUNI")
+            impronta.update(f.read())
+    return impronta.hexdigest()[:16]
+
+
+def chiave_pdf(dati_pdf, backend="pypdf2"):
+    """Chiave di cache per i byte di un PDF: backend diversi possono estrarre testi diversi"""
+    return f"{hashlib.sha256(dati_pdf).hexdigest()}-{backend}-{versione_parser()}"
+
+
+class CacheMemoria:
+    """LRU in memoria, sicura rispetto ai thread"""
+
+    def __init__(self, max_elementi=256):
+        self.max_elementi = max_elementi
+        self._voci = OrderedDict()
+        self._lock = threading.Lock()
+
+    def leggi(self, chiave):
+        with self._lock:
+            valore = self._voci.get(chiave)
+            if valore is not None:
+                self._voci.move_to_end(chiave)
+            return valore
+
+    def scrivi(self, chiave, valore):
+        with self._lock:
+            self._voci[chiave] = valore
+            self._voci.move_to_end(chiave)
+            while len(self._voci) > self.max_elementi:
+                self._voci.popitem(last=False)
+
+
+class CacheDisco:
+    """
+    Voci JSON in una cartella. Le voci più vecchie di eta_massima secondi vengono
+    eliminate, e se la cartella supera dimensione_massima byte si eliminano
+    quelle usate meno di recente. La pulizia scorre tutta la cartella: con molte
+    voci piccole conviene farla solo ogni intervallo_pulizia scritture.
+    """
+
+    def __init__(self, cartella=CARTELLA_PREDEFINITA, dimensione_massima=200 * 1024 * 1024,
+                 eta_massima=90 * 24 * 3600, intervallo_pulizia=1):
+        self.cartella = cartella
+        self.dimensione_massima = dimensione_massima
+        self.eta_massima = eta_massima
+        self.intervallo_pulizia = intervallo_pulizia
+        self._scritture = 0
+        os.makedirs(cartella, exist_ok=True)
+
+    def _percorso(self, chiave):
+        return os.path.join(self.cartella, f"{chiave}.json")
+
+    def leggi(self, chiave):
+        percorso = self._percorso(chiave)
+        try:
+            if time.time() - os.path.getmtime(percorso) > self.eta_massima:
+                os.remove(percorso)
+                return None
+            with open(percorso, "r", encoding="utf-8") as f:
+                valore = json.load(f)
+            # Aggiorna la data di modifica: serve come "ultimo utilizzo" per la pulizia
+            os.utime(percorso)
+            return valore
+        except (OSError, ValueError):
+            return None
+
+    def scrivi(self, chiave, valore):
+        # Scrittura atomica: un lettore concorrente non vede mai un file a metà
+        descrittore, temporaneo = tempfile.mkstemp(dir=self.cartella, suffix=".tmp")
+        try:
+            with os.fdopen(descrittore, "w", encoding="utf-8") as f:
+                json.dump(valore, f, ensure_ascii=False)
+            os.replace(temporaneo, self._percorso(chiave))
+        except OSError:
+            if os.path.exists(temporaneo):
+                os.remove(temporaneo)
+            raise
+        self._scritture += 1
+        if self._scritture % self.intervallo_pulizia == 0:
+            self.pulisci()
+
+    def pulisci(self):
+        """Elimina le voci scadute e poi le meno recenti finché non si rientra nella dimensione massima"""
+        adesso = time.time()
+        voci = []
+        for voce in os.scandir(self.cartella):
+            if not voce.name.endswith(".json"):
+                continue
+            try:
+                stat = voce.stat()
+            except OSError:
+                continue
+            if adesso - stat.st_mtime > self.eta_massima:
+                self._elimina(voce.path)
+            else:
+                voci.append((stat.st_mtime, stat.st_size, voce.path))
+
+        totale = sum(dimensione for _, dimensione, _ in voci)
+        for _, dimensione, percorso in sorted(voci):
+            if totale <= self.dimensione_massima:
+                break
+            self._elimina(percorso)
+            totale -= dimensione
+
+    @staticmethod
+    def _elimina(percorso):
+        try:
+            os.remove(percorso)
+        except OSError:
+            pass
+
+
+class CacheRisultati:
+    """Cache a due livelli: prima la memoria, poi il disco (se configurato)"""
+
+    def __init__(self, memoria=None, disco=None):
+        self.memoria = memoria if memoria is not None else CacheMemoria()
+        self.disco = disco
+
+    def leggi(self, chiave):
+        valore = self.memoria.leggi(chiave)
+        if valore is None and self.disco is not None:
+            valore = self.disco.leggi(chiave)
+            if valore is not None:
+                self.memoria.scrivi(chiave, valore)
+        return valore
+
+    def scrivi(self, chiave, valore):
+        self.memoria.scrivi(chiave, valore)
+        if self.disco is not None:
+            self.disco.scrivi(chiave, valore)
+
+
+class CachePagine(CacheRisultati):
+    """
+    Testo delle singole pagine. La chiave è l'impronta della pagina calcolata dal
+    backend (flusso dei contenuti, font, mappe ToUnicode) con nome e versione
+    della libreria di estrazione: non dipende dal resto del PDF né dal parser.
+    """
+
+    def __init__(self, memoria=None, disco=None):
+        super().__init__(memoria if memoria is not None else CacheMemoria(max_elementi=4096), disco)
+
+    def testo_pagine(self, backend, documento, diagnostica=None):
+        """Come backend.testo_pagine, ma estrae solo le pagine che non sono in cache"""
+        versione = backend.versione()
+        for indice in range(backend.numero_pagine(documento)):
+            impronta = backend.impronta_pagina(documento, indice)
+            chiave = None if impronta is None else f"{impronta}-{backend.nome}-{versione}"
+            testo = None if chiave is None else self.leggi(chiave)
+            if testo is not None:
+                if diagnostica is not None:
+                    diagnostica.pagine_da_cache += 1
+                yield testo
+                continue
+            testo = next(backend.testo_pagine(documento, indice, indice + 1))
+            if chiave is not None:
+                self.scrivi(chiave, testo)
+            yield testo
+
+
+def cache_pagine_su_disco(cartella=CARTELLA_PREDEFINITA):
+    """Cache delle pagine nella sottocartella "pagine": voci piccole e numerose, pulizia ogni 500 scritture"""
+    return CachePagine(disco=CacheDisco(os.path.join(cartella, "pagine"), intervallo_pulizia=500))
+
+
+def estrai_dati_con_cache(sorgente, cache, backend=None, osservatore=None, cache_pagine=None):
+    """
+    Come estrai_dati, ma restituisce subito il risultato se lo stesso PDF
+    è già stato elaborato con la versione corrente del parser e lo stesso backend.
+    La sorgente può essere un percorso, dei byte o un file aperto in binario.
+    Se il PDF è nuovo, con cache_pagine (CachePagine) si riusano le pagine invariate.
+    """
+    dati_pdf = leggi_byte(sorgente)
+    # Il backend preferito (in modalità automatica il primo installato) si cerca senza aprire il PDF:
+    # una voce con il suo nome c'è solo se è stato lui ad aprirlo
+    preferito = ottieni_backend(backend).nome
+    diagnostica = Diagnostica(byte=len(dati_pdf), da_cache=True, backend=preferito)
+    with diagnostica.fase("cache"):
+        salvato = cache.leggi(chiave_pdf(dati_pdf, preferito))
+    if salvato is not None:
+        return _risultato_da_cache(salvato, diagnostica)
+
+    # La chiave usa il backend che ha davvero aperto il PDF, che può essere uno di riserva
+    diagnostica_estrazione = Diagnostica(byte=len(dati_pdf))
+    with diagnostica_estrazione.fase("apertura_pdf"):
+        aperto, documento = apri_documento(dati_pdf, backend)
+    chiave = chiave_pdf(dati_pdf, aperto.nome)
+    if aperto.nome != preferito:
+        with diagnostica.fase("cache"):
+            salvato = cache.leggi(chiave)
+        if salvato is not None:
+            diagnostica.backend = aperto.nome
+            return _risultato_da_cache(salvato, diagnostica)
+
+    risultato = estrai_da_documento(aperto, documento, diagnostica_estrazione, osservatore, cache_pagine)
+    cache.scrivi(chiave, risultato.to_dict())
+    return risultato
+
+
+def _risultato_da_cache(salvato, diagnostica):
+    risultato = RisultatoVisura.from_dict(salvato)
+    diagnostica.persone = len(risultato.dati)
+    risultato.diagnostica = diagnostica
+    return risultato
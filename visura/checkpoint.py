@@ -0,0 +1,206 @@
+"""
+Testo estratto delle visure salvato come artefatto intermedio, per rielaborarle senza i PDF.
+
+    python -m visura.checkpoint CARTELLA [-o USCITA] [--formato jsonl|csv] [--consolidato FORMATI]
+
+L'estrazione del testo dal PDF è la parte costosa dell'elaborazione. Con un
+Checkpoint il testo di tutte le pagine di ogni visura viene salvato in un file
+JSON compresso con gzip, indicizzato per impronta del PDF e backend, insieme al
+nome e alla versione della libreria di estrazione. Dopo una modifica alle regole
+dell'intestazione o delle sezioni, la riga di comando rielabora tutti gli
+artefatti di CARTELLA con estrai_da_pagine, senza aprire nessun PDF.
+
+Il testo è quello prodotto dal backend, pagina per pagina: le righe vengono
+ricostruite da estrai_da_pagine esattamente come durante l'estrazione dal PDF.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+from .backend import apri_documento, ottieni_backend
+from .cache import chiave_pdf
+from .diagnostica import Diagnostica
+from .estrazione import estrai_da_pagine, testo_documento
+from .pdf import leggi_byte
+from .risultato import RisultatoVisura
+
+# Da incrementare quando cambia il formato degli artefatti
+VERSIONE_CHECKPOINT = 1
+ESTENSIONE = ".json.gz"
+
+
+class Checkpoint:
+    """Cartella di artefatti, un file per PDF e backend: <sha256>-<backend>.json.gz"""
+
+    def __init__(self, cartella):
+        self.cartella = cartella
+        os.makedirs(cartella, exist_ok=True)
+
+    def _percorso(self, impronta, backend):
+        return os.path.join(self.cartella, f"{impronta}-{backend}{ESTENSIONE}")
+
+    def leggi(self, impronta, backend):
+        """Artefatto del PDF con l'impronta indicata, oppure None se manca o è di un formato diverso"""
+        return leggi_artefatto(self._percorso(impronta, backend))
+
+    def scrivi(self, impronta, backend, pagine, file=""):
+        """Salva il testo di tutte le pagine; la scrittura è atomica"""
+        artefatto = {
+            "versione": VERSIONE_CHECKPOINT,
+            "sha256": impronta,
+            "backend": backend.nome,
+            "versione_backend": backend.versione(),
+            "file": os.path.basename(file),
+            "pagine": list(pagine),
+        }
+        descrittore, temporaneo = tempfile.mkstemp(dir=self.cartella, suffix=".tmp")
+        try:
+            with os.fdopen(descrittore, "wb") as f:
+                f.write(gzip.compress(json.dumps(artefatto, ensure_ascii=False).encode("utf-8")))
+            os.replace(temporaneo, self._percorso(impronta, backend.nome))
+        except OSError:
+            if os.path.exists(temporaneo):
+                os.remove(temporaneo)
+            raise
+
+    def __iter__(self):
+        """Artefatti validi della cartella, in ordine di nome"""
+        for nome in sorted(os.listdir(self.cartella)):
+            if nome.endswith(ESTENSIONE):
+                artefatto = leggi_artefatto(os.path.join(self.cartella, nome))
+                if artefatto is not None:
+                    yield artefatto
+
+
+def leggi_artefatto(percorso):
+    try:
+        with open(percorso, "rb") as f:
+            artefatto = json.loads(gzip.decompress(f.read()))
+    except (OSError, EOFError, ValueError):
+        return None
+    if artefatto.get("versione") != VERSIONE_CHECKPOINT:
+        return None
+    return artefatto
+
+
+def rielabora_artefatto(artefatto, osservatore=None):
+    """Estrazione dei campi e delle persone dal testo salvato, senza il PDF"""
+    diagnostica = Diagnostica(backend=artefatto["backend"], pagine_totali=len(artefatto["pagine"]))
+    risultato = estrai_da_pagine(artefatto["pagine"], diagnostica, osservatore)
+    diagnostica.pagine_da_cache = diagnostica.pagine_lette
+    return risultato
+
+
+def estrai_con_checkpoint(sorgente, checkpoint, backend=None, osservatore=None, cache_pagine=None, cache=None):
+    """
+    Come estrai_dati, ma usa il testo salvato nel checkpoint se il PDF è già stato
+    estratto con lo stesso backend; altrimenti lo estrae e lo salva. In questo caso
+    la lettura non si ferma alla sezione di fine: l'artefatto deve contenere tutte
+    le pagine, perché regole diverse potrebbero fermarsi altrove.
+    Con cache (CacheRisultati) il risultato viene riusato se la versione del parser
+    non è cambiata; cache_pagine (CachePagine) evita di riestrarre le pagine invariate.
+    """
+    dati_pdf = leggi_byte(sorgente)
+    impronta = hashlib.sha256(dati_pdf).hexdigest()
+    diagnostica = Diagnostica(byte=len(dati_pdf))
+    # Come in estrai_dati_con_cache: prima il backend preferito senza aprire il PDF, poi
+    # quello che lo apre davvero, che in modalità automatica può essere uno di riserva
+    nome_backend = ottieni_backend(backend).nome
+    artefatto = checkpoint.leggi(impronta, nome_backend)
+    if artefatto is None:
+        with diagnostica.fase("apertura_pdf"):
+            backend, documento = apri_documento(dati_pdf, backend)
+        if backend.nome != nome_backend:
+            nome_backend = backend.nome
+            artefatto = checkpoint.leggi(impronta, nome_backend)
+
+    chiave = None
+    if cache is not None:
+        chiave = chiave_pdf(dati_pdf, nome_backend)
+        salvato = cache.leggi(chiave)
+        # Senza l'artefatto il PDF va comunque estratto, per salvarlo
+        if salvato is not None and artefatto is not None:
+            risultato = RisultatoVisura.from_dict(salvato)
+            risultato.diagnostica = Diagnostica(byte=len(dati_pdf), da_cache=True, backend=nome_backend,
+                                                persone=len(risultato.dati))
+            return risultato
+
+    if artefatto is not None:
+        risultato = rielabora_artefatto(artefatto, osservatore)
+        risultato.diagnostica.byte = len(dati_pdf)
+    else:
+        sorgente_pagine = testo_documento(backend, documento, diagnostica, cache_pagine)
+        pagine = []
+
+        def pagine_salvate():
+            # Un ciclo for e non yield from: quando estrai_da_pagine chiude questo
+            # generatore, sorgente_pagine resta aperto e si finisce di leggerlo sotto
+            for pagina in sorgente_pagine:
+                pagine.append(pagina)
+                yield pagina
+
+        risultato = estrai_da_pagine(pagine_salvate(), diagnostica, osservatore)
+        with diagnostica.fase("estrazione_testo"):
+            for pagina in sorgente_pagine:
+                pagine.append(pagina)
+                diagnostica.pagine_lette += 1
+        checkpoint.scrivi(impronta, backend, pagine, sorgente if isinstance(sorgente, str) else "")
+
+    if chiave is not None:
+        cache.scrivi(chiave, risultato.to_dict())
+    return risultato
+
+
+def main(argv=None):
+    from .batch import esportazione_da_opzione
+    from .consolidato import righe_persone
+    from .elaborazione import Scrittore
+
+    parser = argparse.ArgumentParser(description="Rielabora le visure dal testo salvato, senza i PDF")
+    parser.add_argument("cartella", help="Cartella degli artefatti (l'opzione --checkpoint di visura.batch)")
+    parser.add_argument("-o", "--uscita", default="rielaborazione",
+                        help="Cartella dei risultati (default: rielaborazione)")
+    parser.add_argument("-f", "--formato", choices=["jsonl", "csv"], default="jsonl",
+                        help="Formato del file con tutte le persone (default: jsonl)")
+    parser.add_argument("--consolidato", default=None, metavar="FORMATI",
+                        help="Esportazione consolidata in USCITA/consolidato, formati separati da virgola "
+                             "tra csv, parquet, arrow e xlsx")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.cartella):
+        parser.error(f"cartella inesistente: {args.cartella}")
+    consolidato = None
+    if args.consolidato:
+        consolidato = esportazione_da_opzione(parser, args.consolidato, os.path.join(args.uscita, "consolidato"))
+
+    os.makedirs(args.uscita, exist_ok=True)
+    tutte = Scrittore(os.path.join(args.uscita, f"persone.{args.formato}"), args.formato)
+    elaborati = errori = 0
+    try:
+        for artefatto in Checkpoint(args.cartella):
+            file = artefatto["file"] or artefatto["sha256"]
+            try:
+                risultato = rielabora_artefatto(artefatto).to_dict()
+            except Exception as errore:
+                errori += 1
+                print(f"ERRORE {file}: {type(errore).__name__}: {errore}", file=sys.stderr)
+                continue
+            tutte.scrivi(righe_persone(file, risultato))
+            if consolidato is not None:
+                consolidato.aggiungi(risultato, file)
+            elaborati += 1
+    finally:
+        tutte.chiudi()
+        if consolidato is not None:
+            for percorso in consolidato.chiudi():
+                print(f"Scritto {percorso}")
+    print(f"Rielaborate {elaborati} visure, errori: {errori}")
+    return 1 if errori else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import NamedTuple
+
+# Lettere dei mesi nel codice fiscale
+MESI = {
+    'A': 1, 'B': 2, 'C': 3, 'D': 4, 'E': 5, 'H': 6,
+    'L': 7, 'M': 8, 'P': 9, 'R': 10, 'S': 11, 'T': 12
+}
+
+# Omocodia: in caso di codici uguali le cifre vengono sostituite da lettere, a partire da destra
+OMOCODIA = str.maketrans("LMNPQRSTUV", "0123456789")
+POSIZIONI_OMOCODIA = (6, 7, 9, 10, 12, 13, 14)
+
+# Valori dei caratteri in posizione dispari (1a, 3a, ...) e pari per il carattere di controllo
+_ALFABETO = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_DISPARI = dict(zip(_ALFABETO,
+                    [1, 0, 5, 7, 9, 13, 15, 17, 19, 21, 1, 0, 5, 7, 9, 13, 15, 17, 19, 21, 2, 4, 18, 20,
+                     11, 3, 6, 8, 12, 14, 16, 10, 22, 25, 24, 23]))
+_PARI = {carattere: indice % 10 if carattere.isdigit() else indice - 10 for indice, carattere in enumerate(_ALFABETO)}
+
+
+class CodiceFiscaleDecodificato(NamedTuple):
+    codice_fiscale: str
+    valido: bool  # carattere di controllo corretto
+    omocodia: bool  # alcune cifre sono state sostituite da lettere
+    data_nascita: str  # gg/mm/aaaa oppure "N/A"
+    sesso: str  # "M", "F" oppure "N/A"
+    codice_catastale: str  # comune (o stato estero) di nascita, oppure "N/A"
+
+
+def carattere_controllo(codice):
+    """Carattere di controllo dei primi 15 caratteri del codice fiscale"""
+    somma = sum(_DISPARI[c] if i % 2 == 0 else _PARI[c] for i, c in enumerate(codice[:15]))
+    return chr(ord("A") + somma % 26)
+
+
+def _senza_omocodia(codice_fiscale):
+    """Codice fiscale con le lettere dell'omocodia riportate a cifre"""
+    caratteri = list(codice_fiscale)
+    for posizione in POSIZIONI_OMOCODIA:
+        caratteri[posizione] = caratteri[posizione].translate(OMOCODIA)
+    return "".join(caratteri)
+
+
+def _data_nascita(anno_cf, mese_cf, giorno_cf):
+    """Data gg/mm/aaaa e sesso, oppure ("N/A", "N/A") se i caratteri non formano una data valida"""
+    try:
+        # Decodifica dell'anno (assumiamo che anni 00-30 siano 2000-2030, 31-99 siano 1931-1999)
+        anno = int(anno_cf)
+        anno += 2000 if anno <= 30 else 1900
+
+        if mese_cf not in MESI:
+            return "N/A", "N/A"
+
+        # Decodifica del giorno (per le donne si aggiunge 40)
+        giorno = int(giorno_cf)
+        sesso = "M"
+        if giorno > 31:
+            giorno -= 40
+            sesso = "F"
+
+        return datetime(anno, MESI[mese_cf], giorno).strftime("%d/%m/%Y"), sesso
+    except ValueError:
+        return "N/A", "N/A"
+
+
+@lru_cache(maxsize=65536)
+def decodifica_codice_fiscale(codice_fiscale):
+    """
+    Decodifica completa di un codice fiscale: validità del carattere di controllo,
+    omocodia, data di nascita, sesso e codice catastale. Il risultato resta in cache
+    perché la stessa persona compare in più sezioni e in più visure.
+    """
+    if len(codice_fiscale) != 16:
+        return CodiceFiscaleDecodificato(codice_fiscale, False, False, "N/A", "N/A", "N/A")
+
+    valido = (set(codice_fiscale) <= _DISPARI.keys()
+              and carattere_controllo(codice_fiscale) == codice_fiscale[15])
+    normalizzato = _senza_omocodia(codice_fiscale)
+    data_nascita, sesso = _data_nascita(normalizzato[6:8], normalizzato[8:9], normalizzato[9:11])
+    return CodiceFiscaleDecodificato(
+        codice_fiscale,
+        valido,
+        normalizzato != codice_fiscale,
+        data_nascita,
+        sesso,
+        normalizzato[11:15],
+    )
+
+
+def decodifica_codici_fiscali(codici_fiscali):
+    """
+    Decodifica un'intera colonna di codici fiscali: ogni codice distinto viene
+    decodificato una sola volta. Restituisce i risultati nello stesso ordine.
+    """
+    decodificati = {codice: decodifica_codice_fiscale(codice) for codice in dict.fromkeys(codici_fiscali)}
+    return [decodificati[codice] for codice in codici_fiscali]
+
+
+# Funzione per decodificare la data di nascita dal codice fiscale
+def decodifica_data_nascita(codice_fiscale):
+    """
+    Estrae la data di nascita dal codice fiscale italiano
+    Formato: RRSSAAMMGGCCCC
+    Posizioni 7-12: AAMMGG (Anno, Mese, Giorno)
+    """
+    return decodifica_codice_fiscale(codice_fiscale).data_nascita
+
+
+# Funzione per estrarre il codice catastale dal codice fiscale
+def estrai_codice_catastale(codice_fiscale):
+    """
+    Estrae il codice catastale del comune di nascita dal codice fiscale
+    Si trova nei caratteri 12-15 del codice fiscale
+    """
+    return decodifica_codice_fiscale(codice_fiscale).codice_catastale
@@ -0,0 +1,52 @@
+"""
+Comune di nascita dal codice catastale del codice fiscale.
+
+La tabella codice catastale -> comune è un file TSV compatto (comuni.tsv, accanto
+a questo modulo) caricato una sola volta, alla prima ricerca. La variabile
+d'ambiente VISURA_COMUNI può indicare una tabella diversa; visura.istat la
+rigenera dai file dell'ISTAT.
+"""
+import os
+from functools import lru_cache
+from typing import NamedTuple
+
+TABELLA_PREDEFINITA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "comuni.tsv")
+
+# Sigla usata al posto della provincia per gli stati esteri (codici Z...)
+SIGLA_ESTERO = "EE"
+
+
+class Comune(NamedTuple):
+    nome: str
+    provincia: str
+
+    def __str__(self):
+        return self.nome if self.provincia == SIGLA_ESTERO else f"{self.nome} ({self.provincia})"
+
+
+def percorso_tabella():
+    return os.environ.get("VISURA_COMUNI") or TABELLA_PREDEFINITA
+
+
+@lru_cache(maxsize=None)
+def tabella_comuni(percorso=None):
+    """Dizionario codice catastale -> Comune, letto dal file una sola volta per processo"""
+    tabella = {}
+    with open(percorso or percorso_tabella(), "r", encoding="utf-8") as f:
+        for riga in f:
+            if not riga.strip() or riga.startswith("#"):
+                continue
+            codice, nome, provincia = riga.rstrip("\r\n").split("\t")
+            tabella[codice] = Comune(nome, provincia)
+    return tabella
+
+
+def cerca_comune(codice_catastale):
+    """Comune con il codice catastale indicato, oppure None se non è nella tabella"""
+    return tabella_comuni().get(codice_catastale)
+
+
+def comune_di_nascita(codice_catastale):
+    """Comune e provincia in forma leggibile ("ROMA (RM)"), oppure "N/A" """
+    comune = cerca_comune(codice_catastale)
+    return "N/A" if comune is None else str(comune)
@@ -0,0 +1,228 @@
+"""
+Esportazione consolidata dei risultati di molte visure, ad esempio per una gara.
+
+Tre insiemi di dati:
+    persone  una riga per codice fiscale, con le aziende e le cariche in tutte le visure
+    cariche  una riga per persona e visura, con i dati societari (come i file di visura.batch)
+    aziende  una riga per visura
+
+scritti in CSV, in Parquet e Arrow (se è installato pyarrow) e in un unico file
+Excel con un foglio per insieme. Le cariche vengono scritte man mano che arrivano
+i risultati, a blocchi: in memoria restano solo una voce per codice fiscale e una
+per visura, qualunque sia il numero di righe.
+"""
+import csv
+import importlib.util
+import json
+import os
+import tempfile
+
+from .esportazione import LarghezzeColonne, larghezze_colonne, scrivi_fogli_excel
+from .risultato import COLONNE_PERSONA, RisultatoVisura
+from .sezioni import separa_sezioni
+
+# Colonne dei dati societari, scritte prima di quelle della persona
+COLONNE_AZIENDA = ["File", "Ragione sociale", "Comune", "Via", "Numero addetti", "Forma giuridica"]
+
+COLONNE_PERSONE = [colonna for colonna in COLONNE_PERSONA if colonna != "Sezione"] + [
+    "Numero aziende", "Aziende", "Cariche", "File"]
+COLONNE_CARICHE = COLONNE_AZIENDA + COLONNE_PERSONA
+COLONNE_AZIENDE = COLONNE_AZIENDA + ["Persone"]
+# Colonne numeriche nei formati tipizzati (Parquet e Arrow); le altre sono testo
+COLONNE_INTERE = {"Numero aziende", "Persone"}
+
+FORMATI = ("csv", "parquet", "arrow", "xlsx")
+NOME_FILE_EXCEL = "consolidato.xlsx"
+# Righe accumulate prima di ogni scrittura di un blocco Parquet o Arrow
+BLOCCO_RIGHE = 10000
+# Separatore tra le aziende di una persona (la virgola compare già nei nomi delle sezioni)
+SEPARATORE = " | "
+
+
+def formati_disponibili():
+    """Formati utilizzabili con le librerie installate"""
+    if importlib.util.find_spec("pyarrow") is None:
+        return [formato for formato in FORMATI if formato not in ("parquet", "arrow")]
+    return list(FORMATI)
+
+
+def righe_persone(percorso, risultato):
+    """Unisce i dati societari a ogni persona, nell'ordine delle colonne di uscita"""
+    intestazione = dict(risultato["intestazione"], File=os.path.basename(percorso))
+    for persona in risultato["persone"]:
+        riga = {colonna: intestazione.get(colonna, "") for colonna in COLONNE_AZIENDA}
+        riga.update((colonna, persona.get(colonna, "")) for colonna in COLONNE_PERSONA)
+        yield riga
+
+
+class _ScrittoreCsv:
+    def __init__(self, percorso, colonne):
+        self.file = open(percorso, "w", encoding="utf-8", newline="")
+        self.csv = csv.DictWriter(self.file, fieldnames=colonne, extrasaction="ignore")
+        self.csv.writeheader()
+
+    def scrivi(self, righe):
+        self.csv.writerows(righe)
+
+    def chiudi(self):
+        self.file.close()
+
+
+class _ScrittoreArrow:
+    """Parquet o Arrow IPC, scritti a blocchi di BLOCCO_RIGHE righe"""
+
+    def __init__(self, percorso, colonne, formato):
+        import pyarrow as pa
+
+        self._pa = pa
+        self.schema = pa.schema([(colonna, pa.int64() if colonna in COLONNE_INTERE else pa.string())
+                                 for colonna in colonne])
+        if formato == "parquet":
+            import pyarrow.parquet as pq
+
+            self.scrittore = pq.ParquetWriter(percorso, self.schema)
+        else:
+            self.scrittore = pa.ipc.new_file(percorso, self.schema)
+        self._blocco = []
+
+    def scrivi(self, righe):
+        for riga in righe:
+            self._blocco.append(riga)
+            if len(self._blocco) >= BLOCCO_RIGHE:
+                self._svuota()
+
+    def _svuota(self):
+        if self._blocco:
+            self.scrittore.write_batch(self._pa.RecordBatch.from_pylist(self._blocco, schema=self.schema))
+            self._blocco = []
+
+    def chiudi(self):
+        self._svuota()
+        self.scrittore.close()
+
+
+def _crea_scrittore(percorso, colonne, formato):
+    if formato == "csv":
+        return _ScrittoreCsv(percorso, colonne)
+    return _ScrittoreArrow(percorso, colonne, formato)
+
+
+class EsportazioneConsolidata:
+    """
+    Riceve i risultati uno alla volta con aggiungi() e scrive i file in cartella;
+    chiudi() completa i file e restituisce i percorsi scritti. Una persona presente
+    in più visure mantiene cognome, nomi e dati anagrafici della prima.
+    """
+
+    def __init__(self, cartella, formati=("csv", "xlsx")):
+        non_validi = [formato for formato in formati if formato not in FORMATI]
+        if non_validi:
+            raise ValueError(f"Formati non supportati: {', '.join(non_validi)}")
+        self.cartella = cartella
+        self.formati = list(dict.fromkeys(formati))
+        os.makedirs(cartella, exist_ok=True)
+
+        self._persone = {}  # codice fiscale -> (record, {ragione sociale: sezioni}, {file: None})
+        self._aziende = []
+        self._cariche = {formato: _crea_scrittore(self._percorso("cariche", formato), COLONNE_CARICHE, formato)
+                         for formato in self.formati if formato != "xlsx"}
+        # Per l'Excel le cariche passano da un file temporaneo: le larghezze vanno scritte prima delle righe
+        self._spool = None
+        if "xlsx" in self.formati:
+            self._spool = tempfile.TemporaryFile("w+", encoding="utf-8", dir=cartella)
+            self._larghezze_cariche = LarghezzeColonne(COLONNE_CARICHE)
+
+    def _percorso(self, nome, formato):
+        return os.path.join(self.cartella, f"{nome}.{formato}")
+
+    def aggiungi(self, risultato, file=""):
+        """Aggiunge un risultato (RisultatoVisura o il suo to_dict()) della visura nel file indicato"""
+        if isinstance(risultato, RisultatoVisura):
+            risultato = risultato.to_dict()
+        righe = list(righe_persone(file, risultato))
+        for scrittore in self._cariche.values():
+            scrittore.scrivi(righe)
+        if self._spool is not None:
+            for riga in righe:
+                self._larghezze_cariche.aggiorna(riga)
+                self._spool.write(json.dumps(riga, ensure_ascii=False) + "\n")
+
+        intestazione = dict(risultato["intestazione"], File=os.path.basename(file))
+        azienda = {colonna: intestazione.get(colonna, "") for colonna in COLONNE_AZIENDA}
+        self._aziende.append(dict(azienda, Persone=len(righe)))
+
+        for riga in righe:
+            voce = self._persone.get(riga["Codice Fiscale"])
+            if voce is None:
+                record = {colonna: riga[colonna] for colonna in COLONNE_PERSONA if colonna != "Sezione"}
+                voce = self._persone[riga["Codice Fiscale"]] = (record, {}, {})
+            _, cariche, files = voce
+            # Il testo delle sezioni si tiene così com'è: si separa solo se l'azienda si ripete
+            precedenti = cariche.get(riga["Ragione sociale"])
+            if precedenti is None:
+                cariche[riga["Ragione sociale"]] = riga["Sezione"]
+            elif riga["Sezione"] != precedenti:
+                sezioni = dict.fromkeys(separa_sezioni(precedenti) + separa_sezioni(riga["Sezione"]))
+                cariche[riga["Ragione sociale"]] = ", ".join(sezioni)
+            files[riga["File"]] = None
+
+    def righe_persone_consolidate(self):
+        """Una riga per codice fiscale, nell'ordine in cui le persone sono state trovate"""
+        for record, cariche, files in self._persone.values():
+            yield dict(record, **{
+                "Numero aziende": len(cariche),
+                "Aziende": SEPARATORE.join(cariche),
+                "Cariche": SEPARATORE.join(f"{azienda}: {sezioni}" for azienda, sezioni in cariche.items()),
+                "File": SEPARATORE.join(files),
+            })
+
+    def _righe_spool(self):
+        self._spool.seek(0)
+        for riga in self._spool:
+            yield json.loads(riga)
+
+    def chiudi(self):
+        scritti = []
+        try:
+            for formato, scrittore in self._cariche.items():
+                scrittore.chiudi()
+                scritti.append(self._percorso("cariche", formato))
+                for nome, colonne, righe in (("persone", COLONNE_PERSONE, self.righe_persone_consolidate()),
+                                             ("aziende", COLONNE_AZIENDE, self._aziende)):
+                    altro = _crea_scrittore(self._percorso(nome, formato), colonne, formato)
+                    try:
+                        altro.scrivi(righe)
+                    finally:
+                        altro.chiudi()
+                    scritti.append(self._percorso(nome, formato))
+
+            if self._spool is not None:
+                persone = list(self.righe_persone_consolidate())
+                percorso = os.path.join(self.cartella, NOME_FILE_EXCEL)
+                scrivi_fogli_excel(percorso, [
+                    ("Persone", COLONNE_PERSONE, larghezze_colonne(persone, COLONNE_PERSONE), persone),
+                    ("Cariche", COLONNE_CARICHE, self._larghezze_cariche.valori(), self._righe_spool()),
+                    ("Aziende", COLONNE_AZIENDE, larghezze_colonne(self._aziende, COLONNE_AZIENDE), self._aziende),
+                ])
+                scritti.append(percorso)
+        finally:
+            if self._spool is not None:
+                self._spool.close()
+        return scritti
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.chiudi()
+
+
+def esporta_excel_consolidato(risultati):
+    """Byte del file Excel consolidato per un elenco di (nome file, risultato), pronti per il download"""
+    with tempfile.TemporaryDirectory() as cartella:
+        esportazione = EsportazioneConsolidata(cartella, formati=["xlsx"])
+        for file, risultato in risultati:
+            esportazione.aggiungi(risultato, file)
+        percorso, = esportazione.chiudi()
+        with open(percorso, "rb") as f:
+            return f.read()
@@ -0,0 +1,267 @@
+"""
+Generatore di visure sintetiche in stile Telemaco per benchmark e verifiche.
+
+Ogni visura generata contiene il testo delle pagine, un PDF minimale
+(scritto senza dipendenze esterne) e i valori attesi dell'estrazione, così
+da poter controllare che un'ottimizzazione non cambi i risultati.
+Le dimensioni sono regolabili: persone, sezioni delle cariche, righe di
+dettaglio sotto ogni carica (come nei fascicoli, che allungano le sezioni) e
+lunghezza della "Storia delle modifiche", che allunga il documento dopo la
+sezione di fine.
+"""
+import datetime
+import random
+from dataclasses import dataclass, field
+
+from .codice_fiscale import carattere_controllo
+from .risultato import NON_TROVATO
+
+COGNOMI_SEMPLICI = [
+    "ROSSI", "BIANCHI", "FERRARI", "ESPOSITO", "ROMANO", "COLOMBO", "RICCI", "MARINO", "GRECO",
+    "BRUNO", "GALLO", "CONTI", "COSTA", "GIORDANO", "MANCINI", "RIZZO", "LOMBARDI", "MORETTI",
+]
+COGNOMI_DOPPI = ["DE LUCA", "DI STEFANO", "LA ROSA", "DEL PIERO", "DE SANTIS"]
+NOMI_MASCHILI = ["MARIO", "LUCA", "PAOLO", "MARCO", "GIAN LUCA", "STEFANO"]
+NOMI_FEMMINILI = ["GIULIA", "FRANCESCA", "ELENA", "SARA", "ANNA MARIA", "CHIARA"]
+# Codici catastali usati per i codici fiscali sintetici, con il comune di nascita atteso
+CODICI_CATASTALI = {"H501": "ROMA (RM)", "F205": "MILANO (MI)", "A944": "BOLOGNA (BO)",
+                    "L219": "TORINO (TO)", "F839": "NAPOLI (NA)"}
+
+MESI_CF = "ABCDEHLMPRST"
+RUOLI = ["Amministratore Unico", "Consigliere", "Presidente del consiglio", "Sindaco effettivo", "Procuratore"]
+
+# Sezioni delle cariche nell'ordine in cui compaiono nel corpo della visura
+SEZIONI_CARICHE = [
+    "Soci e titolari di diritti su azioni e quote",
+    "Amministratori",
+    "Sindaci, membri organi di controllo",
+    "Titolari di altre cariche o qualifiche",
+]
+SEZIONE_TRASFERIMENTI = "Trasferimenti d'azienda, fusioni, scissioni, subentri"
+SEZIONE_STORIA = "Storia delle modifiche"
+
+def _lettere(parola):
+    lettere = [c for c in parola if c.isalpha()]
+    consonanti = [c for c in lettere if c not in "AEIOU"]
+    vocali = [c for c in lettere if c in "AEIOU"]
+    return consonanti, vocali
+
+
+def _codice_cognome(cognome):
+    consonanti, vocali = _lettere(cognome)
+    return "".join(consonanti + vocali + ["X"] * 3)[:3]
+
+
+def _codice_nome(nome):
+    consonanti, vocali = _lettere(nome)
+    if len(consonanti) >= 4:
+        return consonanti[0] + consonanti[2] + consonanti[3]
+    return "".join(consonanti + vocali + ["X"] * 3)[:3]
+
+
+def codice_fiscale_sintetico(cognome, nome, anno, mese, giorno, femmina, codice_catastale):
+    """Codice fiscale costruito con le regole ufficiali, carattere di controllo compreso"""
+    codice = (_codice_cognome(cognome) + _codice_nome(nome) + f"{anno % 100:02d}" + MESI_CF[mese - 1]
+              + f"{giorno + (40 if femmina else 0):02d}" + codice_catastale)
+    return codice + carattere_controllo(codice)
+
+
+@dataclass
+class VisuraSintetica:
+    pagine: list
+    intestazione: dict
+    persone: list = field(default_factory=list)  # record attesi, nell'ordine di uscita
+    data_estrazione: str = None  # "AAAA-MM-GG"
+
+    @property
+    def testo(self):
+        return "".join(self.pagine)
+
+    def pdf(self):
+        return scrivi_pdf(self.pagine)
+
+
+def genera_visura(seme=0, persone=10, sezioni=3, righe_storia=200, righe_per_pagina=50, righe_dettaglio=0):
+    """
+    Genera una visura sintetica. Ogni persona compare in una o due sezioni;
+    le sezioni sono le prime `sezioni` di SEZIONI_CARICHE. Ogni carica è seguita
+    da righe_dettaglio righe senza nominativi.
+    """
+    casuale = random.Random(seme)
+    # Data del documento ricavata dal seme, senza consumare numeri casuali
+    data_estrazione = datetime.date(2024, 1, 1) + datetime.timedelta(days=seme % 366)
+    sezioni_usate = SEZIONI_CARICHE[:max(1, min(sezioni, len(SEZIONI_CARICHE)))]
+
+    ragione_sociale = ["COSTRUZIONI SINTETICHE", f"GENERALI {seme} S.R.L."]
+    intestazione = {
+        "Ragione sociale": " ".join(ragione_sociale),
+        "Comune": "BOLOGNA (BO)",
+        "Via": "VIA DELLE ROSE 12",
+        "Numero addetti": str(casuale.randint(1, 500)),
+        "Forma giuridica": "societa' a responsabilita' limitata",
+    }
+
+    blocchi = [[
+        "Camera di Commercio Industria Artigianato e Agricoltura",
+        "VISURA ORDINARIA SOCIETA' DI CAPITALE",
+        f"Documento n. T 123456789 estratto dal Registro Imprese in data {data_estrazione:%d/%m/%Y}",
+        "",
+        *ragione_sociale,
+        "",
+        "DATI ANAGRAFICI",
+        f"Indirizzo Sede {intestazione['Comune']} {intestazione['Via']}",
+        "CAP 40121",
+        f"Forma giuridica {intestazione['Forma giuridica']}",
+        "Codice fiscale 01234567890",
+        f"Addetti al 31/12/2023 {intestazione['Numero addetti']}",
+        "",
+        "Indice",
+        *[f"{sezione} {numero}" for numero, sezione in enumerate(sezioni_usate, start=2)],
+        f"{SEZIONE_TRASFERIMENTI} {len(sezioni_usate) + 2}",
+        f"{SEZIONE_STORIA} {len(sezioni_usate) + 3}",
+    ]]
+
+    # Anagrafica delle persone, con codici fiscali distinti
+    anagrafica = []
+    codici = set()
+    while len(anagrafica) < persone:
+        femmina = casuale.random() < 0.5
+        cognome = casuale.choice(COGNOMI_DOPPI if casuale.random() < 0.2 else COGNOMI_SEMPLICI)
+        nome = casuale.choice(NOMI_FEMMINILI if femmina else NOMI_MASCHILI)
+        anno, mese, giorno = casuale.randint(1935, 2000), casuale.randint(1, 12), casuale.randint(1, 28)
+        catastale = casuale.choice(list(CODICI_CATASTALI))
+        codice = codice_fiscale_sintetico(cognome, nome, anno, mese, giorno, femmina, catastale)
+        if codice not in codici:
+            codici.add(codice)
+            anagrafica.append((cognome, nome, codice, f"{giorno:02d}/{mese:02d}/{anno}", CODICI_CATASTALI[catastale]))
+
+    # Ogni persona in una o due sezioni
+    per_sezione = {sezione: [] for sezione in sezioni_usate}
+    for persona in anagrafica:
+        for sezione in casuale.sample(sezioni_usate, k=min(len(sezioni_usate), casuale.choice([1, 1, 2]))):
+            per_sezione[sezione].append(persona)
+
+    attese = {}
+    for sezione in sezioni_usate:
+        blocchi.append([sezione, ""])
+        for cognome, nome, codice, data_nascita, comune in per_sezione[sezione]:
+            blocchi.append(_blocco_persona(casuale, cognome, nome, codice, righe_dettaglio))
+            attesa = attese.setdefault(codice, {"Cognome": cognome, "Nomi": nome, "Codice Fiscale": codice,
+                                                "Data di nascita": data_nascita, "Comune di nascita": comune,
+                                                "Sezione": []})
+            attesa["Sezione"].append(sezione)
+
+    blocchi.append([SEZIONE_TRASFERIMENTI, "Nessun trasferimento registrato", ""])
+    blocchi.append([SEZIONE_STORIA])
+    for numero in range(righe_storia):
+        blocchi.append([f"Modifica n. {numero} del 01/02/2015 protocollo {1000 + numero} variazione dati"])
+
+    persone_attese = []
+    for attesa in attese.values():
+        attesa["Sezione"] = ", ".join(attesa["Sezione"])
+        persone_attese.append(attesa)
+
+    return VisuraSintetica(_impagina(blocchi, righe_per_pagina), intestazione, persone_attese,
+                           data_estrazione.isoformat())
+
+
+def _blocco_persona(casuale, cognome, nome, codice, righe_dettaglio=0):
+    """Uno dei formati con cui le visure riportano una carica"""
+    formato = casuale.randint(0, 2)
+    if formato == 0:
+        blocco = [casuale.choice(RUOLI), f"{cognome} {nome}", f"Codice fiscale: {codice}"]
+    elif formato == 1:
+        blocco = [f"{cognome} {nome} Rappresentante dell'impresa", "Nato a ROMA (RM) il 01/01/1970",
+                  f"Codice fiscale: {codice}"]
+    else:
+        blocco = [casuale.choice(RUOLI), f"{cognome} {nome}", "Rappresentante dell'impresa",
+                  f"Codice fiscale: {codice}", "carica dal 01/02/2010"]
+    # Le righe di dettaglio iniziano in minuscolo: non vengono scambiate per nomi
+    blocco += [f"poteri di firma disgiunta per atti fino a euro {numero + 1}000, conferiti il 01/02/2010"
+               for numero in range(righe_dettaglio)]
+    return blocco + [""]
+
+
+def _impagina(blocchi, righe_per_pagina):
+    """
+    Divide i blocchi in pagine senza spezzarli. Ogni pagina termina con un a capo,
+    così l'ultima riga non si unisce alla prima della pagina successiva.
+    """
+    pagine = []
+    corrente = []
+    for blocco in blocchi:
+        if corrente and len(corrente) + len(blocco) > righe_per_pagina:
+            pagine.append(corrente)
+            corrente = []
+        corrente.extend(blocco)
+    if corrente:
+        pagine.append(corrente)
+    return ["".join(riga + "\n" for riga in pagina) for pagina in pagine]
+
+
+def _testo_pdf(testo):
+    return testo.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("cp1252")
+
+
+def scrivi_pdf(pagine):
+    """
+    PDF minimale con una riga di testo per ogni riga delle pagine (Helvetica,
+    WinAnsiEncoding). Le righe vuote vengono scritte come uno spazio, altrimenti
+    l'estrazione del testo le perderebbe.
+    """
+    oggetti = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # albero delle pagine, scritto quando si conoscono le pagine
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    riferimenti = []
+    for pagina in pagine:
+        comandi = [b"BT /F1 9 Tf 12 TL 40 800 Td"]
+        for indice, riga in enumerate(pagina.splitlines()):
+            if indice:
+                comandi.append(b"T*")
+            comandi.append(b"(" + _testo_pdf(riga or " ") + b") Tj")
+        comandi.append(b"ET")
+        contenuto = b"\n".join(comandi)
+        oggetti.append(b"<< /Length %d >>\nstream\n" % len(contenuto) + contenuto + b"\nendstream")
+        oggetti.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 %d] /Resources << /Font << /F1 3 0 R >> >> "
+                       b"/Contents %d 0 R >>" % (max(842, 60 + 12 * len(pagina.splitlines())), len(oggetti)))
+        riferimenti.append(b"%d 0 R" % len(oggetti))
+    oggetti[1] = b"<< /Type /Pages /Kids [" + b" ".join(riferimenti) + b"] /Count %d >>" % len(pagine)
+
+    uscita = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    posizioni = []
+    for numero, oggetto in enumerate(oggetti, start=1):
+        posizioni.append(len(uscita))
+        uscita += b"%d 0 obj\n" % numero + oggetto + b"\nendobj\n"
+    inizio_xref = len(uscita)
+    uscita += b"xref\n0 %d\n0000000000 65535 f \n" % (len(oggetti) + 1)
+    for posizione in posizioni:
+        uscita += b"%010d 00000 n \n" % posizione
+    uscita += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(oggetti) + 1, inizio_xref)
+    return bytes(uscita)
+
+
+def confronta(visura, risultato):
+    """Elenco delle differenze tra valori attesi e risultato dell'estrazione (vuoto se coincidono)"""
+    differenze = []
+    for campo, atteso in visura.intestazione.items():
+        ottenuto = risultato.intestazione().get(campo, NON_TROVATO)
+        if ottenuto != atteso:
+            differenze.append(f"{campo}: atteso {atteso!r}, ottenuto {ottenuto!r}")
+    if visura.data_estrazione is not None and risultato.data_estrazione != visura.data_estrazione:
+        differenze.append(f"Data estrazione: attesa {visura.data_estrazione!r}, "
+                          f"ottenuta {risultato.data_estrazione!r}")
+
+    ottenute = {p["Codice Fiscale"]: p for p in risultato.dati}
+    if [p["Codice Fiscale"] for p in risultato.dati] != [p["Codice Fiscale"] for p in visura.persone]:
+        differenze.append("ordine o insieme dei codici fiscali diverso")
+    for attesa in visura.persone:
+        ottenuta = ottenute.get(attesa["Codice Fiscale"])
+        if ottenuta is None:
+            continue
+        for campo in ("Cognome", "Nomi", "Data di nascita", "Comune di nascita", "Sezione"):
+            if ottenuta.get(campo) != attesa[campo]:
+                differenze.append(f"{attesa['Codice Fiscale']} {campo}: atteso {attesa[campo]!r}, "
+                                  f"ottenuto {ottenuta.get(campo)!r}")
+    return differenze
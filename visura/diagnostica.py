@@ -0,0 +1,95 @@
+"""
+Misure dei tempi per fase dell'estrazione.
+
+Ogni estrazione registra in un oggetto Diagnostica il tempo di ogni fase,
+le pagine lette, i byte del PDF, le righe esaminate e le persone trovate.
+"""
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+# Fasi nell'ordine in cui avvengono, usato per la visualizzazione
+FASI = [
+    "apertura_pdf",
+    "estrazione_testo",
+    "scansione_intestazione",
+    "elaborazione_sezioni",
+    "esportazione_excel",
+]
+
+
+@dataclass
+class Diagnostica:
+    fasi: dict = field(default_factory=dict)  # nome fase -> secondi
+    pagine_totali: int = 0
+    pagine_lette: int = 0
+    pagine_da_cache: int = 0  # pagine lette dalla cache delle pagine invece che estratte
+    byte: int = 0
+    righe: int = 0
+    sezioni: int = 0
+    persone: int = 0
+    da_cache: bool = False
+    backend: str = ""
+
+    @contextmanager
+    def fase(self, nome):
+        """Somma al tempo della fase la durata del blocco"""
+        inizio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.aggiungi(nome, time.perf_counter() - inizio)
+
+    def aggiungi(self, nome, secondi):
+        self.fasi[nome] = self.fasi.get(nome, 0.0) + secondi
+
+    def misura_pagine(self, pagine):
+        """
+        Avvolge un generatore di pagine: il tempo speso per produrre ogni pagina
+        va nella fase "estrazione_testo" e viene contata come pagina letta
+        """
+        try:
+            while True:
+                inizio = time.perf_counter()
+                try:
+                    pagina = next(pagine)
+                except StopIteration:
+                    return
+                finally:
+                    self.aggiungi("estrazione_testo", time.perf_counter() - inizio)
+                self.pagine_lette += 1
+                yield pagina
+        finally:
+            # Chiude la sorgente (ad esempio il pool dell'estrazione parallela), se lo prevede
+            chiudi = getattr(pagine, "close", None)
+            if chiudi is not None:
+                chiudi()
+
+    @property
+    def totale(self):
+        return sum(self.fasi.values())
+
+    def tabella(self):
+        """Righe (fase, millisecondi) nell'ordine di FASI, poi le eventuali fasi extra"""
+        ordine = [fase for fase in FASI if fase in self.fasi]
+        ordine += [fase for fase in self.fasi if fase not in FASI]
+        return [(fase, round(self.fasi[fase] * 1000, 2)) for fase in ordine]
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def dimensione_sorgente(sorgente):
+    """Byte del PDF, senza leggerlo se è un percorso (caratteri, per il testo già estratto)"""
+    if isinstance(sorgente, (bytes, bytearray)):
+        return len(sorgente)
+    if isinstance(sorgente, (list, tuple)):
+        return sum(len(pagina) for pagina in sorgente)
+    if hasattr(sorgente, "seek") and hasattr(sorgente, "tell"):
+        posizione = sorgente.tell()
+        sorgente.seek(0, os.SEEK_END)
+        dimensione = sorgente.tell()
+        sorgente.seek(posizione)
+        return dimensione
+    return os.path.getsize(sorgente)
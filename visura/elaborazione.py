@@ -0,0 +1,87 @@
+"""
+Parti comuni alle elaborazioni su più processi (visura.batch, visura.servizio,
+visura.sorveglianza) e alla riga di comando di visura.checkpoint: la funzione
+eseguita nei processi worker, la creazione del pool e la scrittura dei risultati.
+"""
+import csv
+import json
+import multiprocessing
+import signal
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from .cache import CacheDisco, CacheRisultati, cache_pagine_su_disco, estrai_dati_con_cache
+from .checkpoint import Checkpoint, estrai_con_checkpoint
+from .consolidato import COLONNE_AZIENDA
+from .estrazione import estrai_dati
+from .risultato import COLONNE_PERSONA
+
+
+def inizializza_worker():
+    # Ctrl+C arriva a tutto il gruppo di processi: lo gestisce solo il processo principale
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def crea_pool(processi, spawn=False):
+    """
+    Pool di processi che ignorano Ctrl+C. Con spawn=True i processi partono da zero:
+    serve quando il processo principale ha già altri thread attivi, con cui fork non è sicuro
+    """
+    contesto = multiprocessing.get_context("spawn") if spawn else None
+    return ProcessPoolExecutor(max_workers=processi, mp_context=contesto, initializer=inizializza_worker)
+
+
+# Cache e checkpoint di ogni processo worker, creati alla prima visura elaborata
+@lru_cache(maxsize=None)
+def _cache_worker(cartella_cache):
+    return CacheRisultati(disco=CacheDisco(cartella_cache)), cache_pagine_su_disco(cartella_cache)
+
+
+@lru_cache(maxsize=None)
+def _checkpoint_worker(cartella_checkpoint):
+    return Checkpoint(cartella_checkpoint)
+
+
+def elabora_in_worker(sorgente, cartella_cache=None, backend=None, cartella_checkpoint=None):
+    """
+    Eseguita nel processo worker: restituisce (risultato, None) con il risultato come
+    dizionario, oppure (None, errore) con le chiavi Errore, Messaggio e Traceback
+    """
+    try:
+        cache = cache_pagine = None
+        if cartella_cache is not None:
+            cache, cache_pagine = _cache_worker(cartella_cache)
+        if cartella_checkpoint is not None:
+            risultato = estrai_con_checkpoint(sorgente, _checkpoint_worker(cartella_checkpoint), backend,
+                                              cache_pagine=cache_pagine, cache=cache)
+        elif cache is not None:
+            risultato = estrai_dati_con_cache(sorgente, cache, backend, cache_pagine=cache_pagine)
+        else:
+            risultato = estrai_dati(sorgente, backend=backend)
+        return risultato.to_dict(), None
+    except Exception as errore:
+        return None, {"Errore": type(errore).__name__, "Messaggio": str(errore), "Traceback": traceback.format_exc()}
+
+
+class Scrittore:
+    """Scrive righe (vedi visura.consolidato.righe_persone) in JSONL o CSV"""
+
+    def __init__(self, percorso, formato):
+        self.file = open(percorso, "w", encoding="utf-8", newline="")
+        self.csv = None
+        if formato == "csv":
+            self.csv = csv.DictWriter(self.file, fieldnames=COLONNE_AZIENDA + COLONNE_PERSONA)
+            self.csv.writeheader()
+
+    def scrivi(self, righe):
+        for riga in righe:
+            if self.csv is not None:
+                self.csv.writerow(riga)
+            else:
+                self.file.write(json.dumps(riga, ensure_ascii=False) + "\n")
+        # I risultati devono essere leggibili man mano che arrivano
+        self.file.flush()
+
+    def chiudi(self):
+        self.file.close()
@@ -0,0 +1,79 @@
+"""
+Esportazione dei nominativi in Excel (per l'esportazione di molte visure insieme vedi visura.consolidato).
+
+Il file viene scritto una sola volta, in memoria e in modalità write-only:
+le larghezze delle colonne sono calcolate dai record prima della scrittura,
+senza rileggere il foglio.
+"""
+import io
+
+from .risultato import COLONNE_PERSONA
+
+MIME_EXCEL = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+NOME_FILE_EXCEL = "Elenco per casellario.xlsx"
+
+
+def colonne_record(dati):
+    """Colonne nell'ordine in cui compaiono nei record, come farebbe un DataFrame"""
+    if not dati:
+        return list(COLONNE_PERSONA)
+    colonne = {}
+    for record in dati:
+        colonne.update(dict.fromkeys(record))
+    return list(colonne)
+
+
+class LarghezzeColonne:
+    """Larghezze delle colonne aggiornate riga per riga, per i dati che non stanno in memoria"""
+
+    def __init__(self, colonne):
+        self.colonne = colonne
+        self._massime = {colonna: len(str(colonna)) for colonna in colonne}
+
+    def aggiorna(self, record):
+        for colonna in self.colonne:
+            valore = record.get(colonna)
+            if valore:
+                self._massime[colonna] = max(self._massime[colonna], len(str(valore)))
+
+    def valori(self):
+        return [self._massime[colonna] + 2 for colonna in self.colonne]
+
+
+def larghezze_colonne(dati, colonne):
+    """Larghezza di ogni colonna: il valore più lungo (intestazione compresa) più un margine"""
+    larghezze = LarghezzeColonne(colonne)
+    for record in dati:
+        larghezze.aggiorna(record)
+    return larghezze.valori()
+
+
+def scrivi_fogli_excel(destinazione, fogli):
+    """
+    Scrive un file Excel con un foglio per ogni (titolo, colonne, larghezze, record).
+    I record possono essere un generatore: in modalità write-only le righe passano
+    direttamente su disco, senza tenere il foglio in memoria.
+    """
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    for titolo, colonne, larghezze, dati in fogli:
+        ws = wb.create_sheet(titolo)
+        # In modalità write-only le larghezze vanno impostate prima di scrivere le righe
+        for indice, larghezza in enumerate(larghezze, start=1):
+            ws.column_dimensions[get_column_letter(indice)].width = larghezza
+
+        ws.append(colonne)
+        for record in dati:
+            # Le celle vuote restano vuote, come con pandas
+            ws.append([record.get(colonna) or None for colonna in colonne])
+    wb.save(destinazione)
+
+
+def esporta_excel(dati, colonne=None, titolo="Sheet1"):
+    """Restituisce i byte del file Excel con i record, pronti per il download"""
+    colonne = colonne or colonne_record(dati)
+    output = io.BytesIO()
+    scrivi_fogli_excel(output, [(titolo, colonne, larghezze_colonne(dati, colonne), dati)])
+    return output.getvalue()
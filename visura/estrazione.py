@@ -0,0 +1,141 @@
+import time
+
+from .backend import apri_documento
+from .diagnostica import Diagnostica, dimensione_sorgente
+from .intestazione import ScannerIntestazione
+from .pdf import leggi_byte, pagine_testo_parallelo, righe_da_pagine
+from .persone import RegistroPersone
+from .risultato import RisultatoVisura
+from .sezioni import NominativiPerSezione
+
+
+def registro_da_sezioni(nominativi):
+    """Registro delle persone dai nominativi di ogni sezione, nell'ordine delle sezioni"""
+    registro = RegistroPersone()
+    for tipo_sezione, trovati in nominativi.items():
+        for codice_fiscale, nome in trovati:
+            # Un codice fiscale già presente aggiunge solo la nuova sezione
+            registro.aggiungi(codice_fiscale, nome.cognome, nome.nomi, tipo_sezione)
+    return registro
+
+
+# Funzione per estrarre i dati
+def estrai_dati(sorgente, parallelo=False, processi=None, backend=None, osservatore=None, cache_pagine=None):
+    """
+    Estrae dati societari e nominativi da una visura camerale Telemaco.
+    La sorgente può essere un percorso, i byte del PDF, un file aperto in binario
+    oppure una lista con il testo già estratto delle pagine.
+    Le pagine vengono estratte man mano che servono: la lettura si ferma appena
+    l'intestazione è completa e si è raggiunta la sezione di fine.
+    Con parallelo=True le pagine dei documenti lunghi vengono estratte su più processi.
+    backend sceglie il motore di estrazione del testo (vedi visura.backend).
+    osservatore riceve l'avanzamento e i risultati parziali (vedi visura.avanzamento).
+    cache_pagine (visura.cache.CachePagine) evita di riestrarre le pagine già viste:
+    in quel caso le pagine vengono lette nel processo corrente anche con parallelo=True.
+    I tempi di ogni fase sono nel campo diagnostica del risultato.
+    """
+    diagnostica = Diagnostica(byte=dimensione_sorgente(sorgente))
+    parallelo = parallelo and cache_pagine is None and not isinstance(sorgente, (list, tuple))
+
+    # Caricamento del PDF
+    with diagnostica.fase("apertura_pdf"):
+        if parallelo:
+            sorgente = leggi_byte(sorgente)
+        backend, documento = apri_documento(sorgente, backend)
+    if parallelo:
+        diagnostica.backend = backend.nome
+        diagnostica.pagine_totali = backend.numero_pagine(documento)
+        pagine = pagine_testo_parallelo(sorgente, processi, backend=backend, documento=documento)
+        return estrai_da_pagine(pagine, diagnostica, osservatore)
+    return estrai_da_documento(backend, documento, diagnostica, osservatore, cache_pagine)
+
+
+def testo_documento(backend, documento, diagnostica, cache_pagine=None):
+    """Generatore del testo delle pagine di un documento già aperto, annotando backend e pagine totali"""
+    diagnostica.backend = backend.nome
+    diagnostica.pagine_totali = backend.numero_pagine(documento)
+    if cache_pagine is not None:
+        return cache_pagine.testo_pagine(backend, documento, diagnostica)
+    return backend.testo_pagine(documento)
+
+
+def estrai_da_documento(backend, documento, diagnostica=None, osservatore=None, cache_pagine=None):
+    """Come estrai_dati, per un documento già aperto con apri_documento"""
+    if diagnostica is None:
+        diagnostica = Diagnostica()
+    return estrai_da_pagine(testo_documento(backend, documento, diagnostica, cache_pagine), diagnostica, osservatore)
+
+
+def _notifica_pagine(pagine, diagnostica, osservatore):
+    """Avvisa l'osservatore a ogni pagina letta; chiudendo il generatore si chiude anche la sorgente"""
+    try:
+        for pagina in pagine:
+            osservatore.pagina_letta(diagnostica.pagine_lette, diagnostica.pagine_totali)
+            yield pagina
+    finally:
+        pagine.close()
+
+
+def _risultato(scanner, diagnostica):
+    return RisultatoVisura([], scanner.ragione_sociale, scanner.comune, scanner.via,
+                           scanner.numero_addetti, scanner.forma_giuridica, diagnostica,
+                           data_estrazione=scanner.data_estrazione)
+
+
+def estrai_da_pagine(pagine, diagnostica=None, osservatore=None):
+    """
+    Parte dell'estrazione indipendente dal PDF: riceve un iteratore con il testo
+    delle pagine e ne consuma solo quanto serve. L'elaborazione procede in un solo
+    passaggio (pagine, righe, sezioni, persone): in memoria restano la pagina
+    corrente, le ultime righe della sezione in corso e i nominativi trovati,
+    mai il testo completo del documento.
+    """
+    if diagnostica is None:
+        diagnostica = Diagnostica()
+    pagine = diagnostica.misura_pagine(iter(pagine))
+    if osservatore is not None:
+        pagine = _notifica_pagine(pagine, diagnostica, osservatore)
+
+    sezioni = NominativiPerSezione()
+    if osservatore is not None:
+        sezioni.alla_chiusura = lambda nome: osservatore.sezione_elaborata(
+            nome, registro_da_sezioni(sezioni.nominativi).record())
+    intestazione_notificata = False
+
+    # Un solo passaggio sulle righe per l'intestazione, la riga di fine e le sezioni
+    inizio = time.perf_counter()
+    tempo_sezioni = 0.0
+    scanner = ScannerIntestazione()
+    for riga in righe_da_pagine(pagine):
+        completo = scanner.alimenta(riga)
+        # Le sezioni si fermano prima della seconda occorrenza della prima sezione di fine trovata
+        if scanner.riga_fine is None:
+            inizio_sezione = time.perf_counter()
+            sezioni.alimenta(riga)
+            tempo_sezioni += time.perf_counter() - inizio_sezione
+        # L'intestazione è pronta prima delle persone: il risultato si completa alla fine
+        if osservatore is not None and not intestazione_notificata and scanner.intestazione_completa:
+            osservatore.intestazione_pronta(_risultato(scanner, diagnostica).intestazione())
+            intestazione_notificata = True
+        if completo:
+            break
+    # Le pagine restanti non servono: chiude il generatore (e l'eventuale pool di processi)
+    pagine.close()
+    scanner.chiudi()
+    # Il tempo di estrazione delle pagine è già contato a parte
+    diagnostica.aggiungi("scansione_intestazione", time.perf_counter() - inizio - tempo_sezioni
+                         - diagnostica.fasi.get("estrazione_testo", 0.0))
+    diagnostica.righe = scanner.righe_lette
+
+    risultato = _risultato(scanner, diagnostica)
+    if osservatore is not None and not intestazione_notificata:
+        osservatore.intestazione_pronta(risultato.intestazione())
+
+    with diagnostica.fase("elaborazione_sezioni"):
+        sezioni.chiudi()
+        risultato.dati = registro_da_sezioni(sezioni.nominativi).record()
+    diagnostica.aggiungi("elaborazione_sezioni", tempo_sezioni)
+    diagnostica.sezioni = len(sezioni.nominativi)
+    diagnostica.persone = len(risultato.dati)
+
+    return risultato
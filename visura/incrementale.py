@@ -0,0 +1,156 @@
+"""
+Rielaborazione delle visure aggiornate e confronto con l'elaborazione precedente.
+
+    python -m visura.incrementale VISURA.pdf [VISURA.pdf ...] [--storico CARTELLA] [--cache CARTELLA]
+                                  [--backend NOME] [--non-registrare]
+
+Per ogni azienda (riconosciuta dalla ragione sociale) si conserva l'ultimo
+risultato. Alla nuova elaborazione si riportano le persone aggiunte, quelle
+rimosse e quelle con sezioni diverse; le pagine rimaste uguali rispetto alle
+visure già viste vengono lette dalla cache delle pagine invece che riestratte.
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+
+from .backend import BACKEND
+from .cache import CARTELLA_PREDEFINITA, CacheDisco, cache_pagine_su_disco
+from .estrazione import estrai_dati
+from .risultato import NON_TROVATO, RisultatoVisura
+
+
+@dataclass
+class DifferenzePersone:
+    """Persone della visura attuale confrontate con quelle dell'elaborazione precedente"""
+    aggiunte: list = field(default_factory=list)  # record presenti solo ora
+    rimosse: list = field(default_factory=list)  # record presenti solo prima
+    cambiate: list = field(default_factory=list)  # coppie (prima, ora) con sezioni diverse
+    data_precedente: str = ""
+
+    @property
+    def nessuna(self):
+        return not (self.aggiunte or self.rimosse or self.cambiate)
+
+    def righe_report(self):
+        """Una riga per ogni differenza: + aggiunta, - rimossa, ~ sezioni cambiate"""
+        righe = [f"  + {_descrivi(p)} - {p['Sezione']}" for p in self.aggiunte]
+        righe += [f"  - {_descrivi(p)} - {p['Sezione']}" for p in self.rimosse]
+        righe += [f"  ~ {_descrivi(ora)}: {prima['Sezione']} -> {ora['Sezione']}" for prima, ora in self.cambiate]
+        return righe
+
+    def to_dict(self):
+        return {
+            "data_precedente": self.data_precedente,
+            "aggiunte": self.aggiunte,
+            "rimosse": self.rimosse,
+            "cambiate": [{"prima": prima, "ora": ora} for prima, ora in self.cambiate],
+        }
+
+
+def _descrivi(persona):
+    return f"{persona['Cognome']} {persona['Nomi']} ({persona['Codice Fiscale']})".replace("  ", " ")
+
+
+def confronta_persone(precedenti, attuali):
+    """Differenze tra due elenchi di record, confrontati per codice fiscale"""
+    prima = {persona["Codice Fiscale"]: persona for persona in precedenti}
+    ora = {persona["Codice Fiscale"]: persona for persona in attuali}
+    return DifferenzePersone(
+        aggiunte=[persona for cf, persona in ora.items() if cf not in prima],
+        rimosse=[persona for cf, persona in prima.items() if cf not in ora],
+        cambiate=[(prima[cf], persona) for cf, persona in ora.items()
+                  if cf in prima and prima[cf]["Sezione"] != persona["Sezione"]],
+    )
+
+
+def chiave_azienda(ragione_sociale):
+    """Chiave dell'azienda nello storico: la ragione sociale senza differenze di spazi e maiuscole"""
+    normalizzata = " ".join(ragione_sociale.split()).upper()
+    return hashlib.sha256(normalizzata.encode("utf-8")).hexdigest()[:32]
+
+
+class StoricoAziende:
+    """
+    Ultimo risultato di ogni azienda, in una cartella con le stesse scritture
+    atomiche della cache dei risultati. Le voci non scadono: tra due visure della
+    stessa azienda possono passare mesi.
+    """
+
+    def __init__(self, cartella=os.path.join(CARTELLA_PREDEFINITA, "storico")):
+        self.disco = CacheDisco(cartella, dimensione_massima=float("inf"), eta_massima=float("inf"))
+
+    def precedente(self, ragione_sociale):
+        """(data, RisultatoVisura) dell'ultima elaborazione dell'azienda, oppure None"""
+        voce = self.disco.leggi(chiave_azienda(ragione_sociale))
+        if voce is None:
+            return None
+        return voce["data"], RisultatoVisura.from_dict(voce["risultato"])
+
+    def registra(self, risultato):
+        risultato_salvato = risultato.to_dict()
+        risultato_salvato.pop("diagnostica", None)
+        self.disco.scrivi(chiave_azienda(risultato.ragione_sociale), {
+            "data": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "risultato": risultato_salvato,
+        })
+
+
+def aggiorna(sorgente, storico, cache_pagine=None, backend=None, registra=True):
+    """
+    Elabora la visura e la confronta con l'elaborazione precedente della stessa azienda.
+    Restituisce (risultato, differenze); differenze è None se l'azienda non era nello
+    storico o se la ragione sociale non è stata trovata.
+    """
+    risultato = estrai_dati(sorgente, backend=backend, cache_pagine=cache_pagine)
+    if risultato.ragione_sociale == NON_TROVATO:
+        return risultato, None
+
+    differenze = None
+    precedente = storico.precedente(risultato.ragione_sociale)
+    if precedente is not None:
+        data, risultato_precedente = precedente
+        differenze = confronta_persone(risultato_precedente.dati, risultato.dati)
+        differenze.data_precedente = data
+    if registra:
+        storico.registra(risultato)
+    return risultato, differenze
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Confronta visure aggiornate con l'elaborazione precedente")
+    parser.add_argument("pdf", nargs="+", help="Visure da elaborare")
+    parser.add_argument("--storico", default=None, metavar="CARTELLA",
+                        help="Cartella con gli ultimi risultati per azienda (default: storico nella cache)")
+    parser.add_argument("--cache", default=CARTELLA_PREDEFINITA, metavar="CARTELLA",
+                        help=f"Cartella della cache delle pagine (default: {CARTELLA_PREDEFINITA})")
+    parser.add_argument("--backend", default=None, choices=["auto"] + list(BACKEND),
+                        help="Motore di estrazione del testo (default: auto)")
+    parser.add_argument("--non-registrare", action="store_true",
+                        help="Confronta soltanto, senza aggiornare lo storico")
+    args = parser.parse_args(argv)
+
+    storico = StoricoAziende(args.storico or os.path.join(args.cache, "storico"))
+    cache_pagine = cache_pagine_su_disco(args.cache)
+    for percorso in args.pdf:
+        risultato, differenze = aggiorna(percorso, storico, cache_pagine, args.backend, not args.non_registrare)
+        diagnostica = risultato.diagnostica
+        print(f"{percorso}: {risultato.ragione_sociale} - {len(risultato.dati)} nominativi "
+              f"(pagine dalla cache: {diagnostica.pagine_da_cache}/{diagnostica.pagine_lette})")
+        if risultato.ragione_sociale == NON_TROVATO:
+            print("  Ragione sociale non trovata: impossibile confrontare con lo storico")
+        elif differenze is None:
+            print("  Prima elaborazione di questa azienda")
+        elif differenze.nessuna:
+            print(f"  Nessuna variazione rispetto all'elaborazione del {differenze.data_precedente}")
+        else:
+            print(f"  Variazioni rispetto all'elaborazione del {differenze.data_precedente}:")
+            for riga in differenze.righe_report():
+                print(riga)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
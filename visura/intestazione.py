@@ -0,0 +1,247 @@
+import re
+
+from .risultato import NON_TROVATO
+
+# Lista delle sezioni che determinano la fine della ricerca
+SEZIONI_FINE = [
+    "Trasferimenti d'azienda, fusioni, scissioni, subentri",
+    "Trasferimenti d'azienda, subentri",
+    "Attivita', albi ruoli e licenze",
+    "Storia delle modifiche"
+]
+
+pattern_addetti = re.compile(r'Addetti.*?(?:\d{2}/\d{2}/\d{4})?\s*(\d+)\s*$')
+# Data del documento, nell'intestazione delle pagine: "... estratto dal Registro Imprese in data 15/03/2024"
+pattern_data_estrazione = re.compile(r'estratto\s+dal\s+Registro\s+Imprese\s+in\s+data\s+(\d{2})/(\d{2})/(\d{4})',
+                                     re.IGNORECASE)
+
+
+class ScannerIntestazione:
+    """
+    Legge le righe della visura una alla volta e ricava in un solo passaggio
+    forma giuridica, numero addetti, ragione sociale, comune e via, oltre alla
+    riga di fine (seconda occorrenza di una delle SEZIONI_FINE). La data di
+    estrazione del documento viene registrata se compare prima della fine della
+    scansione, ma non serve per terminarla: non tutte le visure la riportano.
+
+    I campi che proseguono sulla riga successiva restano "in attesa" finché
+    quella riga non arriva. alimenta() restituisce True quando tutti i campi sono
+    risolti e la riga di fine è stata trovata: le righe seguenti non servono più.
+    """
+
+    def __init__(self):
+        self.forma_giuridica = NON_TROVATO
+        self.numero_addetti = NON_TROVATO
+        self.ragione_sociale = NON_TROVATO
+        self.comune = NON_TROVATO
+        self.via = NON_TROVATO
+        self.data_estrazione = None  # "AAAA-MM-GG"
+        self.riga_fine = None
+
+        self._indice = -1
+        self._occorrenze_fine = dict.fromkeys(SEZIONI_FINE, 0)
+
+        # Stato di ogni campo: None = non ancora visto, lista = in attesa della riga successiva
+        self._forma_risolta = False
+        self._forma_parole = None
+        self._addetti_risolto = False
+        self._ragione_risolta = False
+        self._ragione_inizio = None
+        self._ragione_saltata = False
+        self._ragione_parti = None
+        self._indirizzo_risolto = False
+        self._comune_parole = None
+        self._via_parole = None
+
+    @property
+    def righe_lette(self):
+        return self._indice + 1
+
+    @property
+    def intestazione_completa(self):
+        """Tutti i campi dell'intestazione hanno il valore definitivo"""
+        return self._forma_risolta and self._addetti_risolto and self._ragione_risolta and self._indirizzo_risolto
+
+    @property
+    def completo(self):
+        return self.intestazione_completa and self.riga_fine is not None
+
+    def alimenta(self, riga):
+        """Elabora la riga successiva; restituisce True se la scansione può terminare"""
+        self._indice += 1
+        self._forma(riga)
+        self._addetti(riga)
+        self._ragione_sociale(riga)
+        self._indirizzo(riga)
+        self._data_estrazione(riga)
+        self._fine(riga)
+        return self.completo
+
+    def chiudi(self):
+        """Completa i campi rimasti in attesa quando le righe sono finite"""
+        if self._forma_parole is not None:
+            self._chiudi_forma()
+        if self._ragione_parti is not None:
+            self._chiudi_ragione_sociale()
+        self._ragione_risolta = True
+        if self._via_parole is not None:
+            self._chiudi_indirizzo()
+        return self
+
+    # Ricerca della "Forma giuridica"
+    def _forma(self, riga):
+        if self._forma_risolta:
+            return
+
+        if self._forma_parole is not None:
+            # La forma non era completa: continua con questa riga
+            for parola in riga.split():
+                if parola and len(parola) > 0 and parola[0].isupper():
+                    break
+                self._forma_parole.append(parola)
+            self._chiudi_forma()
+            return
+
+        if "Forma giuridica" in riga:
+            # Trova tutte le parole successive alla "Forma giuridica"
+            forma_giuridica_parole = []
+            parti = riga.split()
+            trovato_forma = False
+
+            # Partiamo dalla parola successiva a "Forma giuridica"
+            if len(parti) > 2:  # Controllo che ci siano parole dopo "Forma giuridica"
+                for parola in parti[2:]:
+                    if parola and len(parola) > 0 and parola[0].isupper():
+                        trovato_forma = True
+                        break
+                    forma_giuridica_parole.append(parola)
+
+            self._forma_parole = forma_giuridica_parole
+            if trovato_forma:
+                self._chiudi_forma()
+
+    def _chiudi_forma(self):
+        # Unisci le parole per ottenere la forma giuridica
+        if self._forma_parole:
+            self.forma_giuridica = " ".join(self._forma_parole).strip()
+        self._forma_parole = None
+        self._forma_risolta = True
+
+    # Estrarre il numero degli addetti
+    def _addetti(self, riga):
+        if self._addetti_risolto or "Addetti" not in riga:
+            return
+        # Cerca un numero che viene dopo una data (se presente) o dopo la parola Addetti
+        match = pattern_addetti.search(riga)
+        if match:
+            self.numero_addetti = match.group(1)
+            self._addetti_risolto = True
+
+    # Estrarre la ragione sociale
+    def _ragione_sociale(self, riga):
+        if self._ragione_risolta:
+            return
+
+        if self._ragione_inizio is None:
+            if "VISURA" in riga or "FASCICOLO" in riga:
+                # Ragione sociale inizia due o tre righe dopo "VISURA" o "FASCICOLO"
+                self._ragione_inizio = self._indice + 2
+            return
+
+        if self._ragione_parti is None:
+            if self._indice < self._ragione_inizio:
+                return
+            # Se la riga iniziale è vuota si parte dalla successiva
+            if riga.strip() == "" and not self._ragione_saltata:
+                self._ragione_saltata = True
+                self._ragione_inizio += 1
+                return
+            self._ragione_parti = []
+
+        # Concatenare righe fino a incontrare una riga vuota
+        if riga.strip() == "":
+            self._chiudi_ragione_sociale()
+        else:
+            self._ragione_parti.append(riga.strip())
+
+    def _chiudi_ragione_sociale(self):
+        self.ragione_sociale = " ".join(self._ragione_parti).strip()
+        self._ragione_parti = None
+        self._ragione_risolta = True
+
+    # Estrarre l'indirizzo (Comune e Via)
+    def _indirizzo(self, riga):
+        if self._indirizzo_risolto:
+            return
+
+        if self._via_parole is not None:
+            # La riga successiva contiene la parte della via fino al CAP
+            for parola in riga.split():
+                if "CAP" in parola:
+                    break  # Interrompi se trovi "CAP" nella riga successiva
+                self._via_parole.append(parola)
+            self._chiudi_indirizzo()
+            return
+
+        if "Indirizzo Sede" in riga:
+            # Aggiungiamo uno spazio dopo "Sede" per separare "Sede" da "BOLOGNA" o altre parole
+            riga = riga.replace("Sede", "Sede ")
+            # Trova il Comune e la Via
+            parti = riga.split()
+            comune_parole = []
+            via_parole = []
+            trovato_comune = False
+
+            # Analizza la prima riga per estrarre il Comune e la Via
+            if len(parti) > 2:  # Controllo che ci siano parole dopo "Indirizzo Sede"
+                for parola in parti[2:]:  # Ignora "Indirizzo Sede"
+                    if not trovato_comune:
+                        # Aggiungi al Comune solo parole che iniziano con una maiuscola
+                        if parola and len(parola) > 0 and parola[0].isupper():
+                            comune_parole.append(parola)
+                        # Se trovi una parentesi chiusa, il Comune è completo
+                        if ")" in parola:
+                            comune_parole.append(parola)  # Aggiungi la sigla del Comune
+                            trovato_comune = True
+                    elif trovato_comune:
+                        # Aggiungi la parola alla via, ma non includere numeri o CAP
+                        if "CAP" in parola:
+                            break  # Interrompi l'analisi delle parole dopo "CAP"
+                        via_parole.append(parola)
+
+            self._comune_parole = comune_parole
+            self._via_parole = via_parole
+
+    def _chiudi_indirizzo(self):
+        if self._comune_parole:
+            self.comune = " ".join(self._comune_parole).strip()
+        if self._via_parole:
+            self.via = " ".join(self._via_parole).strip()
+
+        # Rimuovi tutte le parole dopo il CAP, incluso CAP stesso
+        if "CAP" in self.via:
+            self.via = self.via.split("CAP")[0].strip()
+
+        self._comune_parole = None
+        self._via_parole = None
+        self._indirizzo_risolto = True
+
+    # Data in cui il documento è stato estratto dal Registro Imprese
+    def _data_estrazione(self, riga):
+        if self.data_estrazione is not None or "data" not in riga:
+            return
+        match = pattern_data_estrazione.search(riga)
+        if match:
+            giorno, mese, anno = match.groups()
+            self.data_estrazione = f"{anno}-{mese}-{giorno}"
+
+    # Trova la seconda occorrenza di una qualsiasi delle sezioni di fine
+    def _fine(self, riga):
+        if self.riga_fine is not None:
+            return
+        for sezione in SEZIONI_FINE:
+            if sezione in riga:
+                self._occorrenze_fine[sezione] += 1
+                # Le righe arrivano in ordine: la prima seconda occorrenza è anche la minima
+                if self._occorrenze_fine[sezione] == 2:
+                    self.riga_fine = self._indice
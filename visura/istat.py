@@ -0,0 +1,107 @@
+"""
+Generazione della tabella dei comuni (visura/comuni.tsv) dai file CSV dell'ISTAT:
+l'elenco dei comuni italiani ed eventualmente quelli dei comuni soppressi e delle
+unità territoriali estere. I codici fiscali delle persone nate prima di una fusione
+riportano il codice catastale del comune soppresso. Se un codice compare in più
+file vale l'ultimo: l'elenco dei comuni soppressi va indicato per primo.
+
+    python -m visura.istat compila [Elenco-comuni-soppressi.csv] Elenco-comuni-italiani.csv \
+                                   [Elenco-stati-esteri.csv] [-o comuni.tsv]
+    python -m visura.istat cerca H501 Z110
+"""
+import argparse
+import csv
+import os
+import re
+import sys
+
+from .comuni import SIGLA_ESTERO, TABELLA_PREDEFINITA, Comune, comune_di_nascita, tabella_comuni
+
+pattern_catastale = re.compile(r"[A-Z][0-9]{3}")
+
+
+def _colonna(intestazioni, *nomi):
+    """Indice della prima colonna la cui intestazione contiene uno dei nomi indicati"""
+    normalizzate = [" ".join(intestazione.lower().split()) for intestazione in intestazioni]
+    for nome in nomi:
+        for indice, intestazione in enumerate(normalizzate):
+            if nome in intestazione:
+                return indice
+    return None
+
+
+def _leggi_csv_istat(percorso):
+    """Righe di un CSV ISTAT (separatore ";"), che può essere in UTF-8 o in Windows-1252"""
+    with open(percorso, "rb") as f:
+        contenuto = f.read()
+    try:
+        testo = contenuto.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        testo = contenuto.decode("cp1252")
+    return list(csv.reader(testo.splitlines(), delimiter=";"))
+
+
+def leggi_istat(percorso):
+    """
+    Coppie (codice catastale, Comune) da un file ISTAT: l'elenco dei comuni italiani
+    ("Codice Catastale del comune", "Denominazione in italiano", "Sigla automobilistica"),
+    quello dei comuni soppressi (con la provincia al momento della soppressione)
+    oppure l'elenco delle unità territoriali estere ("Codice AT", "Denominazione IT").
+    A parità di codice vale l'ultima riga del file.
+    """
+    righe = _leggi_csv_istat(percorso)
+    intestazioni = righe[0]
+    colonna_codice = _colonna(intestazioni, "codice catastale", "codice at")
+    colonna_nome = _colonna(intestazioni, "denominazione in italiano", "denominazione it", "denominazione")
+    colonna_sigla = _colonna(intestazioni, "sigla automobilistica")
+    if colonna_codice is None or colonna_nome is None:
+        raise ValueError(f"{percorso}: colonne del codice catastale o della denominazione non trovate")
+
+    for riga in righe[1:]:
+        if len(riga) <= max(colonna_codice, colonna_nome):
+            continue
+        codice = riga[colonna_codice].strip().upper()
+        if not pattern_catastale.fullmatch(codice):
+            continue  # ad esempio stati esteri senza codice catastale ("n.d.")
+        sigla = riga[colonna_sigla].strip().upper() if colonna_sigla is not None else SIGLA_ESTERO
+        yield codice, Comune(riga[colonna_nome].strip().upper(), sigla or SIGLA_ESTERO)
+
+
+def compila(percorsi, uscita=TABELLA_PREDEFINITA):
+    """Scrive la tabella compatta a partire dai file ISTAT; restituisce il numero di codici"""
+    tabella = {}
+    for percorso in percorsi:
+        tabella.update(leggi_istat(percorso))
+
+    temporaneo = uscita + ".tmp"
+    with open(temporaneo, "w", encoding="utf-8", newline="\r\n") as f:
+        f.write("# Codice catastale -> comune e sigla della provincia (EE per gli stati esteri).\n")
+        f.write(f"# Generata da: {', '.join(os.path.basename(p) for p in percorsi)}\n")
+        for codice in sorted(tabella):
+            f.write(f"{codice}\t{tabella[codice].nome}\t{tabella[codice].provincia}\n")
+    os.replace(temporaneo, uscita)
+    tabella_comuni.cache_clear()
+    return len(tabella)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tabella codice catastale -> comune di nascita")
+    comandi = parser.add_subparsers(dest="comando", required=True)
+    parser_compila = comandi.add_parser("compila", help="Genera la tabella dai file CSV dell'ISTAT")
+    parser_compila.add_argument("file_istat", nargs="+")
+    parser_compila.add_argument("-o", "--uscita", default=TABELLA_PREDEFINITA,
+                                help=f"File da scrivere (default: {TABELLA_PREDEFINITA})")
+    parser_cerca = comandi.add_parser("cerca", help="Cerca uno o più codici catastali")
+    parser_cerca.add_argument("codici", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.comando == "compila":
+        print(f"{compila(args.file_istat, args.uscita)} codici scritti in {args.uscita}")
+        return 0
+    for codice in args.codici:
+        print(f"{codice.upper()}\t{comune_di_nascita(codice.upper())}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
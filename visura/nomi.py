@@ -0,0 +1,149 @@
+import re
+from collections import deque
+from typing import NamedTuple
+
+# Regex del codice fiscale delle persone fisiche; con l'omocodia le cifre possono diventare lettere LMNPQRSTUV
+pattern_cf = re.compile(r"\b[A-Z]{6}[0-9LMNPQRSTUV]{2}[A-Z][0-9LMNPQRSTUV]{2}[A-Z][0-9LMNPQRSTUV]{3}[A-Z]\b")
+pattern_numeri = re.compile(r"\d+")
+
+# Caratteri ammessi in un nome: una parola è valida se non contiene altro
+CARATTERI_VALIDI = "ABCDEFGHIJKLMNOPQRSTUVWXYZÀÈÌÒÙ àèìòù'\"- "
+_rimuovi_validi = str.maketrans("", "", CARATTERI_VALIDI)
+
+# Lista degli offset da provare in ordine: 0 (riga corrente), -1, -2, -3
+OFFSETS_DA_PROVARE = (0, -1, -2, -3)
+
+
+class NomeRisolto(NamedTuple):
+    cognome: str
+    nomi: str
+
+
+def verifica_cognome(nome, codice_fiscale):
+    """
+    Verifica se le prime 3 lettere del codice fiscale sono presenti nel cognome
+    e se la seconda parola è parte del cognome o del nome. Restituisce TRUE se il cognome
+    è dato solo dalla prima parola e FALSE se il cognome è composto anche dalla seconda parola
+    """
+    parole = nome.split()
+
+    if len(parole) < 2:
+        return False  # Caso con una sola parola
+
+    prima_parola = set(parole[0])
+    seconda_parola = set(parole[1])
+    terza_parola = set(parole[2]) if len(parole) > 2 else set()
+
+    # Verifica che le prime 3 lettere siano nella prima parola
+    if not prima_parola.issuperset(codice_fiscale[:3]):
+        return False
+
+    # Se successive_3_lettere sono nella terza parola, escludi la seconda parola dal cognome
+    successive_3_lettere = codice_fiscale[3:6]
+    if terza_parola.issuperset(successive_3_lettere):
+        return False
+
+    # Verifica se successive_3_lettere sono nella seconda parola, quinto_sesto_carattere nella terza, o quarto_carattere nella seconda
+    return (seconda_parola.issuperset(successive_3_lettere)
+            or terza_parola.issuperset(codice_fiscale[4:6])
+            or seconda_parola.issuperset(codice_fiscale[3:4]))
+
+
+def rimuovi_numeri(riga):
+    return pattern_numeri.sub("", riga).strip()
+
+
+def is_valid_word(parola):
+    return not parola.translate(_rimuovi_validi)
+
+
+def parole_valide(riga):
+    """
+    Pulisce la riga e restituisce le parole valide per un nome, oppure None se la riga
+    va ignorata (vuota dopo aver tolto i numeri o non inizia con una maiuscola)
+    """
+    parole = rimuovi_numeri(riga.strip()).split()
+
+    # La prima parola deve iniziare con una maiuscola, altrimenti ignoriamo la riga
+    if not parole or not parole[0][0].isupper():
+        return None
+
+    parole_valide_riga = []
+    for parola in parole:
+        if is_valid_word(parola):
+            parole_valide_riga.append(parola)
+        elif parola.islower():
+            break  # Se troviamo una parola minuscola, ci fermiamo su questa riga
+    return parole_valide_riga
+
+
+def risolvi_nome(parole_righe, codice_fiscale):
+    """
+    Nome della persona con il codice fiscale, oppure None. parole_righe genera le
+    parole valide (o None) della riga del codice fiscale e delle precedenti, dalla
+    più vicina: vengono consumate solo finché servono.
+    """
+    parole_valide_totali = []  # Accumula le parole valide trovate finora
+    ultima_parola = None  # Variabile per conservare l'ultima parola trovata
+
+    for parole_valide_riga in parole_righe:
+        if parole_valide_riga is None:
+            continue
+
+        # Caso: una sola parola valida sulla riga
+        if len(parole_valide_riga) == 1:
+            # Memorizza temporaneamente come ultima parola
+            if not ultima_parola:
+                ultima_parola = parole_valide_riga[0]
+            continue  # Continua a cercare altre parole valide in righe precedenti
+
+        # Caso: più parole valide sulla riga
+        parole_valide_totali.extend(parole_valide_riga)
+
+        # Se abbiamo trovato almeno due parole valide, interrompiamo la ricerca
+        if len(parole_valide_totali) >= 2:
+            break
+
+    # Aggiunge l'ultima parola solo dopo aver completato il nome
+    if ultima_parola:
+        parole_valide_totali.append(ultima_parola)
+
+    # Il nome è valido solo se abbiamo trovato almeno due parole
+    if len(parole_valide_totali) < 2:
+        return None
+
+    nome_completo = parole_valide_totali
+    if not verifica_cognome(" ".join(nome_completo), codice_fiscale):
+        # Cognome = prime due parole
+        return NomeRisolto(" ".join(nome_completo[:2]), " ".join(nome_completo[2:]))
+    # Cognome = prima parola
+    return NomeRisolto(nome_completo[0], " ".join(nome_completo[1:]))
+
+
+class FinestraNomi:
+    """
+    Trova i codici fiscali nelle righe di una sezione, che riceve una alla volta, e
+    ricostruisce cognome e nomi dalla riga stessa e dalle tre precedenti: conserva solo
+    queste quattro righe. Le parole valide di una riga si calcolano solo se serve, e
+    una volta sola.
+    """
+
+    def __init__(self):
+        self._righe = deque(maxlen=len(OFFSETS_DA_PROVARE))  # [riga, parole valide o None se da calcolare]
+
+    def alimenta(self, riga):
+        """(codice_fiscale, NomeRisolto) se la riga ha un codice fiscale con un nome riconosciuto, altrimenti None"""
+        self._righe.append([riga, None])
+        match_cf = pattern_cf.search(riga)
+        if match_cf is None:
+            return None
+        codice_fiscale = match_cf.group()
+        nome = risolvi_nome(self._parole_precedenti(), codice_fiscale)
+        return None if nome is None else (codice_fiscale, nome)
+
+    def _parole_precedenti(self):
+        for voce in reversed(self._righe):
+            if voce[1] is None:
+                # Le righe da ignorare diventano False, per non ricalcolarle
+                voce[1] = parole_valide(voce[0]) or False
+            yield voce[1] or None
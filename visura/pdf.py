@@ -0,0 +1,90 @@
+"""
+Lettura incrementale del testo dei PDF.
+
+Il testo viene estratto una pagina alla volta, così chi consuma le righe può
+fermarsi appena ha trovato quello che gli serve senza estrarre le pagine restanti.
+Per i fascicoli molto lunghi l'estrazione può essere distribuita su più processi.
+"""
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Sotto questo numero di pagine l'avvio del pool costa più di quanto fa risparmiare
+SOGLIA_PAGINE_PARALLELO = 64
+
+
+def apri_pdf(sorgente):
+    """Apre il PDF con PyPDF2, importato solo al primo utilizzo"""
+    from PyPDF2 import PdfReader
+
+    if isinstance(sorgente, (bytes, bytearray)):
+        sorgente = io.BytesIO(sorgente)
+    return PdfReader(sorgente)
+
+
+def leggi_byte(sorgente):
+    """Restituisce i byte del PDF da un percorso, da byte o da un file aperto in binario"""
+    if isinstance(sorgente, (bytes, bytearray)):
+        return bytes(sorgente)
+    if hasattr(sorgente, "read"):
+        return sorgente.read()
+    with open(sorgente, "rb") as f:
+        return f.read()
+
+
+def _estrai_intervallo(backend, dati_pdf, inizio, fine):
+    """Eseguita nel processo worker: ogni worker apre il proprio documento"""
+    documento = backend.apri(dati_pdf)
+    return list(backend.testo_pagine(documento, inizio, fine))
+
+
+def pagine_testo_parallelo(dati_pdf, processi=None, soglia=SOGLIA_PAGINE_PARALLELO, backend=None, documento=None):
+    """
+    Estrae blocchi di pagine su un pool di processi e li restituisce nell'ordine
+    originale, quindi con un testo identico a quello sequenziale. Sotto la soglia
+    di pagine resta tutto nel processo corrente.
+    Se il consumatore smette di leggere, i blocchi non ancora avviati vengono annullati.
+    Si può passare il documento già aperto sugli stessi byte per non rileggerlo.
+    """
+    if backend is None:
+        from .backend import ottieni_backend
+        backend = ottieni_backend()
+    if documento is None:
+        documento = backend.apri(dati_pdf)
+    totale = backend.numero_pagine(documento)
+    processi = processi or os.cpu_count() or 1
+    if totale < soglia or processi < 2:
+        yield from backend.testo_pagine(documento)
+        return
+
+    # Blocchi piccoli rispetto al totale: le prime pagine arrivano presto e il
+    # consumatore può fermarsi senza aspettare l'intero documento
+    blocco = max(1, -(-totale // (processi * 4)))
+    pool = ProcessPoolExecutor(max_workers=processi)
+    try:
+        futuri = [pool.submit(_estrai_intervallo, backend, dati_pdf, inizio, min(inizio + blocco, totale))
+                  for inizio in range(0, totale, blocco)]
+        for futuro in futuri:
+            yield from futuro.result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def righe_da_pagine(pagine):
+    """
+    Genera le righe del testo ottenuto concatenando le pagine, esattamente come
+    "".join(pagine).splitlines(), ma senza costruire il testo completo.
+    Il testo delle pagine è concatenato senza separatori: l'ultima riga di una
+    pagina può proseguire nella successiva, quindi resta in sospeso finché non
+    arriva la pagina dopo.
+    """
+    sospesa = ""
+    for pagina in pagine:
+        parti = (sospesa + pagina).splitlines(keepends=True)
+        sospesa = ""
+        # Un "\r" finale potrebbe essere la prima metà di un "\r\n" a cavallo delle pagine
+        if parti and (parti[-1] == parti[-1].splitlines()[0] or parti[-1].endswith("\r")):
+            sospesa = parti.pop()
+        for parte in parti:
+            yield parte.splitlines()[0]
+    yield from sospesa.splitlines()
@@ -0,0 +1,60 @@
+from dataclasses import dataclass, field
+
+from .codice_fiscale import decodifica_codice_fiscale, decodifica_codici_fiscali
+from .comuni import comune_di_nascita
+
+
+@dataclass
+class Persona:
+    """Una persona trovata nella visura, con le sezioni in cui compare in ordine di apparizione"""
+    cognome: str
+    nomi: str
+    codice_fiscale: str
+    sezioni: dict = field(default_factory=dict)  # usato come insieme ordinato
+
+    def record(self, decodificato=None):
+        """Record di uscita: la stringa "Sezione" viene composta solo qui"""
+        if decodificato is None:
+            decodificato = decodifica_codice_fiscale(self.codice_fiscale)
+        return {
+            "Cognome": self.cognome,
+            "Nomi": self.nomi,
+            "Codice Fiscale": self.codice_fiscale,
+            "Data di nascita": decodificato.data_nascita,
+            "Codice catastale": decodificato.codice_catastale,
+            "Comune di nascita": comune_di_nascita(decodificato.codice_catastale),
+            "Sezione": ", ".join(self.sezioni),
+        }
+
+
+class RegistroPersone:
+    """
+    Persone indicizzate per codice fiscale. Aggiungere una persona già presente
+    costa O(1): si aggiunge solo la sezione, mantenendo nome e cognome della prima
+    occorrenza. Una sezione già registrata per la persona non viene ripetuta.
+    """
+
+    def __init__(self):
+        self._persone = {}
+
+    def __contains__(self, codice_fiscale):
+        return codice_fiscale in self._persone
+
+    def __len__(self):
+        return len(self._persone)
+
+    def __iter__(self):
+        return iter(self._persone.values())
+
+    def aggiungi(self, codice_fiscale, cognome, nomi, sezione):
+        persona = self._persone.get(codice_fiscale)
+        if persona is None:
+            persona = self._persone[codice_fiscale] = Persona(cognome, nomi, codice_fiscale)
+        persona.sezioni[sezione] = None
+        return persona
+
+    def record(self):
+        """Elenco dei record nell'ordine in cui le persone sono state trovate"""
+        persone = list(self._persone.values())
+        decodificati = decodifica_codici_fiscali([persona.codice_fiscale for persona in persone])
+        return [persona.record(decodificato) for persona, decodificato in zip(persone, decodificati)]
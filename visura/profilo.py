@@ -0,0 +1,70 @@
+"""
+Profilazione di una singola estrazione.
+
+    python -m visura.profilo visura.pdf [--profilo CARTELLA]
+
+stampa i tempi per fase e, con --profilo, salva il profilo cProfile e le
+allocazioni di memoria (tracemalloc) dell'esecuzione.
+"""
+import argparse
+import cProfile
+import os
+import sys
+import tracemalloc
+from contextlib import contextmanager
+
+from .estrazione import estrai_dati
+
+
+@contextmanager
+def profila(cartella, nome="estrazione", righe_memoria=25):
+    """
+    Esegue il blocco sotto cProfile e tracemalloc e salva in cartella:
+    <nome>.prof (apribile con pstats o snakeviz) e <nome>.memoria.txt
+    """
+    os.makedirs(cartella, exist_ok=True)
+    profilo = cProfile.Profile()
+    tracemalloc.start()
+    profilo.enable()
+    try:
+        yield
+    finally:
+        profilo.disable()
+        istantanea = tracemalloc.take_snapshot()
+        _, picco = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profilo.dump_stats(os.path.join(cartella, f"{nome}.prof"))
+        with open(os.path.join(cartella, f"{nome}.memoria.txt"), "w", encoding="utf-8") as f:
+            f.write(f"Picco di memoria: {picco / 1024:.1f} KiB\n\n")
+            for statistica in istantanea.statistics("lineno")[:righe_memoria]:
+                f.write(f"{statistica}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tempi per fase dell'estrazione di una visura")
+    parser.add_argument("pdf", help="PDF della visura")
+    parser.add_argument("--profilo", default=None, metavar="CARTELLA",
+                        help="Salva profilo cProfile e allocazioni tracemalloc in questa cartella")
+    args = parser.parse_args(argv)
+
+    if args.profilo:
+        nome = os.path.splitext(os.path.basename(args.pdf))[0]
+        with profila(args.profilo, nome):
+            risultato = estrai_dati(args.pdf)
+        print(f"Profilo salvato in {args.profilo}")
+    else:
+        risultato = estrai_dati(args.pdf)
+
+    diagnostica = risultato.diagnostica
+    for fase, millisecondi in diagnostica.tabella():
+        print(f"{fase:<25}{millisecondi:>10.2f} ms")
+    print(f"{'totale':<25}{diagnostica.totale * 1000:>10.2f} ms")
+    print(f"Pagine lette {diagnostica.pagine_lette}/{diagnostica.pagine_totali}, "
+          f"{diagnostica.byte} byte, {diagnostica.righe} righe, "
+          f"{diagnostica.sezioni} sezioni, {diagnostica.persone} persone")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
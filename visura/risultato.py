@@ -0,0 +1,70 @@
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from .diagnostica import Diagnostica
+
+
+# Valore restituito quando un campo dell'intestazione non viene trovato
+NON_TROVATO = "NON TROVATO"
+
+# Colonne dei record delle persone, nell'ordine di uscita
+COLONNE_PERSONA = ["Cognome", "Nomi", "Codice Fiscale", "Data di nascita", "Codice catastale", "Comune di nascita",
+                   "Sezione"]
+
+
+@dataclass
+class RisultatoVisura:
+    """
+    Risultato dell'estrazione di una visura camerale.
+    Per compatibilità con il vecchio codice si può ancora spacchettare come tupla:
+    dati, ragione_sociale, comune, via, numero_addetti, forma_giuridica = risultato
+    data_estrazione è la data del documento ("AAAA-MM-GG"), None se non riportata.
+    """
+    dati: list = field(default_factory=list)
+    ragione_sociale: str = NON_TROVATO
+    comune: str = NON_TROVATO
+    via: str = NON_TROVATO
+    numero_addetti: str = NON_TROVATO
+    forma_giuridica: str = NON_TROVATO
+    diagnostica: Optional["Diagnostica"] = field(default=None, compare=False)
+    data_estrazione: Optional[str] = None
+
+    def __iter__(self):
+        return iter((self.dati, self.ragione_sociale, self.comune, self.via,
+                     self.numero_addetti, self.forma_giuridica))
+
+    def intestazione(self):
+        """Restituisce i dati societari come dizionario"""
+        return {
+            "Ragione sociale": self.ragione_sociale,
+            "Comune": self.comune,
+            "Via": self.via,
+            "Numero addetti": self.numero_addetti,
+            "Forma giuridica": self.forma_giuridica,
+        }
+
+    def to_dict(self):
+        """Rappresentazione serializzabile in JSON"""
+        valori = {"intestazione": self.intestazione(), "persone": list(self.dati),
+                  "data_estrazione": self.data_estrazione}
+        if self.diagnostica is not None:
+            valori["diagnostica"] = self.diagnostica.to_dict()
+        return valori
+
+    @classmethod
+    def from_dict(cls, valori):
+        """
+        Ricostruisce il risultato da to_dict(); le persone vengono copiate.
+        La diagnostica non viene ripristinata: descriveva un'altra esecuzione.
+        """
+        intestazione = valori["intestazione"]
+        return cls(
+            dati=[dict(persona) for persona in valori["persone"]],
+            ragione_sociale=intestazione["Ragione sociale"],
+            comune=intestazione["Comune"],
+            via=intestazione["Via"],
+            numero_addetti=intestazione["Numero addetti"],
+            forma_giuridica=intestazione["Forma giuridica"],
+            data_estrazione=valori.get("data_estrazione"),
+        )
@@ -0,0 +1,258 @@
+"""
+Servizio HTTP per l'estrazione, da usare da altri programmi al posto dell'interfaccia Streamlit.
+
+    python -m visura.servizio [--host 127.0.0.1] [--porta 8765] [--processi N] [--coda N]
+                              [--cache CARTELLA] [--backend NOME]
+
+Endpoint:
+    POST /estrai   corpo: il PDF (application/pdf o application/octet-stream),
+                   il testo già estratto delle pagine separate da "\\f" (text/plain)
+                   oppure un form multipart/form-data con il file nel primo campo con filename.
+                   Risposta: JSON con "intestazione", "persone" e "diagnostica".
+    GET  /salute   stato del servizio ed elaborazioni in corso.
+
+Le estrazioni girano su un pool di --processi processi; oltre a queste ne possono
+attendere al massimo --coda. Quando anche la coda è piena il servizio risponde
+subito 503 con l'intestazione Retry-After, senza leggere il corpo della richiesta.
+Se un processo termina in modo anomalo (ad esempio per un PDF che manda in crash
+la libreria) la richiesta riceve 500 e il pool di processi viene ricreato.
+Le connessioni sono HTTP/1.1 persistenti (keep-alive).
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .backend import BACKEND
+from .elaborazione import crea_pool, elabora_in_worker
+
+# Dimensione massima del corpo di una richiesta
+DIMENSIONE_MASSIMA = 50 * 1024 * 1024
+# Secondi suggeriti al client prima di riprovare quando il servizio è pieno
+RITENTA_DOPO = 2
+# Secondi di inattività dopo i quali una connessione persistente viene chiusa
+TIMEOUT_CONNESSIONE = 30
+
+TIPI_PDF = ("application/pdf", "application/octet-stream")
+
+
+class ErroreRichiesta(Exception):
+    """Richiesta non valida: diventa una risposta con il codice HTTP indicato"""
+
+    def __init__(self, codice, messaggio):
+        super().__init__(messaggio)
+        self.codice = codice
+
+
+def estrai_file_multipart(tipo, corpo):
+    """Contenuto e tipo del primo file di un corpo multipart/form-data"""
+    messaggio = BytesParser(policy=HTTP).parsebytes(b"Content-Type: " + tipo.encode("latin-1") + b"\r\n\r\n" + corpo)
+    if not messaggio.is_multipart():
+        raise ErroreRichiesta(400, "Corpo multipart non valido")
+    for parte in messaggio.iter_parts():
+        if parte.get_filename() is not None:
+            return parte.get_payload(decode=True) or b"", parte.get_content_type()
+    raise ErroreRichiesta(400, "Nessun file nel form multipart")
+
+
+class ServizioEstrazione(ThreadingHTTPServer):
+    """
+    Server HTTP con un thread per connessione e un pool di processi per le estrazioni.
+    Il semaforo limita le richieste ammesse: quelle in elaborazione più quelle in coda.
+    """
+    daemon_threads = True
+
+    def __init__(self, indirizzo, processi=None, coda=None, backend=None, cartella_cache=None):
+        super().__init__(indirizzo, GestoreRichieste)
+        self.processi = processi or os.cpu_count() or 1
+        self.coda = self.processi * 2 if coda is None else coda
+        self.backend = backend
+        self.cartella_cache = cartella_cache
+        self.posti = threading.BoundedSemaphore(self.processi + self.coda)
+        self._ammesse = 0
+        self._lock = threading.Lock()
+        self._lock_pool = threading.Lock()
+        # "spawn": il server ha già più thread attivi, e fork con thread attivi non è sicuro
+        self.pool = crea_pool(self.processi, spawn=True)
+
+    @property
+    def ammesse(self):
+        """Richieste in elaborazione o in coda"""
+        return self._ammesse
+
+    def ammetti(self):
+        """Riserva un posto senza attendere; False se il servizio è pieno"""
+        if not self.posti.acquire(blocking=False):
+            return False
+        with self._lock:
+            self._ammesse += 1
+        return True
+
+    def libera(self):
+        with self._lock:
+            self._ammesse -= 1
+        self.posti.release()
+
+    def estrai(self, dati, backend=None):
+        """Estrazione sul pool di processi; solleva ErroreRichiesta se il documento non si elabora"""
+        argomenti = (elabora_in_worker, dati, self.cartella_cache, backend or self.backend)
+        with self._lock_pool:
+            pool = self.pool
+            try:
+                futuro = pool.submit(*argomenti)
+            except BrokenProcessPool:
+                # Il pool è caduto mentre elaborava altre richieste: questa parte su uno nuovo
+                pool = self._sostituisci_pool()
+                futuro = pool.submit(*argomenti)
+        try:
+            risultato, errore = futuro.result()
+        except BrokenProcessPool:
+            # Un processo è terminato in modo anomalo (ad esempio per un PDF che manda in crash
+            # la libreria): il pool non accetta più lavori e va sostituito
+            with self._lock_pool:
+                if self.pool is pool:
+                    self._sostituisci_pool()
+            raise ErroreRichiesta(500, "Il processo di elaborazione è terminato in modo anomalo")
+        if errore is not None:
+            raise ErroreRichiesta(422, f"{errore['Errore']}: {errore['Messaggio']}")
+        return risultato
+
+    def _sostituisci_pool(self):
+        """Crea un nuovo pool al posto di quello caduto; da chiamare con _lock_pool acquisito"""
+        caduto = self.pool
+        self.pool = crea_pool(self.processi, spawn=True)
+        caduto.shutdown(wait=False, cancel_futures=True)
+        return self.pool
+
+    def handle_error(self, richiesta, indirizzo):
+        # Un client che chiude la connessione (ad esempio dopo un 503) non è un errore del servizio
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(richiesta, indirizzo)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class GestoreRichieste(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # connessioni persistenti
+    server_version = "VisuraServizio/1.0"
+    timeout = TIMEOUT_CONNESSIONE
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/salute":
+            return self._rispondi(404, {"errore": "Percorso non trovato"})
+        self._rispondi(200, {
+            "stato": "ok",
+            "processi": self.server.processi,
+            "coda": self.server.coda,
+            "ammesse": self.server.ammesse,
+            "backend": self.server.backend or "auto",
+        })
+
+    def do_POST(self):
+        if self.path.split("?")[0] != "/estrai":
+            return self._rispondi(404, {"errore": "Percorso non trovato"}, chiudi=True)
+        self._corpo_letto = False
+        # Il controllo avviene prima di leggere il corpo: un servizio pieno risponde subito
+        if not self.server.ammetti():
+            return self._rispondi(503, {"errore": "Servizio occupato, riprovare più tardi"}, chiudi=True,
+                                  intestazioni={"Retry-After": str(RITENTA_DOPO)})
+        try:
+            dati, backend = self._leggi_documento()
+            self._rispondi(200, self.server.estrai(dati, backend))
+        except ErroreRichiesta as errore:
+            self._rispondi(errore.codice, {"errore": str(errore)}, chiudi=not self._corpo_letto)
+        finally:
+            self.server.libera()
+
+    def _leggi_documento(self):
+        """Byte del documento e backend da usare, secondo il Content-Type della richiesta"""
+        lunghezza = self.headers.get("Content-Length")
+        if lunghezza is None:
+            raise ErroreRichiesta(411, "Content-Length obbligatorio")
+        try:
+            lunghezza = int(lunghezza)
+        except ValueError:
+            raise ErroreRichiesta(400, "Content-Length non valido")
+        # Con un valore negativo rfile.read leggerebbe fino alla chiusura della connessione
+        if lunghezza < 0:
+            raise ErroreRichiesta(400, "Content-Length non valido")
+        if lunghezza > DIMENSIONE_MASSIMA:
+            raise ErroreRichiesta(413, f"Documento oltre {DIMENSIONE_MASSIMA} byte")
+        corpo = self.rfile.read(lunghezza)
+        self._corpo_letto = True
+        if not corpo:
+            raise ErroreRichiesta(400, "Corpo della richiesta vuoto")
+
+        tipo = self.headers.get("Content-Type", "application/pdf")
+        tipo_base = tipo.split(";")[0].strip().lower()
+        if tipo_base == "multipart/form-data":
+            corpo, tipo_base = estrai_file_multipart(tipo, corpo)
+            # Nei form il tipo del file spesso manca (vale text/plain): conta la firma del PDF
+            if tipo_base == "text/plain" and corpo.startswith(b"%PDF"):
+                tipo_base = "application/pdf"
+        if tipo_base == "text/plain":
+            return corpo, "testo"
+        if tipo_base in TIPI_PDF:
+            return corpo, None
+        raise ErroreRichiesta(415, f"Tipo di contenuto non supportato: {tipo_base}")
+
+    def _rispondi(self, codice, contenuto, chiudi=False, intestazioni=None):
+        corpo = json.dumps(contenuto, ensure_ascii=False).encode("utf-8")
+        self.send_response(codice)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        for nome, valore in (intestazioni or {}).items():
+            self.send_header(nome, valore)
+        if chiudi:
+            # Il corpo della richiesta potrebbe non essere stato letto: la connessione non si riusa
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        sys.stderr.write(f"{self.address_string()} - {formato % args}\n")
+
+
+def crea_servizio(host="127.0.0.1", porta=8765, processi=None, coda=None, backend=None, cartella_cache=None):
+    """Server pronto per serve_forever(); con porta=0 il sistema sceglie una porta libera"""
+    return ServizioEstrazione((host, porta), processi, coda, backend, cartella_cache)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servizio HTTP per l'estrazione dalle visure camerali Telemaco")
+    parser.add_argument("--host", default="127.0.0.1", help="Indirizzo di ascolto (default: 127.0.0.1)")
+    parser.add_argument("--porta", type=int, default=8765, help="Porta di ascolto (default: 8765)")
+    parser.add_argument("-p", "--processi", type=int, default=None,
+                        help="Estrazioni contemporanee (default: numero di core)")
+    parser.add_argument("--coda", type=int, default=None,
+                        help="Richieste in attesa oltre quelle in elaborazione (default: 2 x processi)")
+    parser.add_argument("--cache", default=None, metavar="CARTELLA",
+                        help="Riusa i risultati delle visure già elaborate salvati in questa cartella")
+    parser.add_argument("--backend", default=None, choices=["auto"] + list(BACKEND),
+                        help="Motore di estrazione del testo (default: auto)")
+    args = parser.parse_args(argv)
+
+    servizio = crea_servizio(args.host, args.porta, args.processi, args.coda, args.backend, args.cache)
+    host, porta = servizio.server_address[:2]
+    print(f"Servizio in ascolto su http://{host}:{porta} "
+          f"({servizio.processi} processi, coda di {servizio.coda} richieste)")
+    try:
+        servizio.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servizio.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
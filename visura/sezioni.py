@@ -0,0 +1,86 @@
+import re
+
+from .nomi import FinestraNomi
+
+# Lista delle possibili sezioni da cercare
+SEZIONI_DA_CERCARE = [
+    "Soci e titolari di diritti su azioni e quote",
+    "Soci e titolari di cariche o qualifiche",
+    "Amministratori",
+    "Sindaci, membri organi di controllo",
+    "Titolari di altre cariche o qualifiche",
+    "Titolari di cariche o qualifiche"
+]
+
+
+class SplitterSezioni:
+    """
+    Titoli di sezione riuniti in un'unica espressione regolare compilata (pattern),
+    quindi un solo passaggio sul testo qualunque sia il numero di sezioni.
+
+    Se due titoli iniziano nella stessa posizione vince il più lungo, e a parità
+    di lunghezza l'ordine alfabetico: il risultato non dipende dall'ordine della lista.
+    Le corrispondenze non si sovrappongono.
+    """
+
+    def __init__(self, sezioni=SEZIONI_DA_CERCARE):
+        ordinate = sorted(set(sezioni), key=lambda sezione: (-len(sezione), sezione))
+        self.pattern = re.compile("|".join(re.escape(sezione) for sezione in ordinate))
+
+
+# Istanza condivisa: il pattern viene compilato una volta sola
+splitter_predefinito = SplitterSezioni()
+
+
+class NominativiPerSezione:
+    """
+    Divide in sezioni le righe che arrivano una alla volta, con gli stessi titoli di
+    SplitterSezioni (un titolo non va mai a capo, quindi basta cercarlo riga per riga),
+    e passa il contenuto di ogni sezione a una FinestraNomi. Del testo non resta nulla:
+    per ogni sezione si conservano solo i nominativi. Se un titolo compare più volte
+    (ad esempio nell'indice e poi nel corpo della visura) vale l'ultima occorrenza,
+    nell'ordine della prima.
+    alla_chiusura, se indicata, viene chiamata con il nome di ogni sezione conclusa.
+    """
+
+    def __init__(self, splitter=splitter_predefinito, alla_chiusura=None):
+        self.pattern = splitter.pattern
+        self.alla_chiusura = alla_chiusura
+        self.nominativi = {}  # nome sezione -> [(codice_fiscale, NomeRisolto)] dell'ultima occorrenza
+        self._nome = None
+        self._trovati = None
+        self._finestra = None
+
+    def alimenta(self, riga):
+        inizio = 0
+        for match in self.pattern.finditer(riga):
+            # Il testo prima del titolo è l'ultima riga della sezione precedente
+            self._riga(riga[inizio:match.start()])
+            self.chiudi()
+            self._nome, self._trovati, self._finestra = match.group(), [], FinestraNomi()
+            inizio = match.end()
+        self._riga(riga[inizio:] if inizio else riga)
+
+    def _riga(self, riga):
+        if self._finestra is not None:
+            trovato = self._finestra.alimenta(riga)
+            if trovato is not None:
+                self._trovati.append(trovato)
+
+    def chiudi(self):
+        """Conclude la sezione in corso: va chiamata anche dopo l'ultima riga"""
+        if self._nome is None:
+            return
+        nome = self._nome
+        self.nominativi[nome] = self._trovati
+        self._nome = self._trovati = self._finestra = None
+        if self.alla_chiusura is not None:
+            self.alla_chiusura(nome)
+
+
+def separa_sezioni(sezioni_unite):
+    """
+    Elenco delle sezioni dalla colonna "Sezione" dei record. I nomi sono uniti da ", ",
+    che però compare anche dentro alcuni nomi: si cercano quindi i titoli noti.
+    """
+    return splitter_predefinito.pattern.findall(sezioni_unite) or ([sezioni_unite] if sezioni_unite else [])
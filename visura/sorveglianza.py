@@ -0,0 +1,462 @@
+"""
+Elaborazione automatica delle visure depositate in una cartella.
+
+    python -m visura.sorveglianza CARTELLA [-o USCITA] [--processi N] [--coda N] [--formato jsonl|csv]
+                                  [--cache CARTELLA] [--backend NOME] [--archivio FILE]
+                                  [--polling] [--intervallo SECONDI]
+
+Resta in esecuzione e sorveglia la cartella (senza sottocartelle): su Linux con
+inotify, altrove (o con --polling, utile per le cartelle di rete) rileggendola
+ogni --intervallo secondi e prendendo solo i file che non cambiano più tra due
+letture. Ogni nuovo PDF viene elaborato su un pool di processi e il risultato
+scritto in modo atomico in USCITA/aziende, con un nome che contiene l'impronta
+del contenuto. Le impronte elaborate sono registrate in USCITA/elaborati.jsonl:
+dopo un riavvio i file già elaborati (anche se rinominati o copiati di nuovo)
+non vengono rielaborati, e un file interrotto a metà viene riscritto identico.
+
+Al massimo --processi file sono in elaborazione e --coda in attesa; durante un
+picco gli eventi in più restano al sistema operativo, e i file eventualmente
+persi vengono ritrovati rileggendo la cartella appena la coda si svuota.
+Ctrl+C (o SIGTERM) termina dopo aver concluso i file in elaborazione.
+"""
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import select
+import signal
+import struct
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .archivio import Archivio
+from .backend import BACKEND
+from .consolidato import righe_persone
+from .elaborazione import Scrittore, crea_pool, elabora_in_worker
+
+# Percorsi in attesa di un processo libero, oltre a quelli in elaborazione
+CODA_PREDEFINITA = 256
+# Secondi tra due letture della cartella senza inotify
+INTERVALLO_PREDEFINITO = 2.0
+# Attesa massima di ogni giro del ciclo principale: limita il ritardo nel fermarsi
+ATTESA_MASSIMA = 0.5
+
+# Costanti di <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+_EVENTO = struct.Struct("iIII")  # wd, mask, cookie, len; segue il nome
+
+
+def elenca_pdf(cartella):
+    """PDF presenti nella cartella, dal meno recente; i file nascosti (spesso temporanei) sono esclusi"""
+    voci = []
+    for voce in os.scandir(cartella):
+        if voce.name.startswith(".") or not voce.name.lower().endswith(".pdf"):
+            continue
+        try:
+            if voce.is_file():
+                voci.append((voce.stat().st_mtime_ns, voce.path))
+        except OSError:
+            continue
+    return [percorso for _, percorso in sorted(voci)]
+
+
+def firma_file(percorso):
+    """(dimensione, data di modifica) del file, oppure None se non esiste più"""
+    try:
+        stat = os.stat(percorso)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class SorgenteInotify:
+    """File chiusi dopo la scrittura o spostati nella cartella, notificati dal kernel"""
+
+    def __init__(self, cartella):
+        self.cartella = os.path.abspath(cartella)
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errore = ctypes.get_errno()
+            raise OSError(errore, os.strerror(errore))
+        if libc.inotify_add_watch(self._fd, os.fsencode(cartella), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            errore = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errore, os.strerror(errore), cartella)
+
+    def tutti(self):
+        """PDF pronti da elaborare tra quelli della cartella: con inotify, tutti"""
+        return elenca_pdf(self.cartella)
+
+    def attendi(self, timeout):
+        """PDF arrivati entro timeout secondi (elenco vuoto se nessuno)"""
+        pronti, _, _ = select.select([self._fd], [], [], timeout)
+        if not pronti:
+            return []
+        try:
+            dati = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        percorsi = []
+        posizione = 0
+        while posizione < len(dati):
+            _, maschera, _, lunghezza = _EVENTO.unpack_from(dati, posizione)
+            nome = dati[posizione + _EVENTO.size:posizione + _EVENTO.size + lunghezza].rstrip(b"\0")
+            posizione += _EVENTO.size + lunghezza
+            if maschera & IN_Q_OVERFLOW:
+                # La coda del kernel è traboccata: alcuni eventi sono persi, si rilegge la cartella
+                return self.tutti()
+            if maschera & IN_IGNORED:
+                raise OSError(f"La cartella sorvegliata non è più disponibile: {self.cartella}")
+            nome = os.fsdecode(nome)
+            if nome and not maschera & IN_ISDIR and not nome.startswith(".") and nome.lower().endswith(".pdf"):
+                percorsi.append(os.path.join(self.cartella, nome))
+        return percorsi
+
+    def chiudi(self):
+        os.close(self._fd)
+
+
+class SorgentePolling:
+    """
+    Rilegge la cartella ogni intervallo secondi. Un file è pronto quando dimensione e
+    data di modifica non cambiano tra due letture: chi lo sta copiando ha finito.
+    """
+
+    def __init__(self, cartella, intervallo=INTERVALLO_PREDEFINITO):
+        self.cartella = os.path.abspath(cartella)
+        self.intervallo = intervallo
+        self._firme = {}
+        self._stabili = []
+        self._prossima = 0.0
+
+    def tutti(self):
+        """PDF stabili all'ultima lettura (nessuno prima della seconda): non tutta la cartella"""
+        return list(self._stabili)
+
+    def attendi(self, timeout):
+        attesa = self._prossima - time.monotonic()
+        if attesa > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0.0, attesa))
+        self._prossima = time.monotonic() + self.intervallo
+        firme = {percorso: firma_file(percorso) for percorso in elenca_pdf(self.cartella)}
+        self._stabili = [percorso for percorso, firma in firme.items()
+                         if firma is not None and self._firme.get(percorso) == firma]
+        self._firme = firme
+        return self.tutti()
+
+    def chiudi(self):
+        pass
+
+
+def crea_sorgente(cartella, polling=False, intervallo=INTERVALLO_PREDEFINITO):
+    """inotify se disponibile (e non si è chiesto il polling), altrimenti il polling"""
+    if not polling:
+        try:
+            return SorgenteInotify(cartella)
+        except (OSError, AttributeError):
+            pass
+    return SorgentePolling(cartella, intervallo)
+
+
+class RegistroElaborati:
+    """
+    Impronte dei file già elaborati, una riga JSON per file in un file aperto in
+    aggiunta. Ogni riga viene scritta su disco prima di proseguire; una riga
+    rimasta a metà per un'interruzione viene scartata alla lettura successiva.
+    """
+
+    def __init__(self, percorso):
+        self.percorso = percorso
+        self._voci = {}
+        if os.path.exists(percorso):
+            with open(percorso, "r+b") as f:
+                contenuto = f.read()
+                # Tronca l'eventuale riga incompleta, a cui altrimenti si attaccherebbe la successiva
+                fine = contenuto.rfind(b"\n") + 1
+                if fine < len(contenuto):
+                    f.truncate(fine)
+            for riga in contenuto[:fine].splitlines():
+                try:
+                    voce = json.loads(riga)
+                except ValueError:
+                    continue
+                self._voci[voce["impronta"]] = voce
+        self._file = open(percorso, "a", encoding="utf-8")
+
+    def __contains__(self, impronta):
+        return impronta in self._voci
+
+    def __iter__(self):
+        return iter(self._voci.values())
+
+    def __len__(self):
+        return len(self._voci)
+
+    def get(self, impronta):
+        return self._voci.get(impronta)
+
+    def registra(self, voce):
+        self._file.write(json.dumps(voce, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._voci[voce["impronta"]] = voce
+
+    def chiudi(self):
+        self._file.close()
+
+
+def scrivi_atomico(percorso, righe, formato):
+    """Scrive le righe in un file temporaneo e lo rinomina: il file finale è sempre completo"""
+    descrittore, temporaneo = tempfile.mkstemp(dir=os.path.dirname(percorso), suffix=".tmp")
+    os.close(descrittore)
+    try:
+        scrittore = Scrittore(temporaneo, formato)
+        try:
+            scrittore.scrivi(righe)
+        finally:
+            scrittore.chiudi()
+        os.replace(temporaneo, percorso)
+    except BaseException:
+        if os.path.exists(temporaneo):
+            os.remove(temporaneo)
+        raise
+
+
+class Sorveglianza:
+    """
+    Ciclo di sorveglianza: raccoglie i PDF segnalati dalla sorgente, li elabora su un
+    pool di processi e ne scrive i risultati. Lo stato in memoria è limitato: al
+    massimo `processi` file in elaborazione e `coda` percorsi in attesa.
+    """
+
+    def __init__(self, sorgente, cartella_uscita, processi=None, coda=CODA_PREDEFINITA, formato="jsonl",
+                 cartella_cache=None, backend=None, archivio=None, stampa=print):
+        self.sorgente = sorgente
+        self.processi = processi or os.cpu_count() or 1
+        self.coda = max(1, coda)
+        self.formato = formato
+        self.cartella_cache = cartella_cache
+        self.backend = backend
+        self.archivio = archivio
+        self.stampa = stampa
+
+        self.cartella_aziende = os.path.join(cartella_uscita, "aziende")
+        os.makedirs(self.cartella_aziende, exist_ok=True)
+        self.registro = RegistroElaborati(os.path.join(cartella_uscita, "elaborati.jsonl"))
+        self.report_errori = open(os.path.join(cartella_uscita, "errori.jsonl"), "a", encoding="utf-8")
+
+        self.in_attesa = {}  # percorso -> None, nell'ordine di arrivo e senza duplicati
+        self.in_corso = {}  # futuro -> (percorso, firma, impronta)
+        # percorso -> firma del contenuto già gestito: dopo un riavvio i file invariati non vengono riletti
+        self.visti = {voce["file"]: tuple(voce["firma"]) for voce in self.registro if voce.get("firma")}
+        self.interrotti = set()  # impronte già riprovate dopo la caduta di un processo
+        self.elaborati = 0
+        self.errori = 0
+        self._da_rileggere = False
+        self._fermati = threading.Event()
+        self.pool = self._crea_pool()
+
+    def _crea_pool(self):
+        return crea_pool(self.processi, spawn=True)
+
+    def ferma(self):
+        """Chiede la fine del ciclo (si può chiamare da un gestore di segnale o da un altro thread)"""
+        self._fermati.set()
+
+    def esegui(self):
+        """Ciclo principale: termina dopo ferma(), concludendo i file già in elaborazione"""
+        try:
+            self._rileggi()
+            while not self._fermati.is_set():
+                self._avvia()
+                self._raccogli(0)
+                if self._da_rileggere and not self.in_attesa:
+                    self._da_rileggere = False
+                    self._rileggi()
+                    continue
+                attesa = ATTESA_MASSIMA / 2 if self.in_corso else ATTESA_MASSIMA
+                if len(self.in_attesa) >= self.coda:
+                    # Coda piena: i nuovi eventi restano al sistema operativo finché un processo non si libera
+                    self._raccogli(attesa)
+                else:
+                    self._accoda(self.sorgente.attendi(attesa))
+            while self.in_corso:
+                self._raccogli(None)
+        finally:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.sorgente.chiudi()
+            self.registro.chiudi()
+            self.report_errori.close()
+        return self.elaborati, self.errori
+
+    def _rileggi(self):
+        """Accoda i file pronti della sorgente, dopo aver dimenticato quelli rimossi dalla cartella"""
+        # Si confronta con l'elenco completo: con il polling i file non ancora stabili, o tutti
+        # prima della seconda lettura, sono presenti anche se la sorgente non li restituisce
+        presenti = set(elenca_pdf(self.sorgente.cartella))
+        self.visti = {percorso: firma for percorso, firma in self.visti.items() if percorso in presenti}
+        self._accoda(self.sorgente.tutti())
+
+    def _accoda(self, percorsi):
+        """Mette in attesa i percorsi nuovi o cambiati"""
+        in_corso = {percorso for percorso, _, _ in self.in_corso.values()}
+        for percorso in percorsi:
+            if percorso in self.in_attesa:
+                continue
+            if percorso in in_corso:
+                # Riscritto durante l'elaborazione: si controlla di nuovo alla prossima lettura
+                self._da_rileggere = True
+                continue
+            firma = firma_file(percorso)
+            if firma is None or self.visti.get(percorso) == firma:
+                continue
+            if len(self.in_attesa) >= self.coda:
+                self._da_rileggere = True
+                continue
+            self.in_attesa[percorso] = None
+
+    def _avvia(self):
+        """Passa ai processi liberi i file in attesa non ancora elaborati"""
+        impronte_in_corso = {impronta for _, _, impronta in self.in_corso.values()}
+        while self.in_attesa and len(self.in_corso) < self.processi:
+            percorso = next(iter(self.in_attesa))
+            del self.in_attesa[percorso]
+            firma = firma_file(percorso)
+            try:
+                with open(percorso, "rb") as f:
+                    dati = f.read()
+            except OSError:
+                continue  # Rimosso nel frattempo
+            impronta = hashlib.sha256(dati).hexdigest()
+            if impronta in self.registro or impronta in impronte_in_corso:
+                precedente = self.registro.get(impronta)
+                if precedente is not None and precedente["file"] != os.path.abspath(percorso):
+                    self.stampa(f"{percorso}: già elaborato come {precedente['file']}")
+                self.visti[percorso] = firma
+                continue
+            futuro = self.pool.submit(elabora_in_worker, dati, self.cartella_cache, self.backend)
+            self.in_corso[futuro] = (percorso, firma, impronta)
+            impronte_in_corso.add(impronta)
+
+    def _raccogli(self, timeout):
+        if not self.in_corso:
+            return
+        conclusi, _ = wait(list(self.in_corso), timeout=timeout, return_when=FIRST_COMPLETED)
+        caduto = any(isinstance(futuro.exception(), BrokenProcessPool) for futuro in conclusi)
+        if caduto:
+            # Tutti i file del pool caduto terminano insieme: si raccolgono prima di ricrearlo
+            conclusi, _ = wait(list(self.in_corso))
+        for futuro in conclusi:
+            percorso, firma, impronta = self.in_corso.pop(futuro)
+            try:
+                risultato, errore = futuro.result()
+            except BrokenProcessPool:
+                self._processo_caduto(percorso, firma, impronta)
+                continue
+            self._concludi(percorso, firma, impronta, risultato, errore)
+        if caduto:
+            self.pool.shutdown(wait=False)
+            self.pool = self._crea_pool()
+
+    def _processo_caduto(self, percorso, firma, impronta):
+        """
+        Un processo è terminato in modo anomalo (ad esempio per un PDF che manda in crash
+        la libreria): i file in elaborazione vengono riprovati una volta, poi sono errori
+        """
+        if impronta in self.interrotti:
+            self._concludi(percorso, firma, impronta, None, {"Errore": "BrokenProcessPool", "Traceback": "",
+                                                             "Messaggio": "processo di elaborazione terminato"})
+            return
+        self.interrotti.add(impronta)
+        self.in_attesa[percorso] = None
+
+    def _concludi(self, percorso, firma, impronta, risultato, errore):
+        """Scrive risultato o errore e solo alla fine registra l'impronta come elaborata"""
+        percorso_assoluto = os.path.abspath(percorso)
+        voce = {"impronta": impronta, "file": percorso_assoluto, "firma": firma,
+                "data": time.strftime("%Y-%m-%d %H:%M:%S")}
+        if errore is not None:
+            errore = dict(errore, File=percorso_assoluto)
+            self.report_errori.write(json.dumps(errore, ensure_ascii=False) + "\n")
+            self.report_errori.flush()
+            voce["esito"] = "errore"
+            self.errori += 1
+            self.stampa(f"ERRORE {percorso}: {errore['Messaggio']}")
+        else:
+            # Il nome dipende dal contenuto: se il file viene rielaborato dopo un'interruzione,
+            # il risultato sostituisce quello precedente invece di duplicarlo
+            base = os.path.splitext(os.path.basename(percorso))[0]
+            uscita = os.path.join(self.cartella_aziende, f"{base}-{impronta[:12]}.{self.formato}")
+            righe = list(righe_persone(percorso, risultato))
+            scrivi_atomico(uscita, righe, self.formato)
+            if self.archivio is not None:
+                self.archivio.registra(risultato, file=percorso_assoluto, impronta=impronta)
+            voce.update(esito="ok", uscita=uscita, persone=len(righe))
+            self.elaborati += 1
+            self.stampa(f"{percorso}: {len(righe)} nominativi")
+        self.registro.registra(voce)
+        self.visti[percorso] = firma
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Elabora le visure depositate in una cartella sorvegliata")
+    parser.add_argument("cartella", help="Cartella in cui arrivano i PDF delle visure")
+    parser.add_argument("-o", "--uscita", default="risultati", help="Cartella dei risultati (default: risultati)")
+    parser.add_argument("-p", "--processi", type=int, default=None,
+                        help="Numero di processi (default: numero di core)")
+    parser.add_argument("--coda", type=int, default=CODA_PREDEFINITA,
+                        help=f"File in attesa oltre a quelli in elaborazione (default: {CODA_PREDEFINITA})")
+    parser.add_argument("-f", "--formato", choices=["jsonl", "csv"], default="jsonl",
+                        help="Formato dei file di uscita (default: jsonl)")
+    parser.add_argument("--cache", default=None, metavar="CARTELLA",
+                        help="Riusa i risultati delle visure già elaborate (e le pagine invariate) salvati in questa cartella")
+    parser.add_argument("--backend", default=None, choices=["auto"] + list(BACKEND),
+                        help="Motore di estrazione del testo (default: auto)")
+    parser.add_argument("--archivio", default=None, metavar="FILE",
+                        help="Aggiunge i risultati a questo archivio SQLite")
+    parser.add_argument("--polling", action="store_true",
+                        help="Rilegge periodicamente la cartella invece di usare inotify (cartelle di rete)")
+    parser.add_argument("--intervallo", type=float, default=INTERVALLO_PREDEFINITO,
+                        help=f"Secondi tra due letture della cartella con il polling (default: {INTERVALLO_PREDEFINITO})")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.cartella):
+        print(f"Cartella non trovata: {args.cartella}", file=sys.stderr)
+        return 1
+
+    sorgente = crea_sorgente(args.cartella, args.polling, args.intervallo)
+    archivio = Archivio(args.archivio) if args.archivio else None
+    sorveglianza = Sorveglianza(sorgente, args.uscita, args.processi, args.coda, args.formato, args.cache,
+                                args.backend, archivio)
+    for segnale in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(segnale, lambda *_: sorveglianza.ferma())
+
+    modo = "inotify" if isinstance(sorgente, SorgenteInotify) else f"polling ogni {args.intervallo:g} s"
+    print(f"Sorveglianza di {args.cartella} ({modo}, {sorveglianza.processi} processi, "
+          f"{len(sorveglianza.registro)} file già elaborati)")
+    try:
+        elaborati, errori = sorveglianza.esegui()
+    finally:
+        if archivio is not None:
+            archivio.chiudi()
+    print(f"Fine: elaborati {elaborati} file, errori: {errori}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())